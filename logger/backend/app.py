@@ -3,20 +3,83 @@ import config
 
 pymysql.install_as_MySQLdb()
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import text
+from sqlalchemy import event
 from flask_cors import CORS
-from datetime import datetime, timedelta
-from collections import defaultdict
+import bulk
+import compression
+import date_ranges
+import dbpool
+import formats
+import ical
+import jobs
+import metrics
+import pagination
+import percentiles
+import projection
+import reference_cache
+import replicas
+import response_cache
+import rollup
+import schedule_index
+import search
+import shards
+import slow_queries
+import statements
+import hmac
+from datetime import date, datetime, timedelta
+from itertools import islice
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = config.SQLALCHEMY_DATABASE_URI
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dbpool.engine_options(config.SQLALCHEMY_DATABASE_URI)
+# Per-user data lives on the shard its email hashes to (see shards.py)
+app.config['SQLALCHEMY_BINDS'] = {name: dict(dbpool.engine_options(uri), url=uri) for name, uri in dbpool.shard_uris().items()}
+# GET requests read from replicas in READ_REPLICA_URIS (see replicas.py)
+read_router = replicas.ReadRouter(
+    dbpool.replica_uris(),
+    max_lag=getattr(config, 'REPLICA_MAX_LAG_SECONDS', 5),
+    sticky_seconds=getattr(config, 'READ_YOUR_WRITES_SECONDS', 15),
+    directory=getattr(config, 'READ_YOUR_WRITES_DIR', 'read_your_writes')
+)
+if read_router.sets and getattr(config, 'REPLICA_CHECK_SECONDS', 5):
+    read_router.start_checker(getattr(config, 'REPLICA_CHECK_SECONDS', 5))
+db = SQLAlchemy(app, session_options={'class_': shards.ShardSession, 'read_engine': read_router.engine_for})
+shard_router = shards.ShardRouter(app.config['SQLALCHEMY_BINDS'])
 
 CORS(app, resources={r"/*": {"origins": ["http://localhost:3000"]}})
 
+request_metrics = metrics.Metrics(server_timing=getattr(config, 'SERVER_TIMING', False))
+request_metrics.init_app(app)
+request_metrics.add_source(lambda: dbpool.render(db.engine.pool))
+request_metrics.add_source(read_router.render)
+with app.app_context():
+    for engine in [*db.engines.values(), *read_router.engines()]:
+        request_metrics.instrument_engine(engine)
+
+response_compression = compression.Compression(
+    min_bytes=getattr(config, 'GZIP_MIN_BYTES', 1024),
+    level=getattr(config, 'GZIP_LEVEL', 6)
+)
+response_compression.init_app(app)
+
+slow_query_log = None
+if getattr(config, 'SLOW_QUERY_THRESHOLD_MS', 200) is not None:
+    slow_query_log = slow_queries.SlowQueryLog(
+        threshold_ms=getattr(config, 'SLOW_QUERY_THRESHOLD_MS', 200),
+        max_entries=getattr(config, 'SLOW_QUERY_BUFFER_SIZE', 200),
+        explain=getattr(config, 'SLOW_QUERY_EXPLAIN', True),
+        path=getattr(config, 'SLOW_QUERY_LOG_FILE', None),
+        max_bytes=getattr(config, 'SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+        backups=getattr(config, 'SLOW_QUERY_LOG_BACKUPS', 5),
+        explain_queue=getattr(config, 'SLOW_QUERY_EXPLAIN_QUEUE', 50)
+    )
+    with app.app_context():
+        for engine in [*db.engines.values(), *read_router.engines()]:
+            slow_query_log.instrument_engine(engine)
+
 class Schedule(db.Model):
     __tablename__ = 'Schedule'
     Email = db.Column(db.String(255), primary_key=True)
@@ -67,172 +130,248 @@ def meal_to_dict(meal):
         "Datetime": meal.Datetime.isoformat()
     }
 
+def rows_data(rows, constants=None):
+    # List payloads as parallel arrays when the client asks for ?format=columnar
+    if formats.is_columnar(request.args):
+        return formats.columnar(rows, constants)
+    return rows
+
+def as_date(value):
+    # DATE() comes back as a date from MySQL but as an ISO string from SQLite
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+def empty_cal_days(start_date, numdays):
+    return [
+        {'date': (start_date + timedelta(days=i)).strftime('%b %d'), 'cals_burnt': 0, 'total_cals': 0, 'unhealthy_cals': 0}
+        for i in range(numdays+1)
+    ]
+
+def window_params(numdays, email=None, today=None):
+    # `today` is the user's local date when the client sent a time zone
+    today = today or datetime.utcnow().date()
+    params = {'start_date': today - timedelta(days=numdays), 'end_date': today + timedelta(days=1)}
+    if email is not None:
+        params['email'] = email
+    return params
+
+def user_session(email):
+    # Points the session at the shard holding the user's rows
+    db.session.info['shard'] = shard_router.shard_for(email)
+    db.session.info.setdefault('users', set()).add(email)
+    return db.session
+
+def read_engines():
+    # A replica of every shard where one is healthy, for cross-user reads
+    return {name: read_router.engine_for(name) or engine for name, engine in db.engines.items()}
+
+@app.before_request
+def route_to_user_shard():
+    # Per-user routes name the user in ?email= or in the JSON body
+    email = request.args.get('email')
+    if not email and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            email = body.get('Email') or body.get('email')
+    if isinstance(email, str) and email:
+        user_session(email)
+    # Reads go to a replica unless the user wrote within the stickiness window
+    if request.method in ('GET', 'HEAD') and not (isinstance(email, str) and email and read_router.is_sticky(email)):
+        db.session.info['read_only'] = True
+
 class DBReader:
-    def get_cal_data(self, email, numdays):
-        today = datetime.utcnow().date()
-        previous_dates = today - timedelta(days=numdays)
-
-        cals_burnt_query = text("""
-            SELECT DATE(Datetime) as date, 
-                   SUM(a.CaloriesPerKg * us.Weight * (r.Duration / 60)) AS cals_burnt
-            FROM Records r
-            JOIN Activities a ON r.Activity = a.ActivityName
-            JOIN UserStorage us ON r.Email = us.Email
-            WHERE r.Email = :email AND DATE(Datetime) BETWEEN :start_date AND :end_date
-            GROUP BY DATE(Datetime)
-        """)
-        cals_ingested_query = text("""
-            SELECT DATE(m.Datetime) as date, 
-                   SUM(f.Calories) AS total_cals
-            FROM Meals m
-            JOIN Food f ON m.FoodName = f.FoodName
-            WHERE m.Email = :email AND DATE(m.Datetime) BETWEEN :start_date AND :end_date
-            GROUP BY DATE(m.Datetime)
-        """)
-        unhealthy_cals_query = text("""
-            SELECT DATE(m.Datetime) as date, 
-                   SUM(f.Calories) AS unhealthy_cals
-            FROM Meals m
-            JOIN Food f ON m.FoodName = f.FoodName
-            WHERE m.Email = :email AND DATE(m.Datetime) BETWEEN :start_date AND :end_date
-              AND f.HighlyProcessed = 1
-            GROUP BY DATE(m.Datetime)
-        """)
-
-        # Execute queries
-        cals_burnt_results = db.session.execute(cals_burnt_query, {'email': email, 'start_date': previous_dates, 'end_date': today}).fetchall()
-        cals_ingested_results = db.session.execute(cals_ingested_query, {'email': email, 'start_date': previous_dates, 'end_date': today}).fetchall()
-        unhealthy_cals_results = db.session.execute(unhealthy_cals_query, {'email': email, 'start_date': previous_dates, 'end_date': today}).fetchall()
-
-        # Prepare data
-        data_dict = defaultdict(lambda: {'date': '', 'cals_burnt': 0, 'total_cals': 0, 'unhealthy_cals': 0})
-        for i in range(numdays+1):
-            date = previous_dates + timedelta(days=i)
-            data_dict[date]['date'] = date.strftime('%b %d')
-
-        for row in cals_burnt_results:
-            data_dict[row.date]['cals_burnt'] = row.cals_burnt or 0
-
-        for row in cals_ingested_results:
-            data_dict[row.date]['total_cals'] = row.total_cals or 0
-
-        for row in unhealthy_cals_results:
-            data_dict[row.date]['unhealthy_cals'] = row.unhealthy_cals or 0
-
-        return [data_dict[previous_dates + timedelta(days=i)] for i in range(numdays+1)]
-
-    def get_activity_data(self, email, numdays):
-        today = datetime.utcnow().date()
-        previous_dates = today - timedelta(days=numdays)
-
-        query = text("""
-            SELECT r.Activity, 
-                   SUM(a.CaloriesPerKg * us.Weight * (r.Duration / 60)) AS cals_burnt
-            FROM Records r
-            JOIN Activities a ON r.Activity = a.ActivityName
-            JOIN UserStorage us ON r.Email = us.Email
-            WHERE r.Email = :email AND DATE(r.Datetime) BETWEEN :start_date AND :end_date
-            GROUP BY r.Activity
-        """)
-
-        results = db.session.execute(query, {'email': email, 'start_date': previous_dates, 'end_date': today}).fetchall()
+    def get_cal_data(self, email, numdays, today=None):
+        params = window_params(numdays, email, today)
+        results = user_session(email).execute(statements.DAILY_TOTALS_QUERY, params).fetchall()
+
+        data = empty_cal_days(params['start_date'], numdays)
+        for row in results:
+            day = data[(as_date(row.date) - params['start_date']).days]
+            day['cals_burnt'] = row.cals_burnt or 0
+            day['total_cals'] = row.total_cals or 0
+            day['unhealthy_cals'] = row.unhealthy_cals or 0
+        return data
+
+    def get_activity_data(self, email, numdays, today=None):
+        results = user_session(email).execute(statements.ACTIVITY_DATA_QUERY, window_params(numdays, email, today)).fetchall()
         return [{'activity': row.Activity, 'cals_burnt': row.cals_burnt or 0} for row in results]
 
 
-    def get_total_calories_per_day(self, email, numdays):
-        today = datetime.utcnow().date()
-        start_date = today - timedelta(days=numdays)
-
-        query = text("""
-            SELECT DATE(r.Datetime) AS activity_date,
-                SUM(a.CaloriesPerKg * us.Weight * (r.Duration / 60)) AS total_calories
-            FROM Records r
-            JOIN Activities a ON r.Activity = a.ActivityName
-            JOIN UserStorage us ON r.Email = us.Email
-            WHERE r.Email = :email 
-            AND DATE(r.Datetime) BETWEEN :start_date AND :end_date
-            GROUP BY activity_date
-            ORDER BY activity_date
-        """)
-
-        results = db.session.execute(query, {'email': email, 'start_date': start_date, 'end_date': today}).fetchall()
-        return [{'date': row.activity_date, 'total_calories': row.total_calories or 0} for row in results]
+    def get_total_calories_per_day(self, email, numdays, today=None):
+        results = user_session(email).execute(statements.DAILY_TOTALS_QUERY, window_params(numdays, email, today)).fetchall()
+        return [{'date': row.date, 'total_calories': row.cals_burnt or 0} for row in results if row.record_count]
 
     def get_activity_percentile_data(self, email, numdays):
-        today = datetime.utcnow().date()
-        previous_dates = today - timedelta(days=numdays)
-
-        user_query = text("""
-            SELECT r.Activity, 
-                   SUM(a.CaloriesPerKg * us.Weight * (r.Duration / 60)) AS user_cals_burnt
-            FROM Records r
-            JOIN Activities a ON r.Activity = a.ActivityName
-            JOIN UserStorage us ON r.Email = us.Email
-            WHERE r.Email = :email AND DATE(r.Datetime) BETWEEN :start_date AND :end_date
-            GROUP BY r.Activity
-        """)
-        all_users_query = text("""
-            SELECT r.Activity, r.Email, 
-                   SUM(a.CaloriesPerKg * us.Weight * (r.Duration / 60)) AS cals_burnt
-            FROM Records r
-            JOIN Activities a ON r.Activity = a.ActivityName
-            JOIN UserStorage us ON r.Email = us.Email
-            WHERE DATE(r.Datetime) BETWEEN :start_date AND :end_date
-            GROUP BY r.Activity, r.Email
-        """)
-
-        user_results = db.session.execute(user_query, {'email': email, 'start_date': previous_dates, 'end_date': today}).fetchall()
-        all_users_results = db.session.execute(all_users_query, {'start_date': previous_dates, 'end_date': today}).fetchall()
-
-        activity_cals = defaultdict(list)
-        for row in all_users_results:
-            activity_cals[row.Activity].append(row.cals_burnt)
-
-        percentile_data = []
-        for user_row in user_results:
-            activity = user_row.Activity
-            user_cals_burnt = user_row.user_cals_burnt
-            cals_list = sorted(activity_cals[activity])
-            total_users = len(cals_list)
-            count_less = sum(1 for c in cals_list if c < user_cals_burnt)
-            percentile = (count_less / total_users) * 100 if total_users > 0 else 0
-            percentile_data.append({'activity': activity, 'percentile': round(percentile, 2)})
-
-        return percentile_data
-    
+        # Returns the percentiles and the age in seconds of the index they came from
+        return percentile_index.lookup(email, numdays)
+
+    def get_all_users_activity_data(self, numdays):
+        # Every user on every shard
+        return shard_router.gather(read_engines(), statements.ALL_USERS_ACTIVITY_QUERY, window_params(numdays))
+
+    def get_dashboard_data(self, email, numdays):
+        # Every chart series for one window: the user's own series plus the
+        # percentiles from the shared index.
+        data = self.get_dashboard_series(email, numdays)
+        data['percentiles'], data['percentilesAgeSeconds'] = self.get_activity_percentile_data(email, numdays)
+        return data
+
+    def get_dashboard_series(self, email, numdays, today=None):
+        # The day series from the rollup and the per-activity split from one
+        # scan of the user's records
+        params = window_params(numdays, email, today)
+        previous_dates = params['start_date']
+        session = user_session(email)
+
+        daily_results = session.execute(statements.DAILY_TOTALS_QUERY, params).fetchall()
+        activity_results = session.execute(statements.ACTIVITY_DATA_QUERY, params).fetchall()
+
+        cal_days = empty_cal_days(previous_dates, numdays)
+        for row in daily_results:
+            day = cal_days[(as_date(row.date) - previous_dates).days]
+            day['cals_burnt'] = row.cals_burnt or 0
+            day['total_cals'] = row.total_cals or 0
+            day['unhealthy_cals'] = row.unhealthy_cals or 0
+
+        return {
+            'calories': cal_days,
+            'activities': [{'activity': row.Activity, 'cals_burnt': row.cals_burnt or 0} for row in activity_results],
+            'activitiescalories': [{'date': row.date, 'total_calories': row.cals_burnt or 0} for row in daily_results if row.record_count]
+        }
+
+    def get_range_series(self, email, start_date, end_date, granularity):
+        # Dense series over [start_date, end_date] bucketed by day, ISO week or
+        # calendar month, from at most one rollup row per day
+        results = user_session(email).execute(statements.RANGE_TOTALS_QUERY, {
+            'email': email, 'start_date': start_date, 'end_date': end_date + timedelta(days=1)
+        }).fetchall()
+        rows = [(as_date(row.date), row._mapping) for row in results]
+        return date_ranges.bucket(rows, start_date, end_date, granularity, statements.RANGE_FIELDS)
+
     def get_all_logs_data(self, email):
-        user_query = text("""
-            SELECT *
-            FROM Logs L
-            WHERE L.Email = :email                
-        """)
-        user_logs = db.session.execute(user_query, {'email': email}).fetchall()
+        user_logs = user_session(email).execute(statements.ALL_LOGS_QUERY, {'email': email}).fetchall()
 
         log_data = []
         for log in user_logs:
             entry = log_to_dict(log)
             log_data.append(entry)
-        print(user_logs)
-        print(log_data)
         return log_data
     
+    def get_range_averages(self, email, start_date, end_date):
+        # Averages per calendar day in [start_date, end_date], from the running
+        # totals in DailyCumulative: two lookups whatever the range length
+        numdays = (end_date - start_date).days + 1
+        totals = rollup.range_totals(user_session(email), email, start_date, end_date + timedelta(days=1))
+        return {
+            'email': email,
+            'start_date': start_date,
+            'end_date': end_date,
+            'avg_cal_burnt': totals['cals_burnt'] / numdays,
+            'avg_cal_consumed': totals['cals_in'] / numdays,
+            'avg_protein_grams': totals['protein_grams'] / numdays,
+            'avg_carb_grams': totals['carb_grams'] / numdays
+        }
+
     def create_new_log(self, email: str, startDate: str, endDate: str):
-        user_query = text("CALL GenLog(:email, :startDate, :endDate)")
-        db.session.execute(user_query, {'email': email, 'startDate': startDate, 'endDate': endDate})
-        db.session.commit() 
-        
-    def get_all_schedule(self, email):
-        query = text("""
-            SELECT Activity, StartTime, EndTime, Day
-            FROM Schedule
-            WHERE Email = :email
-        """)
+        log = self.get_range_averages(email, rollup.to_date(startDate), rollup.to_date(endDate))
+        session = user_session(email)
+        session.execute(statements.DELETE_LOG_QUERY, log)
+        session.execute(statements.INSERT_LOG_QUERY, log)
+        session.commit()
+        return log
 
-        results = db.session.execute(query, {'email': email}).fetchall()
+    def get_all_schedule(self, email):
+        results = user_session(email).execute(statements.ALL_SCHEDULE_QUERY, {'email': email}).fetchall()
         return [{'activity': row.Activity, 'start_time': row.StartTime, 'end_time': row.EndTime, 'day': row.Day} for row in results]
 
 db_reader = DBReader()
 
+def load_percentile_rows(numdays):
+    # Runs in request threads and in the background refresher alike
+    with app.app_context():
+        return db_reader.get_all_users_activity_data(numdays)
+
+percentile_index = percentiles.PercentileIndex(
+    load_percentile_rows, max_age=getattr(config, 'PERCENTILE_INDEX_MAX_AGE', 300)
+)
+if getattr(config, 'PERCENTILE_INDEX_REFRESH_SECONDS', None):
+    percentile_index.start_refresher([6, 30], config.PERCENTILE_INDEX_REFRESH_SECONDS)
+
+def build_projection():
+    # From the primaries, like the writes it is compared against
+    with app.app_context():
+        return projection.Projection(
+            shard_router.gather(db.engines, projection.USERS_QUERY),
+            db.session.execute(projection.ACTIVITIES_QUERY).fetchall(),
+            shard_router.gather(db.engines, projection.SCHEDULE_QUERY)
+        )
+
+def build_user_projection(email, current):
+    session = user_session(email)
+    return current.project(
+        session.execute(projection.USER_QUERY, {'email': email}).fetchall(),
+        session.execute(projection.USER_SCHEDULE_QUERY, {'email': email}).fetchall()
+    ).for_user(email)
+
+projection_index = projection.ProjectionIndex(build_projection, build_user_projection, max_age=getattr(config, 'PROJECTION_MAX_AGE', 300))
+
+def make_response_cache():
+    backend = getattr(config, 'RESPONSE_CACHE_BACKEND', 'memory')
+    max_entries = getattr(config, 'RESPONSE_CACHE_MAX_ENTRIES', 10000)
+    if backend == 'file':
+        backend = response_cache.FileBackend(getattr(config, 'RESPONSE_CACHE_DIR', 'response_cache'), max_entries)
+    else:
+        backend = response_cache.MemoryBackend(max_entries)
+    return response_cache.ResponseCache(backend, ttl=getattr(config, 'RESPONSE_CACHE_TTL', 300))
+
+analytics_cache = make_response_cache()
+
+def cached_analytics(endpoint, email, numdays, compute, today=None):
+    if getattr(config, 'RESPONSE_CACHE_BACKEND', 'memory') == 'none':
+        return compute()
+    # Round-trip through the app's JSON provider so cached values (and those
+    # read back from the file backend) serialize exactly like fresh ones
+    key = (email, endpoint, numdays, (today or datetime.utcnow().date()).isoformat())
+    return analytics_cache.get_or_compute(key, lambda: app.json.loads(app.json.dumps(compute())), lambda: cacheable_read(email))
+
+def cacheable_read(email):
+    # A replica read that raced a write (possibly on another worker) may miss
+    # it, so it is served but not cached while the user is in the stickiness
+    # window; otherwise it would outlive the window and the invalidation
+    if any(db.session.info.get('read_engines', {}).values()):
+        return not read_router.is_sticky(email)
+    return True
+
+def on_user_data_changed(email, days=None):
+    # Called by the write handlers before they commit. `days` are the dates the
+    # write touched; None means everything for the user.
+    if days is None:
+        rollup.refresh_user(db.session, email)
+        on_schedule_changed(email)
+    else:
+        rollup.refresh_days(db.session, email, days)
+    db.session.info.setdefault('changed_users', set()).add(email)
+
+def on_schedule_changed(email):
+    # Schedule writes (and weight changes) make the user's projected burn stale
+    db.session.info.setdefault('schedule_changed', set()).add(email)
+
+# Cached analytics are dropped only once the write is visible to other sessions
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed_users(session):
+    changed = session.info.pop('changed_users', set())
+    for email in changed:
+        analytics_cache.invalidate_user(email)
+    # Everyone the transaction wrote for reads from the primary for a while
+    for email in changed | session.info.get('users', set()):
+        read_router.wrote(email)
+    for email in session.info.pop('schedule_changed', set()):
+        projection_index.invalidate_user(email)
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_changed_users(session):
+    session.info.pop('changed_users', None)
+    session.info.pop('schedule_changed', None)
+
 @app.route('/schedule', methods=['POST'])
 def create_schedule():
     try:
@@ -248,10 +387,7 @@ def create_schedule():
 
 
         existing_schedule = db.session.execute(
-            text("""
-                SELECT 1 FROM Schedule 
-                WHERE Email = :Email AND Day = :Day AND (:StartTime < EndTime AND :EndTime > StartTime)
-                """),
+            statements.SCHEDULE_OVERLAP_QUERY,
             {
                 "Email": data['Email'],
                 "Day": data['Day'],
@@ -261,16 +397,12 @@ def create_schedule():
         ).fetchone()
 
         if existing_schedule:
-            print("Overlap")
             return jsonify({"success": False, "message": "Schedule already exists or overlaps with a pre-existing schedule!"}), 400
 
 
         # Insert new record
         db.session.execute(
-            text("""
-                INSERT INTO Schedule (Email, Activity, Day, StartTime, EndTime)
-                VALUES (:Email, :Activity, :Day, :StartTime, :EndTime)
-            """),
+            statements.INSERT_SCHEDULE_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
@@ -279,6 +411,7 @@ def create_schedule():
                 "EndTime": end_hour
             }
         )
+        on_schedule_changed(data['Email'])
         db.session.commit()
         return jsonify({"success": True, "message": "Record created successfully!"}), 201
     except Exception as e:
@@ -292,7 +425,7 @@ def get_all_activities():
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
     data = db_reader.get_all_schedule(email)
-    return jsonify({"success": True, "data": data})
+    return jsonify({"success": True, "data": rows_data(data)})
 
 
 @app.route('/schedule', methods=['PUT'])
@@ -302,10 +435,7 @@ def update_schedule():
 
         # Check if the record exists before trying to update
         result = db.session.execute(
-            text("""
-                SELECT 1 FROM Schedule 
-                WHERE Email = :Email AND Activity = :Activity AND Day = :Day AND StartTime = :StartTime
-            """),
+            statements.SCHEDULE_EXISTS_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
@@ -324,10 +454,7 @@ def update_schedule():
             return jsonify({"success": False, "message": "Start Time must be before End Time!"}), 400
 
         check = db.session.execute(
-            text("""
-                SELECT 1 FROM Schedule 
-                WHERE Email = :Email AND Day = :Day AND Activity != :Activity AND (:StartTime < EndTime AND :EndTime > StartTime)
-                """),
+            statements.SCHEDULE_OVERLAP_OTHERS_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
@@ -343,11 +470,7 @@ def update_schedule():
 
         # Perform the update
         db.session.execute(
-            text("""
-                UPDATE Schedule 
-                SET EndTime = :EndTime
-                WHERE Email = :Email AND Activity = :Activity AND Day = :Day AND StartTime = :StartTime
-            """),
+            statements.UPDATE_SCHEDULE_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
@@ -356,6 +479,7 @@ def update_schedule():
                 "EndTime": end_hour
             }
         )
+        on_schedule_changed(data['Email'])
         db.session.commit()
 
         return jsonify({"success": True, "message": "Schedule updated successfully!"}), 200
@@ -369,10 +493,7 @@ def delete_schedule():
     # try:
         data = request.json
         result = db.session.execute(
-            text("""
-                DELETE FROM Schedule 
-                WHERE Email = :Email AND Activity = :Activity AND Day = :Day AND StartTime = :StartTime
-            """),
+            statements.DELETE_SCHEDULE_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
@@ -380,10 +501,9 @@ def delete_schedule():
                 "StartTime": data['StartTime']
             }
         )
+        on_schedule_changed(data['Email'])
         db.session.commit()
 
-        print(data['StartTime'])
-
         if result.rowcount == 0:
             return jsonify({"success": False, "message": "Record not found"}), 404
 
@@ -392,17 +512,96 @@ def delete_schedule():
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 400
 
+# Projected burn from the user's recurring week, read from the all-users
+# projection (see projection.py)
+@app.route('/schedule/projection', methods=['GET'])
+def get_schedule_projection():
+    email = request.args.get('email')
+    if not email:
+        return jsonify({"success": False, "message": "Email is required"}), 400
+    data, age = projection_index.for_user(email)
+    if data is None:
+        return jsonify({"success": False, "message": "User not found"}), 404
+    return jsonify({"success": True, "data": data, "projectionAgeSeconds": round(age, 1)})
+
+# Subscribable calendar feed. The ETag covers the user's rows and the week the
+# events are anchored on, so a polling calendar client gets a 304 until the
+# schedule changes (or a new week starts) and the feed is only rendered then.
+@app.route('/schedule.ics', methods=['GET'])
+def get_schedule_ics():
+    email = request.args.get('email')
+    if not email:
+        return jsonify({"success": False, "message": "Email is required"}), 400
+    rows = db.session.execute(statements.SCHEDULE_FEED_QUERY, {'email': email}).fetchall()
+    anchor = ical.week_start(datetime.utcnow().date())
+    etag = ical.etag(email, rows, anchor)
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(ical.calendar(email, rows, anchor), mimetype='text/calendar')
+        # ?download=1 for the export button: browsers ignore <a download> on
+        # cross-origin links, but not an attachment disposition
+        disposition = 'attachment' if request.args.get('download') in ('1', 'true') else 'inline'
+        response.headers['Content-Disposition'] = f'{disposition}; filename=schedule.ics'
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# Imports a batch of events (JSON array or NDJSON) in one transaction. Each
+# user's week is read once, locked on MySQL so a concurrent write can't slip
+# in between the check and the insert. Events that overlap the stored week or
+# an earlier event in the batch are reported and skipped; ?atomic=true writes
+# nothing unless every event is accepted.
+@app.route('/schedule/bulk', methods=['POST'])
+def create_schedule_bulk():
+    try:
+        events = bulk.parse_body(request)
+    except bulk.BulkError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    max_rows = getattr(config, 'BULK_MAX_ROWS', 5000)
+    if len(events) > max_rows:
+        return jsonify({"success": False, "message": f"At most {max_rows} events per request"}), 413
+
+    week_query = statements.SCHEDULE_WEEK_QUERY
+    if db.session.get_bind().dialect.name != 'sqlite':
+        week_query = statements.SCHEDULE_WEEK_FOR_UPDATE_QUERY
+
+    def load_week(email):
+        return [row._mapping for row in user_session(email).execute(week_query, {'email': email})]
+
+    try:
+        results, accepted = schedule_index.plan(events, load_week)
+        summary = bulk.summarize(results)
+        if request.args.get('atomic') == 'true' and len(accepted) < len(results):
+            db.session.rollback()
+            return jsonify({"success": False, "message": "Some events were rejected, nothing was written", "summary": summary, "results": results}), 409
+        for shard, rows in shard_router.group(accepted).items():
+            db.session.info['shard'] = shard
+            db.session.execute(statements.INSERT_SCHEDULE_QUERY, [row for _, row in rows])
+            for _, row in rows:
+                on_schedule_changed(row['Email'])
+        db.session.commit()
+        return jsonify({"success": True, "summary": summary, "results": results})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
+
+
+def with_datetime(data):
+    # Datetime is bound as a datetime, as bulk imports and keyset cursors do,
+    # so every write path stores it in one format (SQLite keeps it as text)
+    data['Datetime'] = bulk.to_datetime(data['Datetime'])
+    return data
 
 @app.route('/records', methods=['POST'])
 def create_record():
     try:
-        data = request.json
+        data = with_datetime(request.json)
         # Check if the record already exists
         existing_record = db.session.execute(
-            text("""
-                SELECT 1 FROM Records 
-                WHERE Email = :Email AND Activity = :Activity AND Datetime = :Datetime
-            """),
+            statements.RECORD_EXISTS_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
@@ -415,10 +614,7 @@ def create_record():
 
         # Insert new record
         db.session.execute(
-            text("""
-                INSERT INTO Records (Email, Activity, Datetime, Duration, Quality)
-                VALUES (:Email, :Activity, :Datetime, :Duration, :Quality)
-            """),
+            statements.INSERT_RECORD_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
@@ -427,70 +623,206 @@ def create_record():
                 "Quality": data['Quality']
             }
         )
+        on_user_data_changed(data['Email'], [data['Datetime']])
         db.session.commit()
         return jsonify({"success": True, "message": "Record created successfully!"}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 400
 
+def bulk_write(table):
+    try:
+        rows = bulk.parse_body(request)
+    except bulk.BulkError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    max_rows = getattr(config, 'BULK_MAX_ROWS', 5000)
+    if len(rows) > max_rows:
+        return jsonify({"success": False, "message": f"At most {max_rows} rows per request"}), 413
+
+    try:
+        update = request.args.get('onConflict') == 'update'
+        results = [None] * len(rows)
+        # Each shard's rows are written (and their rollups refreshed) on that
+        # shard; the commit covers every shard the batch touched
+        for shard, indexed in shard_router.group(rows).items():
+            db.session.info['shard'] = shard
+            shard_results, written = bulk.write(db.session, table, [row for _, row in indexed], update=update)
+            for (index, _), result in zip(indexed, shard_results):
+                results[index] = dict(result, index=index)
+            for email, days in written.items():
+                on_user_data_changed(email, days)
+        db.session.commit()
+        return jsonify({"success": True, "summary": bulk.summarize(results), "results": results})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
+
+# Accepts a JSON array or an NDJSON body of records. ?onConflict=update
+# overwrites Duration and Quality of existing records instead of skipping them.
+@app.route('/records/bulk', methods=['POST'])
+def create_records_bulk():
+    return bulk_write(bulk.RECORDS)
+
 @app.route('/saved_logs', methods=['GET'])
 def get_all_logs():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
     data = db_reader.get_all_logs_data(email)
-    return jsonify({"success": True, "data": data})
+    return jsonify({"success": True, "data": rows_data(data, {'email': email})})
+
+log_jobs = jobs.JobQueue(
+    max_workers=getattr(config, 'LOG_JOB_WORKERS', 2),
+    max_pending=getattr(config, 'LOG_JOB_MAX_PENDING', 100),
+    retention=getattr(config, 'LOG_JOB_RETENTION', 3600)
+)
+
+def averages_to_dict(log):
+    return {
+        'email': log['email'],
+        'startDate': log['start_date'].isoformat(),
+        'endDate': log['end_date'].isoformat(),
+        'avgCalBurnt': log['avg_cal_burnt'],
+        'avgCalConsumed': log['avg_cal_consumed'],
+        'avgProteinGrams': log['avg_protein_grams'],
+        'avgCarbGrams': log['avg_carb_grams']
+    }
+
+def generate_log(email, startDate, endDate):
+    # Runs on a job worker thread, which has no app context of its own
+    with app.app_context():
+        return averages_to_dict(db_reader.create_new_log(email, startDate, endDate))
+
+def job_accepted(job):
+    response = jsonify({"success": True, "jobId": job.id, "status": job.status, "statusUrl": f"/saved_logs/jobs/{job.id}"})
+    response.status_code = 202
+    response.headers['Location'] = f"/saved_logs/jobs/{job.id}"
+    return response
 
 @app.route('/saved_logs', methods=['POST'])
 def post_new_log():
+    # Generation runs in the background: the response is 202 with a job id to
+    # poll, and a repeat of a request that is still in flight joins its job
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
 
     data = request.json
-    if not data['startDate']:
+    if not data.get('startDate'):
         return jsonify({"success": False, "message": "Start Date is required"}), 400
 
-    if not data['endDate']:
+    if not data.get('endDate'):
         return jsonify({"success": False, "message": "End Date is required"}), 400
 
-    data = db_reader.create_new_log(email, data['startDate'], data['endDate'])
-    return jsonify({"success": True, "message": "Log created successfully!"}), 201
-
-
-@app.route('/records', methods=['GET'])
-def get_records():
     try:
-        email = request.args.get('email')
-        if email:
-            records = db.session.execute(
-                text("""
-                    SELECT * FROM Records WHERE Email = :Email
-                """),
-                {"Email": email}
-            ).fetchall()
-        else:
-            records = db.session.execute(
-                text("""
-                    SELECT * FROM Records
-                """)
-            ).fetchall()
+        start_date = rollup.to_date(data['startDate'])
+        end_date = rollup.to_date(data['endDate'])
+    except ValueError:
+        return jsonify({"success": False, "message": "Dates must be YYYY-MM-DD"}), 400
+    if end_date < start_date:
+        return jsonify({"success": False, "message": "End Date must not be before Start Date"}), 400
+
+    key = (email, start_date.isoformat(), end_date.isoformat())
+    try:
+        job, _ = log_jobs.submit(key, lambda: generate_log(*key))
+    except jobs.JobQueueFull:
+        response = jsonify({"success": False, "message": "Too many logs are being generated, try again shortly"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    return job_accepted(job)
+
+@app.route('/saved_logs/averages', methods=['GET'])
+def get_range_averages():
+    # Ad-hoc comparison of any number of ranges without saving a log:
+    # ?email=&range=2024-01-01:2024-01-31&range=2024-02-01:2024-02-29
+    email = request.args.get('email')
+    if not email:
+        return jsonify({"success": False, "message": "Email is required"}), 400
+    ranges = request.args.getlist('range')
+    if not ranges:
+        return jsonify({"success": False, "message": "At least one range=start:end is required"}), 400
+    if len(ranges) > getattr(config, 'AVERAGES_MAX_RANGES', 50):
+        return jsonify({"success": False, "message": "Too many ranges"}), 400
+
+    data = []
+    for value in ranges:
+        try:
+            start, end = (rollup.to_date(part) for part in value.split(':'))
+        except ValueError:
+            return jsonify({"success": False, "message": f"Invalid range {value!r}, expected YYYY-MM-DD:YYYY-MM-DD"}), 400
+        if end < start:
+            return jsonify({"success": False, "message": f"Range {value!r} ends before it starts"}), 400
+        data.append(averages_to_dict(db_reader.get_range_averages(email, start, end)))
+    return jsonify({"success": True, "data": rows_data(data, {'email': email})})
+
+@app.route('/saved_logs/jobs/<job_id>', methods=['GET'])
+def get_log_job(job_id):
+    job = log_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify({"success": True, "data": job.to_dict()})
+
+
+def list_rows(listing, to_dict):
+    # Without paging or streaming parameters this returns every matching row,
+    # as before. ?limit=&cursor= pages by keyset, ?start=&end= (dates,
+    # inclusive) narrow the range, and ?stream=ndjson|json streams rows from a
+    # server-side cursor instead of building the whole list in memory.
+    try:
+        start, end = pagination.parse_date_range(request.args)
+        limit = pagination.parse_limit(request.args, getattr(config, 'PAGE_MAX_LIMIT', 1000))
+        query, params = pagination.build_query(
+            listing,
+            email=request.args.get('email'),
+            start=start,
+            end=end,
+            cursor=request.args.get('cursor'),
+            limit=limit + 1 if limit else None
+        )
 
-        return jsonify({"success": True, "data": [record_to_dict(record) for record in records]})
+        stream = request.args.get('stream')
+        if stream in ('ndjson', 'json') and formats.is_columnar(request.args):
+            raise pagination.PageError("format=columnar cannot be combined with stream")
+        if request.args.get('email') or len(shard_router.names) == 1:
+            rows = None
+        else:
+            # Every user on every shard, merged in the same keyset order so
+            # cursors work across shards; each shard stops at limit + 1 rows
+            rows = shard_router.merge(read_engines(), query, params, key=listing.key)
+        if stream in ('ndjson', 'json'):
+            if rows is None:
+                rows = db.session.execute(query, params, execution_options={'stream_results': True, 'yield_per': 500})
+            if stream == 'ndjson':
+                return Response(stream_with_context(pagination.stream_ndjson(rows, to_dict)), mimetype='application/x-ndjson')
+            return Response(stream_with_context(pagination.stream_json(rows, to_dict)), mimetype='application/json')
+
+        if rows is None:
+            rows = db.session.execute(query, params).fetchall()
+        else:
+            merged, rows = rows, list(islice(rows, limit + 1) if limit else rows)
+            merged.close()
+        constants = {'Email': request.args.get('email')}
+        if not limit:
+            return jsonify({"success": True, "data": rows_data([to_dict(row) for row in rows], constants)})
+        next_cursor = pagination.encode_cursor(rows[limit - 1], listing) if len(rows) > limit else None
+        return jsonify({"success": True, "data": rows_data([to_dict(row) for row in rows[:limit]], constants), "nextCursor": next_cursor})
+    except pagination.PageError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
+@app.route('/records', methods=['GET'])
+def get_records():
+    return list_rows(pagination.RECORDS, record_to_dict)
+
 
 @app.route('/records', methods=['PUT'])
 def update_record():
     try:
-        data = request.json
+        data = with_datetime(request.json)
         result = db.session.execute(
-            text("""
-                UPDATE Records 
-                SET Duration = :Duration, Quality = :Quality 
-                WHERE Email = :Email AND Activity = :Activity AND Datetime = :Datetime
-            """),
+            statements.UPDATE_RECORD_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
@@ -499,6 +831,7 @@ def update_record():
                 "Quality": data.get('Quality')
             }
         )
+        on_user_data_changed(data['Email'], [data['Datetime']])
         db.session.commit()
 
         if result.rowcount == 0:
@@ -513,18 +846,16 @@ def update_record():
 @app.route('/records', methods=['DELETE'])
 def delete_record():
     try:
-        data = request.json
+        data = with_datetime(request.json)
         result = db.session.execute(
-            text("""
-                DELETE FROM Records 
-                WHERE Email = :Email AND Activity = :Activity AND Datetime = :Datetime
-            """),
+            statements.DELETE_RECORD_QUERY,
             {
                 "Email": data['Email'],
                 "Activity": data['Activity'],
                 "Datetime": data['Datetime']
             }
         )
+        on_user_data_changed(data['Email'], [data['Datetime']])
         db.session.commit()
 
         if result.rowcount == 0:
@@ -539,13 +870,10 @@ def delete_record():
 @app.route('/meals', methods=['POST'])
 def create_meals():
     try:
-        data = request.json
+        data = with_datetime(request.json)
         # Check if the meal already exists
         existing_meal = db.session.execute(
-            text("""
-                SELECT 1 FROM Meals 
-                WHERE Email = :Email AND FoodName = :FoodName AND Datetime = :Datetime
-            """),
+            statements.MEAL_EXISTS_QUERY,
             {
                 "Email": data['Email'],
                 "FoodName": data['FoodName'],
@@ -558,16 +886,14 @@ def create_meals():
 
         # Insert new meal
         db.session.execute(
-            text("""
-                INSERT INTO Meals (Email, FoodName, Datetime)
-                VALUES (:Email, :FoodName, :Datetime)
-            """),
+            statements.INSERT_MEAL_QUERY,
             {
                 "Email": data['Email'],
                 "FoodName": data['FoodName'],
                 "Datetime": data['Datetime']
             }
         )
+        on_user_data_changed(data['Email'], [data['Datetime']])
         db.session.commit()
         return jsonify({"success": True, "message": "Meal created successfully!"}), 201
     except Exception as e:
@@ -575,39 +901,22 @@ def create_meals():
         return jsonify({"success": False, "error": str(e)}), 400
 
 
+@app.route('/meals/bulk', methods=['POST'])
+def create_meals_bulk():
+    return bulk_write(bulk.MEALS)
+
+
 @app.route('/meals', methods=['GET'])
 def get_meals():
-    try:
-        email = request.args.get('email')
-        if email:
-            meals = db.session.execute(
-                text("""
-                    SELECT * FROM Meals WHERE Email = :Email
-                """),
-                {"Email": email}
-            ).fetchall()
-        else:
-            meals = db.session.execute(
-                text("""
-                    SELECT * FROM Meals
-                """)
-            ).fetchall()
-
-        return jsonify({"success": True, "data": [meal_to_dict(meal) for meal in meals]})
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 400
+    return list_rows(pagination.MEALS, meal_to_dict)
 
 
 @app.route('/meals', methods=['PUT'])
 def update_meal():
     try:
-        data = request.json
+        data = with_datetime(request.json)
         result = db.session.execute(
-            text("""
-                UPDATE Meals 
-                SET FoodName = :FoodName 
-                WHERE Email = :Email AND FoodName = :OldFoodName AND Datetime = :Datetime
-            """),
+            statements.UPDATE_MEAL_QUERY,
             {
                 "Email": data['Email'],
                 "OldFoodName": data['OldFoodName'],  # Pass old FoodName to identify the record
@@ -615,6 +924,7 @@ def update_meal():
                 "Datetime": data['Datetime']
             }
         )
+        on_user_data_changed(data['Email'], [data['Datetime']])
         db.session.commit()
 
         if result.rowcount == 0:
@@ -629,18 +939,16 @@ def update_meal():
 @app.route('/meals', methods=['DELETE'])
 def delete_meal():
     try:
-        data = request.json
+        data = with_datetime(request.json)
         result = db.session.execute(
-            text("""
-                DELETE FROM Meals 
-                WHERE Email = :Email AND FoodName = :FoodName AND Datetime = :Datetime
-            """),
+            statements.DELETE_MEAL_QUERY,
             {
                 "Email": data['Email'],
                 "FoodName": data['FoodName'],
                 "Datetime": data['Datetime']
             }
         )
+        on_user_data_changed(data['Email'], [data['Datetime']])
         db.session.commit()
 
         if result.rowcount == 0:
@@ -651,81 +959,166 @@ def delete_meal():
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 400
 
+reference_data = reference_cache.ReferenceCache(ttl=getattr(config, 'REFERENCE_CACHE_TTL', 300))
+
+def reference_response(name, load):
+    entry = reference_data.get(name, load)
+    response = Response(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = getattr(config, 'REFERENCE_CACHE_MAX_AGE', 60)
+    return response.make_conditional(request)
+
+def load_foodnames():
+    foodnames = db.session.execute(statements.FOODNAMES_QUERY).fetchall()
+    return [row[0] for row in foodnames]
+
+def load_activitynames():
+    activitynames = db.session.execute(statements.ACTIVITYNAMES_QUERY).fetchall()
+    return [row[0] for row in activitynames]
+
 @app.route('/foodnames', methods=['GET'])
 def get_foodnames():
     try:
-        foodnames = db.session.execute(
-            text("""
-                SELECT FoodName FROM Food
-            """)
-        ).fetchall()
-
-        foodnames_list = [row[0] for row in foodnames]  
-        return jsonify({"success": True, "data": foodnames_list})
+        return reference_response('foodnames', load_foodnames)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
 @app.route('/activitynames', methods=['GET'])
 def get_activitynames():
     try:
-        activitynames = db.session.execute(
-            text("""
-                SELECT ActivityName FROM Activities
-            """)
-        ).fetchall()
-
-        activitynames_list = [row[0] for row in activitynames]  
-        return jsonify({"success": True, "data": activitynames_list})
+        return reference_response('activitynames', load_activitynames)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+# Call after reloading the Food or Activities tables so this worker rebuilds
+# its copy of the reference data and search indexes right away; other workers
+# reload theirs within REFERENCE_CACHE_TTL seconds. Needs X-Admin-Token.
+@app.route('/reference/invalidate', methods=['POST'])
+def invalidate_reference_data():
+    if not is_admin():
+        return jsonify({"success": False, "message": "Admin token required"}), 403
+    reference_data.invalidate()
+    return jsonify({"success": True, "message": "Reference data cache cleared"})
+
+def load_food_search_items():
+    with app.app_context():
+        rows = db.session.execute(statements.FOOD_SEARCH_SOURCE_QUERY).fetchall()
+    return [(row.FoodName, {
+        'calories': row.Calories,
+        'proteinGrams': row.ProteinGrams,
+        'carbGrams': row.CarbGrams,
+        'highlyProcessed': bool(row.HighlyProcessed)
+    }) for row in rows]
+
+def load_activity_search_items():
+    with app.app_context():
+        rows = db.session.execute(statements.ACTIVITY_SEARCH_SOURCE_QUERY).fetchall()
+    return [(row.ActivityName, {'caloriesPerKg': row.CaloriesPerKg}) for row in rows]
+
+search_indexes = search.SearchIndexes({
+    'food': load_food_search_items,
+    'activities': load_activity_search_items
+}, max_age=getattr(config, 'REFERENCE_CACHE_TTL', 300))
+if getattr(config, 'SEARCH_WARM_ON_START', True):
+    search_indexes.warm()
+
+@reference_data.on_invalidate
+def rebuild_search_indexes(name):
+    # The search indexes follow the reference cache: /reference/invalidate
+    # rebuilds both, in the background
+    if name is None:
+        search_indexes.rebuild()
+    elif name in ('foodnames', 'activitynames'):
+        search_indexes.rebuild('food' if name == 'foodnames' else 'activities')
+
+def search_response(name):
+    try:
+        limit = pagination.parse_limit(request.args, getattr(config, 'SEARCH_MAX_LIMIT', 50)) or 10
+        results = search_indexes.get(name).search(request.args.get('q', ''), limit)
+        return jsonify({"success": True, "data": rows_data(results)})
+    except pagination.PageError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
+# Ranked, typo-tolerant name lookups for the meal and record forms:
+# ?q=chiken&limit=10 returns the closest names with their nutrition data
+@app.route('/food/search', methods=['GET'])
+def search_food():
+    return search_response('food')
+
+@app.route('/activities/search', methods=['GET'])
+def search_activities():
+    return search_response('activities')
+
 @app.route('/weekly/calories', methods=['GET'])
 def get_weekly_calories():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
-    data = db_reader.get_cal_data(email,6)
-    return jsonify({"success": True, "data": data})
+    try:
+        today = date_ranges.local_today(request.args.get('tz'))
+    except date_ranges.RangeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    data = cached_analytics('calories', email, 6, lambda: db_reader.get_cal_data(email, 6, today), today)
+    return jsonify({"success": True, "data": rows_data(data)})
 
 @app.route('/daily/calories', methods=['GET'])
 def get_daily_calories():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
-    data = db_reader.get_cal_data(email,0)
-    return jsonify({"success": True, "data": data})
+    try:
+        today = date_ranges.local_today(request.args.get('tz'))
+    except date_ranges.RangeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    data = cached_analytics('calories', email, 0, lambda: db_reader.get_cal_data(email, 0, today), today)
+    return jsonify({"success": True, "data": rows_data(data)})
 
 @app.route('/weekly/activities', methods=['GET'])
 def get_weekly_activities():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
-    data = db_reader.get_activity_data(email, 6)
-    return jsonify({"success": True, "data": data})
+    try:
+        today = date_ranges.local_today(request.args.get('tz'))
+    except date_ranges.RangeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    data = cached_analytics('activities', email, 6, lambda: db_reader.get_activity_data(email, 6, today), today)
+    return jsonify({"success": True, "data": rows_data(data)})
 
 @app.route('/weekly/activitiescalories', methods=['GET'])
 def get_weekly_activitiescalories():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
-    data = db_reader.get_total_calories_per_day(email, 6)
-    return jsonify({"success": True, "data": data})
+    try:
+        today = date_ranges.local_today(request.args.get('tz'))
+    except date_ranges.RangeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    data = cached_analytics('activitiescalories', email, 6, lambda: db_reader.get_total_calories_per_day(email, 6, today), today)
+    return jsonify({"success": True, "data": rows_data(data)})
 
 @app.route('/weekly/percentiles', methods=['GET'])
 def get_weekly_percentiles():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
-    data = db_reader.get_activity_percentile_data(email,6)
-    return jsonify({"success": True, "data": data})
+    data, index_age = db_reader.get_activity_percentile_data(email, 6)
+    return jsonify({"success": True, "data": rows_data(data), "indexAgeSeconds": index_age})
 
 @app.route('/monthly/calories', methods=['GET'])
 def get_monthly_calories():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
-    data = db_reader.get_cal_data(email,30)
-    return jsonify({"success": True, "data": data})
+    try:
+        today = date_ranges.local_today(request.args.get('tz'))
+    except date_ranges.RangeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    data = cached_analytics('calories', email, 30, lambda: db_reader.get_cal_data(email, 30, today), today)
+    return jsonify({"success": True, "data": rows_data(data)})
 
 
 @app.route('/monthly/activities', methods=['GET'])
@@ -733,8 +1126,12 @@ def get_monthly_activities():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
-    data = db_reader.get_activity_data(email, 30)
-    return jsonify({"success": True, "data": data})
+    try:
+        today = date_ranges.local_today(request.args.get('tz'))
+    except date_ranges.RangeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    data = cached_analytics('activities', email, 30, lambda: db_reader.get_activity_data(email, 30, today), today)
+    return jsonify({"success": True, "data": rows_data(data)})
 
 
 @app.route('/monthly/percentiles', methods=['GET'])
@@ -742,9 +1139,81 @@ def get_monthly_percentiles():
     email = request.args.get('email')
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
-    data = db_reader.get_activity_percentile_data(email,30)
+    data, index_age = db_reader.get_activity_percentile_data(email, 30)
+    return jsonify({"success": True, "data": rows_data(data), "indexAgeSeconds": index_age})
+
+DASHBOARD_WINDOWS = {'week': 6, 'month': 30}
+
+@app.route('/dashboard', methods=['GET'])
+def get_dashboard():
+    email = request.args.get('email')
+    if not email:
+        return jsonify({"success": False, "message": "Email is required"}), 400
+    window = request.args.get('window', 'week')
+    if window not in DASHBOARD_WINDOWS:
+        return jsonify({"success": False, "message": "Window must be 'week' or 'month'"}), 400
+    numdays = DASHBOARD_WINDOWS[window]
+    try:
+        today = date_ranges.local_today(request.args.get('tz'))
+    except date_ranges.RangeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    data = dict(cached_analytics('dashboard', email, numdays, lambda: db_reader.get_dashboard_series(email, numdays, today), today))
+    data['percentiles'], data['percentilesAgeSeconds'] = db_reader.get_activity_percentile_data(email, numdays)
+    for key, value in data.items():
+        if isinstance(value, list):
+            data[key] = rows_data(value)
     return jsonify({"success": True, "data": data})
 
+@app.route('/analytics/range', methods=['GET'])
+def get_analytics_range():
+    # ?start=&end= are inclusive dates (default: the 30 days up to the user's
+    # today), granularity=day|week|month, tz= an IANA zone such as
+    # America/Chicago (default UTC)
+    email = request.args.get('email')
+    if not email:
+        return jsonify({"success": False, "message": "Email is required"}), 400
+    try:
+        today = date_ranges.local_today(request.args.get('tz'))
+        start, end, granularity = date_ranges.parse_range(
+            request.args, today, max_days=getattr(config, 'ANALYTICS_MAX_DAYS', 3660)
+        )
+    except date_ranges.RangeError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    window = f"{start.isoformat()}:{end.isoformat()}:{granularity}"
+    series = cached_analytics('range', email, window, lambda: db_reader.get_range_series(email, start, end, granularity), today)
+    return jsonify({
+        "success": True,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        "today": today.isoformat(),
+        "data": rows_data(series)
+    })
+
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({"success": True, "data": analytics_cache.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def is_admin():
+    token = getattr(config, 'ADMIN_TOKEN', None)
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+@app.route('/debug/slow-queries', methods=['GET', 'DELETE'])
+def slow_query_entries():
+    if not is_admin():
+        return jsonify({"success": False, "message": "Admin token required"}), 403
+    if slow_query_log is None:
+        return jsonify({"success": False, "message": "Slow-query capture is disabled"}), 404
+    if request.method == 'DELETE':
+        slow_query_log.clear()
+        return jsonify({"success": True})
+    limit = request.args.get('limit', type=int)
+    return jsonify({"success": True, "thresholdMs": slow_query_log.threshold * 1000, "data": slow_query_log.recent(limit)})
+
 @app.route('/user', methods=['POST'])
 def add_or_update_user():
     try:
@@ -763,24 +1232,14 @@ def add_or_update_user():
 
         # Check if the user already exists
         user_exists = db.session.execute(
-            text("SELECT 1 FROM UserStorage WHERE Email = :email"),
+            statements.USER_WEIGHT_QUERY,
             {"email": email}
         ).fetchone()
 
         if user_exists:
             # Update the user's information
             db.session.execute(
-                text("""
-                    UPDATE UserStorage
-                    SET FirstName = :first_name,
-                        LastName = :last_name,
-                        Age = :age,
-                        Weight = :weight,
-                        Sex = :sex,
-                        Insomnia = :insomnia,
-                        MaintenanceCalories = :maintenance_calories
-                    WHERE Email = :email
-                """),
+                statements.UPDATE_USER_QUERY,
                 {
                     "email": email,
                     "first_name": first_name,
@@ -795,11 +1254,7 @@ def add_or_update_user():
         else:
             # Insert new user
             db.session.execute(
-                text("""
-                    INSERT INTO UserStorage 
-                    (Email, FirstName, LastName, Age, Weight, Sex, Insomnia, MaintenanceCalories)
-                    VALUES (:email, :first_name, :last_name, :age, :weight, :sex, :insomnia, :maintenance_calories)
-                """),
+                statements.INSERT_USER_QUERY,
                 {
                     "email": email,
                     "first_name": first_name,
@@ -811,6 +1266,13 @@ def add_or_update_user():
                     "maintenance_calories": maintenance_calories
                 }
             )
+        # Logged records keep the weight they were stored with; only records
+        # still waiting for a weight pick it up, and the projection uses the new one
+        if not user_exists or float(user_exists.Weight or 0) != float(weight):
+            if rollup.backfill_user(db.session, email):
+                on_user_data_changed(email)
+            else:
+                on_schedule_changed(email)
         db.session.commit()
         return jsonify({"success": True, "message": "User information saved successfully!"}), 201
     except Exception as e:
@@ -823,8 +1285,7 @@ def check_user_completeness():
     if not email:
         return jsonify({"success": False, "message": "Email is required"}), 400
 
-    query = text("SELECT * FROM UserStorage WHERE Email = :email")
-    user = db.session.execute(query, {"email": email}).fetchone()
+    user = db.session.execute(statements.USER_QUERY, {"email": email}).fetchone()
 
     if user:
         # Check for required fields
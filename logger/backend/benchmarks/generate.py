@@ -0,0 +1,144 @@
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.schema import create_tables
+
+# Deterministic synthetic data: the same --rows/--seed/--anchor always yields
+# the same rows. `rows` sizes the fact tables (Records, Meals); the other
+# tables scale with it the way production does (users log ~100 rows each).
+
+DAYS = ['M', 'T', 'W', 'R', 'F', 'S', 'U']
+HISTORY_DAYS = 90
+BATCH_SIZE = 10000
+
+def table_sizes(rows):
+    users = max(5, rows // 100)
+    return {
+        'UserStorage': users,
+        'Activities': max(10, min(248, rows // 20)),
+        'Food': max(20, min(100000, rows // 10)),
+        'Records': rows,
+        'Meals': rows,
+        'Schedule': min(rows, users * 7 * 4),
+    }
+
+def emails(count):
+    return [f'user{i:07d}@example.com' for i in range(count)]
+
+def generate_users(rng, count):
+    for email in emails(count):
+        yield {
+            'Email': email,
+            'FirstName': 'First',
+            'LastName': 'Last',
+            'Age': rng.randint(18, 80),
+            'Weight': round(rng.uniform(45, 130), 1),
+            'Sex': rng.choice('MF'),
+            'Insomnia': rng.randint(0, 1),
+            'MaintenanceCalories': rng.randint(1500, 3200),
+        }
+
+def generate_activities(rng, count):
+    for i in range(count):
+        yield {'ActivityName': f'Activity {i:03d}', 'CaloriesPerKg': round(rng.uniform(0.9, 12.0), 3)}
+
+def generate_food(rng, count):
+    for i in range(count):
+        yield {
+            'FoodName': f'Food {i:06d}',
+            'Calories': rng.randint(20, 900),
+            'ProteinGrams': round(rng.uniform(0, 40), 1),
+            'CarbGrams': round(rng.uniform(0, 120), 1),
+            'HighlyProcessed': 1 if rng.random() < 0.3 else 0,
+        }
+
+def unique_keys(rng, count, left, right):
+    # (left index, right index, minute offset) triples, drawn until `count`
+    # distinct ones exist; ints keep the seen-set small at 1M rows
+    seen = set()
+    minutes = HISTORY_DAYS * 24 * 60
+    while len(seen) < count:
+        key = (rng.randrange(left), rng.randrange(right), rng.randrange(minutes))
+        if key not in seen:
+            seen.add(key)
+            yield key
+
+def generate_records(rng, count, users, activities, anchor):
+    for user, activity, minute in unique_keys(rng, count, len(users), len(activities)):
+        yield {
+            'Email': users[user],
+            'Activity': activities[activity],
+            'Datetime': anchor - timedelta(minutes=minute),
+            'Duration': rng.randint(5, 180),
+            'Quality': rng.randint(1, 5),
+        }
+
+def generate_meals(rng, count, users, foods, anchor):
+    for user, food, minute in unique_keys(rng, count, len(users), len(foods)):
+        yield {'Email': users[user], 'FoodName': foods[food], 'Datetime': anchor - timedelta(minutes=minute)}
+
+def generate_schedule(rng, count, users, activities):
+    # Non-overlapping hour blocks, one per (user, activity, day) as the key requires
+    produced = 0
+    for email in users:
+        for day in DAYS:
+            hour = rng.randint(0, 6)
+            for activity in rng.sample(activities, min(4, len(activities))):
+                if produced >= count or hour >= 24:
+                    break
+                end = min(24, hour + rng.randint(1, 4))
+                yield {'Email': email, 'Activity': activity, 'Day': day, 'StartTime': hour, 'EndTime': end}
+                produced += 1
+                hour = end + rng.randint(0, 2)
+        if produced >= count:
+            return
+
+def insert(conn, table, rows):
+    batch = []
+    statement = None
+    for row in rows:
+        if statement is None:
+            columns = list(row)
+            statement = text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})")
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            conn.execute(statement, batch)
+            batch = []
+    if batch:
+        conn.execute(statement, batch)
+
+def generate(engine, rows, seed=0, anchor=None):
+    anchor = (anchor or datetime.utcnow()).replace(second=0, microsecond=0)
+    sizes = table_sizes(rows)
+    rng = random.Random(seed)
+    users = emails(sizes['UserStorage'])
+    activities = [f'Activity {i:03d}' for i in range(sizes['Activities'])]
+    foods = [f'Food {i:06d}' for i in range(sizes['Food'])]
+
+    with engine.begin() as conn:
+        create_tables(conn)
+        insert(conn, 'UserStorage', generate_users(rng, sizes['UserStorage']))
+        insert(conn, 'Activities', generate_activities(rng, sizes['Activities']))
+        insert(conn, 'Food', generate_food(rng, sizes['Food']))
+        insert(conn, 'Records', generate_records(rng, sizes['Records'], users, activities, anchor))
+        insert(conn, 'Meals', generate_meals(rng, sizes['Meals'], users, foods, anchor))
+        insert(conn, 'Schedule', generate_schedule(rng, sizes['Schedule'], users, activities))
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description="Load deterministic synthetic data into a SQLite stand-in")
+    parser.add_argument('--db', required=True, help="SQLite file to create")
+    parser.add_argument('--rows', type=int, default=10000, help="Rows in Records and Meals (100 to 1000000)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--anchor', type=datetime.fromisoformat, help="Newest timestamp (default: now, UTC)")
+    args = parser.parse_args()
+
+    sizes = generate(create_engine(f'sqlite:///{args.db}'), args.rows, args.seed, args.anchor)
+    for table, count in sizes.items():
+        print(f"{table}: {count}")
+
+if __name__ == "__main__":
+    main()
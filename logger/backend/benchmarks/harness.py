@@ -0,0 +1,90 @@
+import math
+import sys
+import time
+import types
+
+from sqlalchemy import event, text
+
+def load_app(database_uri, **settings):
+    # app.py reads the (untracked) config module at import time, so point it at
+    # the benchmark database before the first import.
+    try:
+        import config
+    except ImportError:
+        config = types.ModuleType('config')
+        sys.modules['config'] = config
+    config.SQLALCHEMY_DATABASE_URI = database_uri
+    for name, value in settings.items():
+        setattr(config, name, value)
+
+    import app
+    return app
+
+
+class QueryCounter:
+    # Counts statements and DB time through engine events. "Scan work" is the
+    # engine's own measure of rows touched: Handler_read_* on MySQL, virtual
+    # machine steps on the SQLite stand-in.
+    SQLITE_STEP = 100
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.vm_steps = 0
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', self.on_connect)
+            engine.dispose()
+
+    @property
+    def scan_unit(self):
+        return 'vm_steps' if self.engine.dialect.name == 'sqlite' else 'rows'
+
+    def on_connect(self, dbapi_connection, connection_record):
+        dbapi_connection.set_progress_handler(self.on_progress, self.SQLITE_STEP)
+
+    def on_progress(self):
+        self.vm_steps += self.SQLITE_STEP
+        return 0
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.db_seconds += time.perf_counter() - conn.info['query_start'].pop()
+        self.queries += 1
+
+    def scan_work(self):
+        if self.engine.dialect.name == 'sqlite':
+            return self.vm_steps
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SHOW GLOBAL STATUS LIKE 'Handler_read%'")).fetchall()
+        return sum(int(row[1]) for row in rows)
+
+    def snapshot(self):
+        return self.queries, self.db_seconds, self.scan_work()
+
+
+def percentile(sorted_samples, pct):
+    # Nearest-rank percentile
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+def summarize(samples, queries, db_seconds, scan_work, errors):
+    samples = sorted(samples)
+    count = len(samples) or 1
+    return {
+        'iterations': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'mean_ms': round(sum(samples) / count * 1000, 3),
+        'queries_per_call': round(queries / count, 2),
+        'db_ms_per_call': round(db_seconds / count * 1000, 3),
+        'scan_work_per_call': round(scan_work / count, 1),
+        'errors': errors,
+    }
@@ -0,0 +1,406 @@
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from sqlalchemy import create_engine, text
+from werkzeug.serving import make_server
+
+from benchmarks import generate
+from benchmarks.harness import load_app, percentile
+
+# Concurrent end-to-end load: starts the app on a local port, then simulated
+# users (one thread and keep-alive connection each) replay a weighted mix of
+# the real routes as fast as they can, or with --think-ms between requests.
+# Each concurrency level runs for --duration seconds after --warmup seconds
+# whose requests are not counted:
+#
+#   python -m benchmarks.loadtest --rows 100000 --users 1,2,4,8,16,32
+#   python -m benchmarks.loadtest --mix dashboard=5,log_record=5 --out load.json
+#
+# The saturation point is the last level that still raised throughput by
+# --min-gain without exceeding --max-error-rate. Without --database-uri the
+# data is loaded into a throwaway SQLite file, where concurrent writers queue
+# on the database lock rather than on row locks.
+
+Request = namedtuple('Request', 'label method path body on_success', defaults=(None, None))
+
+
+class SimulatedUser:
+    def __init__(self, email, rng, activities, foods, clock, base):
+        self.email = email
+        self.rng = rng
+        self.activities = activities
+        self.foods = foods
+        self.clock = clock
+        self.base = base
+        self.records = []
+        self.meals = []
+
+    def query(self):
+        return f'email={quote(self.email)}'
+
+    def next_datetime(self):
+        # Shared across users so no two writes collide on a timestamp
+        return (self.base + timedelta(seconds=next(self.clock))).isoformat()
+
+
+def open_dashboard(user):
+    return Request('GET /dashboard', 'GET', f'/dashboard?{user.query()}&window=week')
+
+def daily_calories(user):
+    return Request('GET /daily/calories', 'GET', f'/daily/calories?{user.query()}')
+
+def weekly_calories(user):
+    return Request('GET /weekly/calories', 'GET', f'/weekly/calories?{user.query()}')
+
+def weekly_activities(user):
+    return Request('GET /weekly/activities', 'GET', f'/weekly/activities?{user.query()}')
+
+def weekly_percentiles(user):
+    return Request('GET /weekly/percentiles', 'GET', f'/weekly/percentiles?{user.query()}')
+
+def list_records(user):
+    return Request('GET /records', 'GET', f'/records?{user.query()}&limit=100')
+
+def list_meals(user):
+    return Request('GET /meals', 'GET', f'/meals?{user.query()}&limit=100')
+
+def search_food(user):
+    # What a user has typed a few letters into, typo included
+    name = user.rng.choice(user.foods).replace('Food', 'Fod')
+    return Request('GET /food/search', 'GET', f'/food/search?q={quote(name[:user.rng.randint(4, len(name))])}')
+
+def log_record(user):
+    record = {
+        'Email': user.email,
+        'Activity': user.rng.choice(user.activities),
+        'Datetime': user.next_datetime(),
+        'Duration': user.rng.randint(10, 90),
+        'Quality': user.rng.randint(1, 5),
+    }
+    return Request('POST /records', 'POST', '/records', record, lambda: user.records.append(record))
+
+def delete_record(user):
+    if not user.records:
+        return log_record(user)
+    record = user.records.pop()
+    body = {key: record[key] for key in ('Email', 'Activity', 'Datetime')}
+    return Request('DELETE /records', 'DELETE', '/records', body)
+
+def log_meal(user):
+    meal = {'Email': user.email, 'FoodName': user.rng.choice(user.foods), 'Datetime': user.next_datetime()}
+    return Request('POST /meals', 'POST', '/meals', meal, lambda: user.meals.append(meal))
+
+def edit_meal(user):
+    if not user.meals:
+        return log_meal(user)
+    meal = user.meals[-1]
+    body = {'Email': user.email, 'OldFoodName': meal['FoodName'], 'FoodName': user.rng.choice(user.foods), 'Datetime': meal['Datetime']}
+    return Request('PUT /meals', 'PUT', '/meals', body, lambda: meal.update(FoodName=body['FoodName']))
+
+# Relative weights: mostly reads, with a steady share of logging and edits
+SCENARIOS = {
+    'dashboard': (open_dashboard, 20),
+    'daily_calories': (daily_calories, 10),
+    'weekly_calories': (weekly_calories, 10),
+    'weekly_activities': (weekly_activities, 5),
+    'weekly_percentiles': (weekly_percentiles, 5),
+    'list_records': (list_records, 8),
+    'list_meals': (list_meals, 8),
+    'search_food': (search_food, 10),
+    'log_record': (log_record, 10),
+    'delete_record': (delete_record, 2),
+    'log_meal': (log_meal, 8),
+    'edit_meal': (edit_meal, 4),
+}
+
+def parse_mix(value):
+    # "dashboard=20,log_record=10"; scenarios left out are not run
+    if not value:
+        return {name: weight for name, (_, weight) in SCENARIOS.items()}
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name.strip()!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def parse_levels(value):
+    return [int(level) for level in value.split(',')]
+
+def lock_error(body):
+    # Classifies a failed response by the database error it carries
+    message = body.decode('utf-8', 'replace').lower()
+    if 'deadlock' in message:
+        return 'deadlock'
+    if 'lock wait timeout' in message or 'database is locked' in message:
+        return 'lock_timeout'
+    return None
+
+
+class Client:
+    def __init__(self, host, port, timeout):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def send(self, request):
+        body = json.dumps(request.body) if request.body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            self.connection.request(request.method, request.path, body, headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # Reconnects on the next request
+            self.connection.close()
+            raise
+
+    def close(self):
+        self.connection.close()
+
+
+def lock_counters(engine):
+    # Server-side lock waits and deadlocks; None where the engine keeps none
+    if engine.dialect.name != 'mysql':
+        return None
+    with engine.connect() as conn:
+        status = dict(conn.execute(text("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock_%'")).fetchall())
+        try:
+            deadlocks = conn.execute(text("SELECT COUNT FROM information_schema.INNODB_METRICS WHERE NAME = 'lock_deadlocks'")).scalar()
+        except Exception:
+            deadlocks = None
+    return {
+        'row_lock_waits': int(status.get('Innodb_row_lock_waits', 0)),
+        'row_lock_time_ms': int(status.get('Innodb_row_lock_time', 0)),
+        'deadlocks': int(deadlocks) if deadlocks is not None else None,
+    }
+
+def counter_deltas(before, after):
+    if before is None or after is None:
+        return None
+    return {key: after[key] - before[key] if after[key] is not None and before[key] is not None else None for key in after}
+
+def pool_waits(dbpool):
+    # (checkouts, seconds waited, timeouts) so far across the app's pools
+    series = dbpool.checkout_waits.waits.series.get((), [None, 0.0, 0])
+    return series[2], series[1], dbpool.checkout_waits.timeouts.series.get((), 0)
+
+def route_stats(samples, seconds):
+    latencies = sorted(latency for _, latency, _, _ in samples)
+    count = len(latencies)
+    errors = sum(1 for _, _, status, _ in samples if status is None or status >= 400)
+    return {
+        'requests': count,
+        'rps': round(count / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / (count or 1) * 1000, 3),
+        'errors': errors,
+        'error_rate': round(errors / (count or 1), 4),
+        'lock_timeouts': sum(1 for *_, lock in samples if lock == 'lock_timeout'),
+        'deadlocks': sum(1 for *_, lock in samples if lock == 'deadlock'),
+    }
+
+def run_level(users, address, args, mix, emails, activities, foods, clock, base, seed):
+    stop = threading.Event()
+    measure_from = time.perf_counter() + args.warmup
+    samples = []
+    lock = threading.Lock()
+    names, weights = list(mix), list(mix.values())
+
+    def simulate(index):
+        rng = random.Random(seed * 1000003 + index)
+        user = SimulatedUser(emails[index % len(emails)], rng, activities, foods, clock, base)
+        client = Client(*address, timeout=args.timeout)
+        own = []
+        try:
+            while not stop.is_set():
+                request = SCENARIOS[rng.choices(names, weights)[0]][0](user)
+                started = time.perf_counter()
+                try:
+                    status, body = client.send(request)
+                except Exception:
+                    status, body = None, b''
+                elapsed = time.perf_counter() - started
+                if started >= measure_from:
+                    own.append((request.label, elapsed, status, lock_error(body) if status is None or status >= 400 else None))
+                if status is not None and status < 400 and request.on_success:
+                    request.on_success()
+                if args.think_ms:
+                    stop.wait(rng.expovariate(1000 / args.think_ms))
+        finally:
+            client.close()
+            with lock:
+                samples.extend(own)
+
+    threads = [threading.Thread(target=simulate, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    stop.set()
+    seconds = time.perf_counter() - started
+    for thread in threads:
+        thread.join()
+
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample[0]].append(sample)
+    return {
+        'users': users,
+        'seconds': round(seconds, 2),
+        **route_stats(samples, seconds),
+        'routes': {label: route_stats(entries, seconds) for label, entries in sorted(by_route.items())},
+    }
+
+def saturation_point(levels, min_gain, max_error_rate):
+    # The last level that still raised throughput by min_gain without errors
+    # beyond max_error_rate; None if even the first level is over
+    best = None
+    for level in levels:
+        if level['error_rate'] > max_error_rate:
+            break
+        if best is not None and level['rps'] < best['rps'] * (1 + min_gain):
+            break
+        best = level
+    return best
+
+def print_levels(levels, server_counters):
+    print(f"{'users':>6} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'lock t/o':>8} {'deadlock':>8} {'pool wait ms':>12}" + (f" {'row lock waits':>14}" if server_counters else ''))
+    for level in levels:
+        line = (f"{level['users']:>6} {level['requests']:>9} {level['rps']:>8} {level['error_rate']:>7.2%} "
+                f"{level['p50_ms']:>9} {level['p95_ms']:>9} {level['p99_ms']:>9} "
+                f"{level['lock_timeouts']:>8} {level['deadlocks']:>8} {level['pool']['wait_ms']:>12}")
+        if server_counters:
+            server = level.get('server_locks') or {}
+            line += f" {server.get('row_lock_waits', '-'):>14}"
+        print(line)
+
+def print_routes(level):
+    print(f"\n{level['users']} users")
+    print(f"  {'route':28} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, route in level['routes'].items():
+        print(f"  {label:28} {route['requests']:>9} {route['rps']:>8} {route['error_rate']:>7.2%} "
+              f"{route['p50_ms']:>9} {route['p95_ms']:>9} {route['p99_ms']:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test of the HTTP routes with a realistic traffic mix")
+    parser.add_argument('--rows', type=int, default=10000, help="Rows in Records and Meals for generated data")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-uri', help="Load an existing, already populated database instead")
+    parser.add_argument('--users', type=parse_levels, default=[1, 2, 4, 8, 16, 32], help="Concurrency levels to sweep, e.g. 1,4,16")
+    parser.add_argument('--duration', type=float, default=10, help="Measured seconds per level")
+    parser.add_argument('--warmup', type=float, default=2, help="Unmeasured seconds before each level")
+    parser.add_argument('--think-ms', type=float, default=0, help="Mean pause between a user's requests (0: closed loop)")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(None), help=f"Scenario weights, e.g. dashboard=20,log_record=10 (scenarios: {', '.join(SCENARIOS)})")
+    parser.add_argument('--timeout', type=float, default=60, help="Client timeout per request in seconds")
+    parser.add_argument('--pool-size', type=int, help="DB_POOL_SIZE for the app under test")
+    parser.add_argument('--without-cache', action='store_true', help="Turn the analytics response cache off")
+    parser.add_argument('--min-gain', type=float, default=0.1, help="Throughput gain a level needs to count as scaling")
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help="Error rate beyond which a level counts as saturated")
+    parser.add_argument('--routes', action='store_true', help="Print the per-route table for every level, not just the saturation point")
+    parser.add_argument('--out', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    database_uri = args.database_uri
+    sizes = None
+    if not database_uri:
+        path = os.path.join(tempfile.mkdtemp(prefix='logger-load-'), 'load.db')
+        database_uri = f'sqlite:///{path}'
+        started = time.perf_counter()
+        sizes = generate.generate(create_engine(database_uri), args.rows, args.seed)
+        print(f"Generated {sizes} in {time.perf_counter() - started:.1f}s")
+
+    settings = {'RESPONSE_CACHE_BACKEND': 'none'} if args.without_cache else {}
+    if args.pool_size:
+        settings['DB_POOL_SIZE'] = args.pool_size
+    app_module = load_app(database_uri, **settings)
+    import migrations
+    migrations.upgrade(create_engine(database_uri))
+
+    table_sizes = generate.table_sizes(args.rows)
+    emails = generate.emails(table_sizes['UserStorage'])
+    activities = [f'Activity {i:03d}' for i in range(table_sizes['Activities'])]
+    foods = [f'Food {i:06d}' for i in range(table_sizes['Food'])]
+
+    # Per-request access logs would dominate the output
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True).start()
+    address = ('127.0.0.1', server.server_port)
+    print(f"Serving on http://{address[0]}:{address[1]}; {args.duration:g}s per level, mix {args.mix}")
+
+    monitor = create_engine(database_uri)
+    clock = itertools.count()
+    base = datetime.utcnow().replace(microsecond=0) - timedelta(days=1)
+    levels = []
+    try:
+        for users in args.users:
+            locks_before = lock_counters(monitor)
+            checkouts, waited, timeouts = pool_waits(app_module.dbpool)
+            level = run_level(users, address, args, args.mix, emails, activities, foods, clock, base, args.seed)
+            end_checkouts, end_waited, end_timeouts = pool_waits(app_module.dbpool)
+            level['pool'] = {
+                'checkouts': end_checkouts - checkouts,
+                'wait_ms': round((end_waited - waited) * 1000, 1),
+                'timeouts': end_timeouts - timeouts,
+            }
+            level['server_locks'] = counter_deltas(locks_before, lock_counters(monitor))
+            levels.append(level)
+            print(f"  {users} users: {level['rps']} req/s, p95 {level['p95_ms']} ms, {level['error_rate']:.2%} errors")
+    finally:
+        server.shutdown()
+
+    print()
+    print_levels(levels, monitor.dialect.name == 'mysql')
+    saturated = saturation_point(levels, args.min_gain, args.max_error_rate)
+    for level in levels if args.routes else [saturated or levels[0]]:
+        print_routes(level)
+    print()
+    if saturated is None:
+        print(f"Saturated from the first level: {levels[0]['error_rate']:.2%} errors at {levels[0]['users']} users")
+    elif saturated is levels[-1]:
+        print(f"Still scaling at {saturated['users']} users ({saturated['rps']} req/s); try higher --users")
+    else:
+        print(f"Saturates at about {saturated['users']} users: {saturated['rps']} req/s, p95 {saturated['p95_ms']} ms")
+
+    if args.out:
+        report = {
+            'meta': {
+                'created': datetime.utcnow().isoformat(),
+                'rows': args.rows,
+                'seed': args.seed,
+                'tables': sizes,
+                'dialect': monitor.dialect.name,
+                'duration': args.duration,
+                'warmup': args.warmup,
+                'think_ms': args.think_ms,
+                'mix': args.mix,
+                'cache': not args.without_cache,
+                'python': platform.python_version(),
+            },
+            'saturation_users': saturated['users'] if saturated else None,
+            'levels': levels,
+        }
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
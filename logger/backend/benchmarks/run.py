@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine
+
+from benchmarks import generate
+from benchmarks.harness import QueryCounter, load_app, summarize
+
+# Times every DBReader method and every analytics/listing route against a
+# synthetic database, and compares the run with a saved baseline:
+#
+#   python -m benchmarks.run --rows 100000 --out baseline.json
+#   python -m benchmarks.run --rows 100000 --compare baseline.json
+#
+# Without --database-uri the data is loaded into a throwaway SQLite file.
+
+def dbreader_cases(app):
+    reader = app.db_reader
+    return [
+        ('dbreader.get_cal_data[day]', lambda email: reader.get_cal_data(email, 0)),
+        ('dbreader.get_cal_data[week]', lambda email: reader.get_cal_data(email, 6)),
+        ('dbreader.get_cal_data[month]', lambda email: reader.get_cal_data(email, 30)),
+        ('dbreader.get_activity_data[week]', lambda email: reader.get_activity_data(email, 6)),
+        ('dbreader.get_activity_data[month]', lambda email: reader.get_activity_data(email, 30)),
+        ('dbreader.get_total_calories_per_day[week]', lambda email: reader.get_total_calories_per_day(email, 6)),
+        ('dbreader.get_activity_percentile_data[week]', lambda email: reader.get_activity_percentile_data(email, 6)),
+        ('dbreader.get_activity_percentile_data[month]', lambda email: reader.get_activity_percentile_data(email, 30)),
+        # The all-users scan behind the percentile index, which used to run per request
+        ('dbreader.percentile_index_build[month]', lambda email: app.percentile_index.refresh(30)),
+        ('dbreader.get_dashboard_data[week]', lambda email: reader.get_dashboard_data(email, 6)),
+        ('dbreader.get_dashboard_data[month]', lambda email: reader.get_dashboard_data(email, 30)),
+        ('dbreader.get_all_logs_data', lambda email: reader.get_all_logs_data(email)),
+        ('dbreader.get_all_schedule', lambda email: reader.get_all_schedule(email)),
+    ]
+
+def route_cases(client):
+    def get(path):
+        return lambda email: client.get(path.format(email=email))
+
+    def record_round_trip(email):
+        record = {
+            'Email': email,
+            'Activity': 'Activity 000',
+            'Datetime': datetime.utcnow().replace(microsecond=0).isoformat(),
+            'Duration': 30,
+            'Quality': 3,
+        }
+        response = client.post('/records', json=record)
+        if response.status_code >= 400:
+            return response
+        return client.delete('/records', json=record)
+
+    return [
+        ('GET /daily/calories', get('/daily/calories?email={email}')),
+        ('GET /weekly/calories', get('/weekly/calories?email={email}')),
+        ('GET /weekly/activities', get('/weekly/activities?email={email}')),
+        ('GET /weekly/activitiescalories', get('/weekly/activitiescalories?email={email}')),
+        ('GET /weekly/percentiles', get('/weekly/percentiles?email={email}')),
+        ('GET /monthly/calories', get('/monthly/calories?email={email}')),
+        ('GET /monthly/activities', get('/monthly/activities?email={email}')),
+        ('GET /monthly/percentiles', get('/monthly/percentiles?email={email}')),
+        ('GET /dashboard?window=week', get('/dashboard?email={email}&window=week')),
+        ('GET /dashboard?window=month', get('/dashboard?email={email}&window=month')),
+        ('GET /records', get('/records?email={email}')),
+        ('GET /records?limit=100', get('/records?email={email}&limit=100')),
+        ('GET /meals', get('/meals?email={email}')),
+        ('GET /schedule', get('/schedule?email={email}')),
+        ('GET /saved_logs', get('/saved_logs?email={email}')),
+        ('GET /foodnames', get('/foodnames')),
+        ('GET /activitynames', get('/activitynames')),
+        ('GET /food/search', get('/food/search?q=fod 0012')),
+        ('GET /activities/search', get('/activities/search?q=activty')),
+        ('POST+DELETE /records', record_round_trip),
+    ]
+
+def failed(result):
+    status = getattr(result, 'status_code', None)
+    return status is not None and status >= 400
+
+def run_case(call, emails, counter, iterations, warmup, rng, in_context):
+    for _ in range(warmup):
+        in_context(call, rng.choice(emails))
+
+    queries, db_seconds, scan_work = counter.snapshot()
+    samples = []
+    errors = 0
+    for _ in range(iterations):
+        email = rng.choice(emails)
+        started = time.perf_counter()
+        try:
+            if failed(in_context(call, email)):
+                errors += 1
+        except Exception:
+            errors += 1
+        samples.append(time.perf_counter() - started)
+    end_queries, end_db_seconds, end_scan_work = counter.snapshot()
+    return summarize(samples, end_queries - queries, end_db_seconds - db_seconds, end_scan_work - scan_work, errors)
+
+def compare(results, baseline, threshold, min_ms):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            delta = current[metric] - previous[metric]
+            if delta > min_ms and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {current[metric]}")
+        if current['queries_per_call'] > previous['queries_per_call']:
+            regressions.append(f"{name}: queries_per_call {previous['queries_per_call']} -> {current['queries_per_call']}")
+    return regressions
+
+def print_table(results, scan_unit):
+    print(f"{'case':48} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {scan_unit:>12} {'errors':>6}")
+    for name, result in results.items():
+        print(f"{name:48} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+              f"{result['queries_per_call']:>8} {result['scan_work_per_call']:>12} {result['errors']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DBReader methods and HTTP routes")
+    parser.add_argument('--rows', type=int, default=10000, help="Rows in Records and Meals for generated data")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--database-uri', help="Benchmark an existing, already populated database instead")
+    parser.add_argument('--with-cache', action='store_true', help="Leave the analytics response cache on")
+    parser.add_argument('--only', help="Run only cases whose name contains this text")
+    parser.add_argument('--out', help="Write results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed relative slowdown before flagging")
+    parser.add_argument('--min-ms', type=float, default=0.5, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    database_uri = args.database_uri
+    sizes = None
+    if not database_uri:
+        path = os.path.join(tempfile.mkdtemp(prefix='logger-bench-'), 'bench.db')
+        database_uri = f'sqlite:///{path}'
+        started = time.perf_counter()
+        sizes = generate.generate(create_engine(database_uri), args.rows, args.seed)
+        print(f"Generated {sizes} in {time.perf_counter() - started:.1f}s")
+
+    app_module = load_app(database_uri, RESPONSE_CACHE_BACKEND='memory' if args.with_cache else 'none')
+    import migrations
+    migrations.upgrade(create_engine(database_uri))
+
+    app = app_module.app
+    with app.app_context():
+        counter = QueryCounter(app_module.db.engine)
+    emails = generate.emails(generate.table_sizes(args.rows)['UserStorage'])
+    rng = random.Random(args.seed)
+
+    def in_app_context(call, email):
+        with app.app_context():
+            return call(email)
+
+    def direct(call, email):
+        return call(email)
+
+    cases = [(name, call, in_app_context) for name, call in dbreader_cases(app_module)]
+    cases += [(name, call, direct) for name, call in route_cases(app.test_client())]
+    results = {}
+    for name, call, in_context in cases:
+        if args.only and args.only not in name:
+            continue
+        results[name] = run_case(call, emails, counter, args.iterations, args.warmup, rng, in_context)
+
+    print_table(results, counter.scan_unit)
+    report = {
+        'meta': {
+            'created': datetime.utcnow().isoformat(),
+            'rows': args.rows,
+            'seed': args.seed,
+            'tables': sizes,
+            'dialect': counter.engine.dialect.name,
+            'scan_unit': counter.scan_unit,
+            'iterations': args.iterations,
+            'cache': args.with_cache,
+            'python': platform.python_version(),
+        },
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# SQLite stand-in for the MySQL tables the backend reads and writes. Column
+# names and keys match production; types are the nearest SQLite affinities.
+TABLES = [
+    """
+    CREATE TABLE UserStorage (
+        Email VARCHAR(255) PRIMARY KEY,
+        FirstName VARCHAR(255),
+        LastName VARCHAR(255),
+        Age INT,
+        Weight REAL,
+        Sex VARCHAR(1),
+        Insomnia INT,
+        MaintenanceCalories INT
+    )
+    """,
+    """
+    CREATE TABLE Activities (
+        ActivityName VARCHAR(255) PRIMARY KEY,
+        CaloriesPerKg REAL NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE Food (
+        FoodName VARCHAR(255) PRIMARY KEY,
+        Calories REAL NOT NULL,
+        ProteinGrams REAL NOT NULL,
+        CarbGrams REAL NOT NULL,
+        HighlyProcessed INT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE Records (
+        Email VARCHAR(255) NOT NULL,
+        Activity VARCHAR(255) NOT NULL,
+        Datetime DATETIME NOT NULL,
+        Duration INT NOT NULL,
+        Quality INT NOT NULL,
+        PRIMARY KEY (Email, Activity, Datetime)
+    )
+    """,
+    """
+    CREATE TABLE Meals (
+        Email VARCHAR(255) NOT NULL,
+        FoodName VARCHAR(255) NOT NULL,
+        Datetime DATETIME NOT NULL,
+        PRIMARY KEY (Email, FoodName, Datetime)
+    )
+    """,
+    """
+    CREATE TABLE Schedule (
+        Email VARCHAR(255) NOT NULL,
+        Activity VARCHAR(255) NOT NULL,
+        Day VARCHAR(1) NOT NULL,
+        StartTime INT NOT NULL,
+        EndTime INT NOT NULL,
+        PRIMARY KEY (Email, Activity, Day)
+    )
+    """,
+    """
+    CREATE TABLE Logs (
+        Email VARCHAR(255) NOT NULL,
+        StartDate DATETIME NOT NULL,
+        EndDate DATETIME NOT NULL,
+        AvgCalBurnt REAL,
+        AvgCalConsumed REAL,
+        AvgProteinGrams REAL,
+        AvgCarbGrams REAL,
+        PRIMARY KEY (Email, StartDate, EndDate)
+    )
+    """,
+]
+
+def create_tables(conn):
+    for statement in TABLES:
+        conn.exec_driver_sql(statement)
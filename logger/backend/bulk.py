@@ -0,0 +1,240 @@
+import json
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import bindparam, text
+
+import rollup
+
+# Batched writes for /records/bulk and /meals/bulk. Rows are validated (types,
+# and names against the user and reference tables), checked against the
+# existing keys with one range query per user, then written with a single
+# executemany that leans on the composite primary keys
+# (INSERT IGNORE / ON DUPLICATE KEY UPDATE), so a concurrent insert of the same
+# key can't fail the batch. Since everything INSERT IGNORE would skip or coerce
+# is rejected up front, the per-row statuses match what was written.
+
+REFERENCE_CHUNK = 500
+
+class BulkError(ValueError):
+    pass
+
+
+class Table:
+    def __init__(self, name, key_columns, value_columns, computed=None, recomputed=None, types=None, references=None):
+        self.name = name
+        self.key_columns = key_columns
+        self.value_columns = value_columns
+        self.columns = key_columns + value_columns
+        # computed: column -> SQL over the row's parameters, filled on insert.
+        # recomputed: column -> SQL template re-evaluated on conflict updates,
+        # where {Column} is the incoming value and a bare name the stored one.
+        self.computed = computed or {}
+        self.recomputed = recomputed or {}
+        # types: column -> converter raising ValueError on bad input.
+        # references: column -> (table, column) its values must exist in.
+        self.types = types or {}
+        self.references = references or {}
+
+    def key(self, row):
+        return tuple(row[column] for column in self.key_columns)
+
+
+def to_int(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value.strip() if isinstance(value, str) else value)
+
+RECORD_WEIGHT = rollup.RECORD_WEIGHT.format(email=':Email')
+RECORDS = Table(
+    'Records', ['Email', 'Activity', 'Datetime'], ['Duration', 'Quality'],
+    computed={
+        'WeightKg': RECORD_WEIGHT,
+        'CaloriesBurnt': rollup.RECORD_BURN.format(activity=':Activity', weight=RECORD_WEIGHT, duration=':Duration'),
+    },
+    recomputed={
+        'CaloriesBurnt': rollup.RECORD_BURN.format(activity='{Activity}', weight='COALESCE(WeightKg, {WeightKg})', duration='{Duration}'),
+    },
+    types={'Duration': to_int, 'Quality': to_int},
+    references={'Email': ('UserStorage', 'Email'), 'Activity': ('Activities', 'ActivityName')}
+)
+MEALS = Table(
+    'Meals', ['Email', 'FoodName', 'Datetime'], [],
+    references={'Email': ('UserStorage', 'Email'), 'FoodName': ('Food', 'FoodName')}
+)
+
+def parse_body(request):
+    if request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        lines = request.get_data(as_text=True).splitlines()
+        try:
+            return [json.loads(line) for line in lines if line.strip()]
+        except ValueError as e:
+            raise BulkError(f"Invalid NDJSON: {e}")
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise BulkError("Body must be a JSON array or NDJSON")
+    return rows
+
+def to_datetime(value):
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+
+def validate(table, raw):
+    if not isinstance(raw, dict):
+        raise BulkError("Row must be an object")
+    missing = [column for column in table.columns if raw.get(column) in (None, '')]
+    if missing:
+        raise BulkError(f"Missing fields: {', '.join(missing)}")
+    row = {column: raw[column] for column in table.columns}
+    for column, convert in table.types.items():
+        try:
+            row[column] = convert(row[column])
+        except (TypeError, ValueError):
+            raise BulkError(f"Invalid {column}: {raw[column]!r}")
+    for column in table.references:
+        if not isinstance(row[column], str):
+            raise BulkError(f"Invalid {column}: {raw[column]!r}")
+    try:
+        row['Datetime'] = to_datetime(row['Datetime'])
+    except ValueError:
+        raise BulkError(f"Invalid Datetime: {raw['Datetime']}")
+    return row
+
+def insert_statement(dialect, table, update):
+    columns = ', '.join(table.columns + list(table.computed))
+    values = ', '.join([f':{column}' for column in table.columns] + list(table.computed.values()))
+    if update and table.value_columns:
+        incoming = {
+            column: f'excluded.{column}' if dialect == 'sqlite' else f'VALUES({column})'
+            for column in table.columns + list(table.computed)
+        }
+        assignments = ', '.join(
+            [f'{column} = {incoming[column]}' for column in table.value_columns]
+            + [f'{column} = {template.format(**incoming)}' for column, template in table.recomputed.items()]
+        )
+        if dialect == 'sqlite':
+            conflict = f"ON CONFLICT ({', '.join(table.key_columns)}) DO UPDATE SET {assignments}"
+        else:
+            conflict = f"ON DUPLICATE KEY UPDATE {assignments}"
+        return text(f"INSERT INTO {table.name} ({columns}) VALUES ({values}) {conflict}")
+    ignore = 'INSERT OR IGNORE' if dialect == 'sqlite' else 'INSERT IGNORE'
+    return text(f"{ignore} INTO {table.name} ({columns}) VALUES ({values})")
+
+def reference_statement(dialect, ref_table, ref_column):
+    # MySQL compares names case-insensitively already
+    collate = ' COLLATE NOCASE' if dialect == 'sqlite' else ''
+    return text(f"SELECT {ref_column} FROM {ref_table} WHERE {ref_column}{collate} IN :values").bindparams(bindparam('values', expanding=True))
+
+def existing_statement(table):
+    return text(f"""
+        SELECT {', '.join(table.key_columns)} FROM {table.name}
+        WHERE Email = :email AND Datetime >= :start AND Datetime < :end
+    """)
+
+# Built once per table and dialect (anything but SQLite is MySQL), so requests
+# only bind parameters
+STATEMENTS = {
+    (table.name, dialect): {
+        'insert': insert_statement(dialect, table, False),
+        'upsert': insert_statement(dialect, table, True),
+        'existing': existing_statement(table),
+        'references': {column: reference_statement(dialect, *reference) for column, reference in table.references.items()},
+    }
+    for table in (RECORDS, MEALS)
+    for dialect in ('sqlite', 'mysql')
+}
+
+def statements_for(session, table):
+    dialect = 'sqlite' if session.get_bind().dialect.name == 'sqlite' else 'mysql'
+    return STATEMENTS[(table.name, dialect)]
+
+def known_names(session, table, rows):
+    # column -> {lower-cased value: stored spelling} for the row values found
+    # in its reference table
+    known = {}
+    for column, query in statements_for(session, table)['references'].items():
+        values = sorted({row[column] for row in rows})
+        found = {}
+        for start in range(0, len(values), REFERENCE_CHUNK):
+            found.update((name.lower(), name) for name, in session.execute(query, {'values': values[start:start + REFERENCE_CHUNK]}))
+        known[column] = found
+    return known
+
+def existing_keys(session, table, rows):
+    # One indexed range scan per user over the whole days the batch spans.
+    # Whole days, because SQLite keeps Datetime as text and rows written
+    # before every route parsed it may use a 'T' separator, which sorts
+    # differently from the bound; the keys are compared as datetimes below.
+    by_email = defaultdict(list)
+    for row in rows:
+        by_email[row['Email']].append(row['Datetime'])
+    query = statements_for(session, table)['existing']
+    keys = set()
+    for email, datetimes in by_email.items():
+        start = datetime.combine(min(datetimes).date(), time.min)
+        end = datetime.combine(max(datetimes).date() + timedelta(days=1), time.min)
+        for found in session.execute(query, {'email': email, 'start': start, 'end': end}):
+            found = dict(found._mapping)
+            found['Datetime'] = to_datetime(found['Datetime'])
+            keys.add(table.key(found))
+    return keys
+
+def write(session, table, raw_rows, update=False):
+    # Returns (results, written) where results holds one status per input row
+    # and written maps each email to the dates it changed.
+    results = []
+    pending = []
+    for index, raw in enumerate(raw_rows):
+        try:
+            row = validate(table, raw)
+        except BulkError as e:
+            results.append({'index': index, 'status': 'invalid', 'error': str(e)})
+            continue
+        results.append({'index': index, 'status': None})
+        pending.append((index, row))
+
+    # Names are stored as the reference tables spell them, and only then
+    # compared for duplicates within the batch
+    known = known_names(session, table, [row for _, row in pending]) if pending else {}
+    valid = []
+    seen = set()
+    for index, row in pending:
+        unknown = [column for column, names in known.items() if row[column].lower() not in names]
+        if unknown:
+            results[index].update(status='invalid', error=', '.join(f"Unknown {column}: {row[column]}" for column in unknown))
+            continue
+        for column, names in known.items():
+            row[column] = names[row[column].lower()]
+        key = table.key(row)
+        if key in seen:
+            results[index]['status'] = 'duplicate'
+            continue
+        seen.add(key)
+        valid.append((index, row))
+    pending = valid
+
+    rows = [row for _, row in pending]
+    existing = existing_keys(session, table, rows) if rows else set()
+    to_write = []
+    written = defaultdict(set)
+    for index, row in pending:
+        if table.key(row) in existing:
+            if not (update and table.value_columns):
+                results[index]['status'] = 'exists'
+                continue
+            results[index]['status'] = 'updated'
+        else:
+            results[index]['status'] = 'created'
+        to_write.append(row)
+        written[row['Email']].add(row['Datetime'].date())
+
+    if to_write:
+        session.execute(statements_for(session, table)['upsert' if update else 'insert'], to_write)
+    return results, written
+
+def summarize(results):
+    summary = defaultdict(int)
+    for result in results:
+        summary[result['status']] += 1
+    return dict(summary)
@@ -0,0 +1,54 @@
+import gzip
+import zlib
+
+from flask import request
+
+# Gzip for responses when the client accepts it. Buffered bodies are only
+# compressed above a size threshold, where it pays for the CPU; streamed bodies
+# (the ?stream= listings) are compressed chunk by chunk as they are produced.
+
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/calendar', 'text/plain', 'text/csv')
+
+def gzip_chunks(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class Compression:
+    def __init__(self, min_bytes=1024, level=6):
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def init_app(self, app):
+        app.after_request(self.after_request)
+
+    def after_request(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 304)
+                or response.mimetype not in COMPRESSIBLE
+                or 'Content-Encoding' in response.headers
+                or not request.accept_encodings['gzip']):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if response.is_streamed:
+            response.response = gzip_chunks(response.response, self.level)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_bytes:
+                return response
+            response.set_data(gzip.compress(body, self.level))
+
+        response.headers['Content-Encoding'] = 'gzip'
+        # The compressed bytes differ from the identity ones, so a strong
+        # validator no longer applies to them
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
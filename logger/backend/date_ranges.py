@@ -0,0 +1,78 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Date ranges and calendar bucketing for the range analytics endpoint. Records
+# carry the wall-clock time the user entered, so their DATE() already is the
+# user's local day; only "today" depends on the time zone the client sends.
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+class RangeError(ValueError):
+    pass
+
+
+def local_today(tz_name=None):
+    if not tz_name:
+        return datetime.utcnow().date()
+    try:
+        return datetime.now(ZoneInfo(tz_name)).date()
+    except (ZoneInfoNotFoundError, ValueError):
+        raise RangeError(f"Unknown time zone {tz_name!r}")
+
+def parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise RangeError(f"{name} must be a date (YYYY-MM-DD)")
+
+def parse_range(args, today, default_days=30, max_days=3660):
+    # Inclusive [start, end]; end defaults to the user's today
+    end = parse_date(args['end'], 'end') if args.get('end') else today
+    start = parse_date(args['start'], 'start') if args.get('start') else end - timedelta(days=default_days - 1)
+    if end < start:
+        raise RangeError("end must not be before start")
+    if (end - start).days + 1 > max_days:
+        raise RangeError(f"Range is limited to {max_days} days")
+    granularity = args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise RangeError("granularity must be one of " + ', '.join(GRANULARITIES))
+    return start, end, granularity
+
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def next_period(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+def periods(start, end, granularity):
+    # Every period touching [start, end] with the number of its days inside
+    # the range, so partial first/last weeks and months can be averaged fairly
+    result = []
+    current = period_start(start, granularity)
+    while current <= end:
+        following = next_period(current, granularity)
+        days = (min(following - timedelta(days=1), end) - max(current, start)).days + 1
+        result.append((current, days))
+        current = following
+    return result
+
+def bucket(rows, start, end, granularity, fields):
+    # rows are (day, {field: value}) pairs; returns a dense series with a zero
+    # entry for every period that has no rows
+    series = {}
+    for period, days in periods(start, end, granularity):
+        series[period] = dict({field: 0 for field in fields}, period=period.isoformat(), days=days)
+    for day, values in rows:
+        entry = series[period_start(day, granularity)]
+        for field in fields:
+            entry[field] += values[field] or 0
+    return list(series.values())
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+import config
+import metrics
+
+# Connection pool settings from config, and a QueuePool that records how long
+# each checkout waited for a connection. Waits that approach DB_POOL_TIMEOUT
+# mean the pool is too small for the number of worker threads.
+
+WAIT_BUCKETS = [0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 5, 30]
+
+
+class CheckoutWaits:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waits = metrics.Histogram('logger_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.', WAIT_BUCKETS)
+        self.timeouts = metrics.Counter('logger_db_pool_checkout_timeouts_total', 'Checkouts that gave up after pool_timeout.')
+
+    def observe(self, seconds, timed_out=False):
+        with self.lock:
+            self.waits.observe((), seconds)
+            if timed_out:
+                self.timeouts.inc(())
+
+    def render(self):
+        with self.lock:
+            return self.waits.render() + self.timeouts.render()
+
+
+# Shared across pool instances: engine.dispose() replaces the pool object
+checkout_waits = CheckoutWaits()
+
+
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            checkout_waits.observe(time.perf_counter() - started, timed_out)
+
+
+def shard_uris():
+    return dict(getattr(config, 'SHARD_DATABASE_URIS', None) or {})
+
+def replica_uris():
+    # {shard name: [uri, ...]}; a plain list holds the default database's replicas
+    replicas = getattr(config, 'READ_REPLICA_URIS', None) or {}
+    if isinstance(replicas, (list, tuple)):
+        return {None: list(replicas)}
+    return dict(replicas)
+
+def database_uris():
+    # The default database and every shard, each once
+    return list(dict.fromkeys([config.SQLALCHEMY_DATABASE_URI, *shard_uris().values()]))
+
+def engine_options(uri):
+    options = {
+        'pool_pre_ping': getattr(config, 'DB_POOL_PRE_PING', True),
+        'pool_recycle': getattr(config, 'DB_POOL_RECYCLE', 1800),
+    }
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite lives in a single connection; there is nothing to size
+        return options
+    options.update({
+        'poolclass': TimedQueuePool,
+        'pool_size': getattr(config, 'DB_POOL_SIZE', 5),
+        'max_overflow': getattr(config, 'DB_POOL_MAX_OVERFLOW', 10),
+        'pool_timeout': getattr(config, 'DB_POOL_TIMEOUT', 30),
+    })
+    return options
+
+def render(pool):
+    lines = checkout_waits.render()
+    if isinstance(pool, QueuePool):
+        for name, help_text, value in [
+            ('logger_db_pool_size', 'Configured pool size.', pool.size()),
+            ('logger_db_pool_checked_out', 'Connections currently checked out.', pool.checkedout()),
+            ('logger_db_pool_overflow', 'Connections open beyond pool_size.', max(pool.overflow(), 0)),
+        ]:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+    return lines
@@ -0,0 +1,20 @@
+# Opt-in compact response shape for list endpoints. ?format=columnar replaces
+# the list of row objects with parallel arrays, one per column, under a shared
+# header; columns that hold the same value on every row (e.g. the Email the
+# request was filtered by) are hoisted into "constants" instead of repeating.
+
+def is_columnar(args):
+    return args.get('format') == 'columnar'
+
+def columnar(rows, constants=None):
+    constants = {
+        name: value for name, value in (constants or {}).items()
+        if all(row.get(name) == value for row in rows)
+    }
+    columns = [name for name in rows[0] if name not in constants] if rows else []
+    return {
+        'columns': columns,
+        'constants': constants,
+        'count': len(rows),
+        'values': [[row[name] for row in rows] for name in columns]
+    }
@@ -0,0 +1,72 @@
+import hashlib
+from datetime import datetime, timedelta
+
+# iCalendar (RFC 5545) feed of a user's weekly schedule. Each Schedule row
+# becomes one VEVENT that repeats weekly, anchored on the current ISO week.
+# Times are floating (no time zone), i.e. the wall-clock hours the user
+# entered, wherever the subscribing calendar is.
+
+BYDAY = {'M': 'MO', 'T': 'TU', 'W': 'WE', 'R': 'TH', 'F': 'FR', 'S': 'SA', 'U': 'SU'}
+DAY_OFFSETS = {day: offset for offset, day in enumerate(BYDAY)}
+
+def week_start(today):
+    return today - timedelta(days=today.weekday())
+
+def etag(email, rows, anchor):
+    digest = hashlib.sha256(f"{email}\n{anchor.isoformat()}".encode('utf-8'))
+    for row in rows:
+        digest.update(f"\n{row.Activity}\t{row.Day}\t{row.StartTime}\t{row.EndTime}".encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+def fold(line):
+    # Content lines are limited to 75 octets; continuations start with a space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+def format_local(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+def vevent(email, row, anchor, stamp):
+    day = datetime.combine(anchor + timedelta(days=DAY_OFFSETS[row.Day]), datetime.min.time())
+    uid = hashlib.sha1(f"{email}|{row.Activity}|{row.Day}".encode('utf-8')).hexdigest()
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}@calorielogger',
+        f'DTSTAMP:{stamp}',
+        f'SUMMARY:{escape(row.Activity)}',
+        f'DTSTART:{format_local(day + timedelta(hours=row.StartTime))}',
+        f'DTEND:{format_local(day + timedelta(hours=row.EndTime))}',
+        f'RRULE:FREQ=WEEKLY;BYDAY={BYDAY[row.Day]}',
+        'END:VEVENT',
+    ]
+    return ''.join(fold(line) for line in lines)
+
+def calendar(email, rows, anchor):
+    # Yields the feed piece by piece so the response can stream it
+    stamp = anchor.strftime('%Y%m%dT000000Z')
+    yield ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//calorielogger//schedule//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:Activity schedule',
+    ])
+    for row in rows:
+        if row.Day in BYDAY:
+            yield vevent(email, row, anchor, stamp)
+    yield 'END:VCALENDAR\r\n'
@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Background jobs on a small local thread pool. A job is identified by a key
+# (e.g. the (email, startDate, endDate) of a log); submitting a key that is
+# already queued or running returns the existing job instead of starting a
+# second one. Finished jobs are kept for `retention` seconds so clients can
+# poll their status.
+#
+# Jobs live in the memory of the process that accepted them: with several
+# worker processes, a status poll that lands on another worker gets a 404
+# even though the job is running. Deployments with more than one worker need
+# sticky routing for /saved_logs/jobs/<id>; the finished log itself is in the
+# Logs table either way.
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'createdAt': self.created,
+            'startedAt': self.started,
+            'finishedAt': self.finished,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class JobQueue:
+    def __init__(self, max_workers=2, max_pending=100, retention=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jobs')
+        self.max_pending = max_pending
+        self.retention = retention
+        self.jobs = {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def submit(self, key, fn):
+        # Returns (job, created); raises JobQueueFull rather than queueing
+        # without bound when a burst outruns the workers
+        with self.lock:
+            self.prune()
+            job_id = self.in_flight.get(key)
+            if job_id is not None:
+                return self.jobs[job_id], False
+            if len(self.in_flight) >= self.max_pending:
+                raise JobQueueFull(f"{len(self.in_flight)} jobs already pending")
+            job = Job(key)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job.id
+        self.executor.submit(self.run, job, fn)
+        return job, True
+
+    def run(self, job, fn):
+        job.started = time.time()
+        job.status = RUNNING
+        try:
+            job.result = fn()
+            status = SUCCEEDED
+        except Exception as e:
+            logger.exception("Job %s failed", job.id)
+            job.error = str(e)
+            status = FAILED
+        with self.lock:
+            job.finished = time.time()
+            job.status = status
+            self.in_flight.pop(job.key, None)
+
+    def get(self, job_id):
+        with self.lock:
+            self.prune()
+            return self.jobs.get(job_id)
+
+    def prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done and job.finished < cutoff]:
+            del self.jobs[job_id]
@@ -0,0 +1,141 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+# Per-route request metrics in Prometheus text format. Engine events attribute
+# every statement to the request that issued it; Flask hooks time the request
+# and record totals when the response goes out.
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+BYTES_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+def format_series(name, labels):
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{label}="{value}"' for label, value in labels) + '}'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ['+Inf'], counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else format_value(float(bound))
+                lines.append(f'{format_series(self.name + "_bucket", labels + (("le", le),))} {cumulative}')
+            lines.append(f'{format_series(self.name + "_sum", labels)} {format_value(total)}')
+            lines.append(f'{format_series(self.name + "_count", labels)} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = defaultdict(int)
+
+    def inc(self, labels, value=1):
+        self.series[labels] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{format_series(self.name, labels)} {format_value(value)}')
+        return lines
+
+
+class Metrics:
+    def __init__(self, server_timing=False):
+        self.server_timing = server_timing
+        self.lock = threading.Lock()
+        self.requests = Counter('logger_http_requests_total', 'HTTP requests by route, method and status.')
+        self.latency = Histogram('logger_http_request_duration_seconds', 'Request latency.', LATENCY_BUCKETS)
+        self.queries = Histogram('logger_db_queries_per_request', 'SQL statements executed per request.', QUERY_BUCKETS)
+        self.db_time = Counter('logger_db_time_seconds_total', 'Time spent executing SQL.')
+        self.rows = Counter('logger_db_rows_total', 'Rows returned or affected, as reported by the driver.')
+        self.response_bytes = Histogram('logger_http_response_bytes', 'Response body size.', BYTES_BUCKETS)
+        self.collectors = [self.requests, self.latency, self.queries, self.db_time, self.rows, self.response_bytes]
+        self.sources = []
+
+    def add_source(self, render):
+        # render() returns extra exposition lines, e.g. connection pool state
+        self.sources.append(render)
+
+    def init_app(self, app):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def instrument_engine(self, engine):
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def before_request(self):
+        g.metrics = {'start': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0, 'rows': 0}
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        if has_request_context() and 'metrics' in g:
+            g.metrics['queries'] += 1
+            g.metrics['db_seconds'] += elapsed
+            g.metrics['rows'] += max(cursor.rowcount or 0, 0)
+
+    def after_request(self, response):
+        current = g.pop('metrics', None)
+        if current is None:
+            return response
+        elapsed = time.perf_counter() - current['start']
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (('route', route), ('method', request.method))
+        size = None if response.is_streamed else response.calculate_content_length()
+
+        with self.lock:
+            self.requests.inc(labels + (('status', str(response.status_code)),))
+            self.latency.observe(labels, elapsed)
+            self.queries.observe(labels, current['queries'])
+            self.db_time.inc(labels, current['db_seconds'])
+            self.rows.inc(labels, current['rows'])
+            if size is not None:
+                self.response_bytes.observe(labels, size)
+
+        if self.server_timing:
+            response.headers.add(
+                'Server-Timing',
+                f"db;dur={current['db_seconds'] * 1000:.2f};desc=\"{current['queries']} queries\", "
+                f"app;dur={elapsed * 1000:.2f}"
+            )
+        return response
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for collector in self.collectors:
+                lines.extend(collector.render())
+        for render in self.sources:
+            lines.extend(render())
+        return '\n'.join(lines) + '\n'
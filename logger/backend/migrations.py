@@ -0,0 +1,189 @@
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect, text
+
+import dbpool
+import rollup
+import statements
+
+# Composite indexes the DBReader queries, the keyset-paginated listings and the
+# schedule overlap checks rely on. (table, index name, columns)
+INDEXES = [
+    ('Records', 'idx_records_email_datetime_activity', ['Email', 'Datetime', 'Activity']),
+    ('Records', 'idx_records_datetime', ['Datetime']),
+    ('Meals', 'idx_meals_email_datetime_food', ['Email', 'Datetime', 'FoodName']),
+    ('Schedule', 'idx_schedule_email_day_start', ['Email', 'Day', 'StartTime']),
+]
+
+# Tables (and the aliases DBReader gives them) that are small enough to scan
+# when they sit on the inner side of a join.
+REFERENCE_TABLES = {'Activities', 'Food', 'UserStorage', 'a', 'f', 'us'}
+
+def create_index(conn, table, name, columns):
+    existing = {index['name'] for index in inspect(conn).get_indexes(table)}
+    if name not in existing:
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+
+def drop_index(conn, table, name):
+    existing = {index['name'] for index in inspect(conn).get_indexes(table)}
+    if name in existing:
+        if conn.dialect.name == 'sqlite':
+            conn.execute(text(f"DROP INDEX {name}"))
+        else:
+            conn.execute(text(f"DROP INDEX {name} ON {table}"))
+
+def migration_1(conn):
+    create_index(conn, 'Records', 'idx_records_email_datetime', ['Email', 'Datetime'])
+    create_index(conn, 'Records', 'idx_records_datetime', ['Datetime'])
+    create_index(conn, 'Meals', 'idx_meals_email_datetime', ['Email', 'Datetime'])
+    create_index(conn, 'Schedule', 'idx_schedule_email_day_start', ['Email', 'Day', 'StartTime'])
+
+def migration_2(conn):
+    rollup.rebuild(conn)
+
+def migration_3(conn):
+    # Widen the per-user indexes with the listing tie-breaker so keyset pages
+    # come straight off the index; the narrower ones become redundant.
+    create_index(conn, 'Records', 'idx_records_email_datetime_activity', ['Email', 'Datetime', 'Activity'])
+    create_index(conn, 'Meals', 'idx_meals_email_datetime_food', ['Email', 'Datetime', 'FoodName'])
+    drop_index(conn, 'Records', 'idx_records_email_datetime')
+    drop_index(conn, 'Meals', 'idx_meals_email_datetime')
+
+def migration_4(conn):
+    rollup.rebuild_cumulative(conn)
+
+def migration_5(conn):
+    # Adds Records.WeightKg / CaloriesBurnt, backfills them from the current
+    # weights and rebuilds the rollups from the stored figures
+    rollup.rebuild(conn)
+
+# Append new migrations here; versions are applied in order and never edited
+# once released.
+MIGRATIONS = [
+    (1, 'Composite indexes on Records, Meals and Schedule', migration_1),
+    (2, 'DailyTotals rollup table', migration_2),
+    (3, 'Keyset pagination indexes on Records and Meals', migration_3),
+    (4, 'DailyCumulative running totals for range averages', migration_4),
+    (5, 'Burn and weight stored on Records', migration_5),
+]
+
+def get_engines():
+    # The default database and every shard
+    return [create_engine(uri) for uri in dbpool.database_uris()]
+
+def ensure_version_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS SchemaVersion (
+            Version INT PRIMARY KEY,
+            Description VARCHAR(255) NOT NULL,
+            AppliedAt DATETIME NOT NULL
+        )
+    """))
+
+def current_version(conn):
+    ensure_version_table(conn)
+    version = conn.execute(text("SELECT MAX(Version) FROM SchemaVersion")).scalar()
+    return version or 0
+
+def upgrade(engine):
+    applied = []
+    with engine.begin() as conn:
+        version = current_version(conn)
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO SchemaVersion (Version, Description, AppliedAt) VALUES (:version, :description, :applied_at)"),
+                {'version': number, 'description': description, 'applied_at': datetime.utcnow()}
+            )
+        applied.append(number)
+    return applied
+
+def missing_indexes(engine):
+    inspector = inspect(engine)
+    missing = []
+    for table, name, columns in INDEXES:
+        indexes = {index['name']: index['column_names'] for index in inspector.get_indexes(table)}
+        if indexes.get(name) != columns:
+            missing.append((table, name, columns))
+    return missing
+
+def scanned_table(detail):
+    # "SCAN r" on current SQLite; older versions print "SCAN TABLE Records AS r"
+    # and "SCAN SUBQUERY 1"
+    words = detail.split()[1:]
+    if words[0] in ('TABLE', 'SUBQUERY') and len(words) > 1:
+        words = words[1:]
+    return words[0]
+
+def full_scans(conn, query, params):
+    # Typed statements (text().columns(...)) wrap the text clause
+    sql = getattr(query, 'element', query).text
+    if conn.dialect.name == 'sqlite':
+        plan = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+        # "SCAN r" (optionally "USING INDEX ...") walks the whole table or index,
+        # "SEARCH r USING INDEX ..." is a range or point lookup. Subqueries show
+        # up as "CO-ROUTINE t" / "MATERIALIZE t" and are scanned by design.
+        derived = {row.detail.split()[-1] for row in plan if row.detail.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+        scans = [scanned_table(row.detail) for row in plan if row.detail.startswith('SCAN ')]
+        scans = [table for table in scans if table not in derived]
+    else:
+        plan = conn.execute(text('EXPLAIN ' + sql), params).mappings().fetchall()
+        scans = [row['table'] for row in plan if row['type'] in ('ALL', 'index')]
+    return [table for table in scans if table not in REFERENCE_TABLES and not table.startswith(('<', '('))]
+
+def explain_queries(engine):
+    today = datetime.utcnow().date()
+    params = {
+        'email': 'explain@example.com',
+        'start_date': today - timedelta(days=30),
+        'end_date': today + timedelta(days=1),
+    }
+    problems = []
+    with engine.connect() as conn:
+        for name, query in statements.DBREADER_QUERIES.items():
+            for table in full_scans(conn, query, params):
+                problems.append((name, table))
+    return problems
+
+def run(command, engine):
+    if command == 'upgrade':
+        applied = upgrade(engine)
+        print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+        return 0
+    if command == 'status':
+        with engine.begin() as conn:
+            version = current_version(conn)
+        print(f"Schema version {version} of {MIGRATIONS[-1][0]}")
+        return 0
+    if command == 'check':
+        missing = missing_indexes(engine)
+        for table, name, columns in missing:
+            print(f"Missing index {name} on {table} ({', '.join(columns)})")
+        return 1 if missing else 0
+    if command == 'explain':
+        problems = explain_queries(engine)
+        for name, table in problems:
+            print(f"Query {name} falls back to a full scan of {table}")
+        return 1 if problems else 0
+    return None
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'upgrade'
+    engines = get_engines()
+    status = 0
+    for engine in engines:
+        if len(engines) > 1:
+            print(f"{engine.url.render_as_string(hide_password=True)}:")
+        result = run(command, engine)
+        if result is None:
+            print(f"Usage: python {argv[0]} [upgrade|status|check|explain]")
+            return 2
+        status = max(status, result)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
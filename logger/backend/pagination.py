@@ -0,0 +1,109 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, text
+
+# Keyset pagination and streaming for GET /records and GET /meals. Pages are
+# ordered by (Datetime, Email, <name column>), which is unique per row, and the
+# cursor is the key of the last row served, so page N costs the same index
+# range scan as page 1 instead of an ever-growing OFFSET.
+
+class PageError(ValueError):
+    pass
+
+
+class Listing:
+    def __init__(self, table, columns, name_column):
+        self.table = table
+        self.columns = columns
+        self.key_columns = ['Datetime', 'Email', name_column]
+
+    def key(self, row):
+        return tuple(getattr(row, column) for column in self.key_columns)
+
+
+RECORDS = Listing('Records', ['Email', 'Activity', 'Datetime', 'Duration', 'Quality'], 'Activity')
+MEALS = Listing('Meals', ['Email', 'FoodName', 'Datetime'], 'FoodName')
+
+def encode_cursor(row, listing):
+    key = list(listing.key(row))
+    key[0] = key[0].isoformat()
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, listing):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        key[0] = datetime.fromisoformat(key[0])
+    except (ValueError, TypeError, IndexError):
+        raise PageError("Invalid cursor")
+    if len(key) != len(listing.key_columns):
+        raise PageError("Invalid cursor")
+    return key
+
+def after_key(columns, depth=0):
+    # (a, b, c) > (:k0, :k1, :k2) spelled out so MySQL turns it into a range:
+    # a >= :k0 AND (a > :k0 OR (b > :k1 OR (b = :k1 AND c > :k2)))
+    column = columns[depth]
+    if depth == len(columns) - 1:
+        return f"{column} > :k{depth}"
+    rest = after_key(columns, depth + 1)
+    if depth == 0:
+        return f"{column} >= :k0 AND ({column} > :k0 OR ({rest}))"
+    return f"{column} > :k{depth} OR ({column} = :k{depth} AND ({rest}))"
+
+def build_query(listing, email=None, start=None, end=None, cursor=None, limit=None):
+    conditions = []
+    params = {}
+    if email:
+        conditions.append("Email = :email")
+        params['email'] = email
+    if start:
+        conditions.append("Datetime >= :start")
+        params['start'] = start
+    if end:
+        conditions.append("Datetime < :end")
+        params['end'] = end
+    if cursor:
+        conditions.append(f"({after_key(listing.key_columns)})")
+        params.update({f'k{i}': value for i, value in enumerate(decode_cursor(cursor, listing))})
+
+    sql = f"SELECT {', '.join(listing.columns)} FROM {listing.table}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {', '.join(listing.key_columns)}"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params['limit'] = limit
+    return text(sql).columns(Datetime=DateTime), params
+
+def parse_date_range(args):
+    try:
+        start = datetime.fromisoformat(args['start']) if args.get('start') else None
+        end = datetime.fromisoformat(args['end']) + timedelta(days=1) if args.get('end') else None
+    except ValueError:
+        raise PageError("start and end must be ISO dates")
+    return start, end
+
+def parse_limit(args, max_limit):
+    if not args.get('limit'):
+        return None
+    try:
+        limit = int(args['limit'])
+    except ValueError:
+        raise PageError("limit must be an integer")
+    if limit < 1:
+        raise PageError("limit must be positive")
+    return min(limit, max_limit)
+
+def stream_ndjson(rows, to_dict):
+    for row in rows:
+        yield json.dumps(to_dict(row)) + '\n'
+
+def stream_json(rows, to_dict):
+    yield '{"success": true, "data": ['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps(to_dict(row))
+        separator = ', '
+    yield ']}'
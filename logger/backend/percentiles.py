@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Per-window index of every user's burn per activity, so a percentile lookup is
+# a dict hit plus a binary search instead of an all-users query per request.
+
+class WindowIndex:
+    def __init__(self, rows, day):
+        self.day = day
+        self.built_at = time.time()
+        activity_cals = defaultdict(list)
+        self.user_cals = defaultdict(dict)
+        for row in rows:
+            cals_burnt = float(row.cals_burnt or 0)
+            activity_cals[row.Activity].append(cals_burnt)
+            self.user_cals[row.Email][row.Activity] = cals_burnt
+        self.sorted_cals = {activity: sorted(cals) for activity, cals in activity_cals.items()}
+
+    def age(self):
+        return time.time() - self.built_at
+
+    def percentiles(self, email):
+        percentile_data = []
+        for activity, user_cals_burnt in self.user_cals.get(email, {}).items():
+            cals_list = self.sorted_cals[activity]
+            count_less = bisect_left(cals_list, user_cals_burnt)
+            percentile = (count_less / len(cals_list)) * 100
+            percentile_data.append({'activity': activity, 'percentile': round(percentile, 2)})
+        return percentile_data
+
+
+class PercentileIndex:
+    def __init__(self, load_rows, max_age=300):
+        # load_rows(numdays) returns (Activity, Email, cals_burnt) rows for the window
+        self.load_rows = load_rows
+        self.max_age = max_age
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def is_fresh(self, index):
+        return index is not None and index.day == datetime.utcnow().date() and index.age() < self.max_age
+
+    def refresh(self, numdays):
+        index = WindowIndex(self.load_rows(numdays), datetime.utcnow().date())
+        self.windows[numdays] = index
+        return index
+
+    def get(self, numdays):
+        index = self.windows.get(numdays)
+        if self.is_fresh(index):
+            return index
+        if index is not None and index.day == datetime.utcnow().date():
+            # Serve the stale index while another request rebuilds it
+            if not self.lock.acquire(blocking=False):
+                return index
+        else:
+            self.lock.acquire()
+        try:
+            index = self.windows.get(numdays)
+            if self.is_fresh(index):
+                return index
+            return self.refresh(numdays)
+        finally:
+            self.lock.release()
+
+    def lookup(self, email, numdays):
+        index = self.get(numdays)
+        return index.percentiles(email), round(index.age(), 3)
+
+    def start_refresher(self, windows, interval):
+        def run():
+            while True:
+                for numdays in windows:
+                    try:
+                        with self.lock:
+                            self.refresh(numdays)
+                    except Exception:
+                        logger.exception("Refreshing the %s-day percentile index failed", numdays)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name='percentile-index-refresher', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,188 @@
+import logging
+import sys
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+import config
+import dbpool
+import shards
+
+logger = logging.getLogger(__name__)
+
+# Projected burn from the recurring weekly schedule, for every user at once.
+# The schedule is laid out as a users x 168 hour-slot matrix holding the
+# activity index scheduled in each slot (-1 when free). A gather against the
+# per-activity CaloriesPerKg vector, scaled by the per-user weight vector,
+# gives kcal per slot, summed into days a block of users at a time so the
+# kcal matrix itself is never kept. The per-activity breakdown of one user is
+# hours x rate x weight, computed when asked. The per-hour rate matches the
+# rollup: CaloriesPerKg * Weight * (minutes / 60).
+
+DAYS = ('M', 'T', 'W', 'R', 'F', 'S', 'U')
+HOURS = 24
+SLOTS = len(DAYS) * HOURS
+FREE = -1
+BLOCK_USERS = 10000
+
+USERS_QUERY = text("SELECT Email, Weight FROM UserStorage")
+ACTIVITIES_QUERY = text("SELECT ActivityName, CaloriesPerKg FROM Activities")
+SCHEDULE_QUERY = text("SELECT Email, Activity, Day, StartTime, EndTime FROM Schedule")
+USER_QUERY = text("SELECT Email, Weight FROM UserStorage WHERE Email = :email")
+USER_SCHEDULE_QUERY = text("SELECT Email, Activity, Day, StartTime, EndTime FROM Schedule WHERE Email = :email")
+
+
+class Projection:
+    def __init__(self, users, activities, schedule):
+        activities = list(activities)
+        self.emails = [row[0] for row in users]
+        self.user_index = {email: i for i, email in enumerate(self.emails)}
+        self.activities = [row[0] for row in activities]
+        activity_index = {name: i for i, name in enumerate(self.activities)}
+        day_index = {day: i for i, day in enumerate(DAYS)}
+
+        self.weights = np.array([row[1] or 0 for row in users], dtype=np.float64)
+        self.rates = np.array([row[1] or 0 for row in activities] + [0], dtype=np.float64)
+
+        # Rows for unknown users, activities or days contribute nothing
+        rows = [
+            (self.user_index[email], activity_index[activity], day_index[day], start, end)
+            for email, activity, day, start, end in schedule
+            if email in self.user_index and activity in activity_index and day in day_index
+        ]
+        table = np.array(rows, dtype=np.int64).reshape(-1, 5)
+        user, activity, day = table[:, 0], table[:, 1], table[:, 2]
+        start = np.clip(table[:, 3], 0, HOURS)
+        lengths = np.maximum(np.clip(table[:, 4], 0, HOURS) - start, 0)
+
+        # Expand every row into the hour slots it covers
+        row_of_slot = np.repeat(np.arange(len(table)), lengths)
+        first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        hour = start[row_of_slot] + (np.arange(len(row_of_slot)) - first)
+        dtype = np.int16 if len(self.activities) < np.iinfo(np.int16).max else np.int32
+        self.slots = np.full((len(self.emails), SLOTS), FREE, dtype=dtype)
+        self.slots[user[row_of_slot], day[row_of_slot] * HOURS + hour] = activity[row_of_slot]
+
+        # FREE indexes the trailing zero rate
+        self.daily = np.zeros((len(self.emails), len(DAYS)))
+        for first_user in range(0, len(self.emails), BLOCK_USERS):
+            block = slice(first_user, first_user + BLOCK_USERS)
+            rate_per_day = self.rates[self.slots[block]].reshape(-1, len(DAYS), HOURS).sum(axis=2)
+            self.daily[block] = rate_per_day * self.weights[block, None]
+        self.weekly = self.daily.sum(axis=1)
+        self.built_at = time.time()
+
+    def age(self):
+        return time.time() - self.built_at
+
+    def for_user(self, email):
+        i = self.user_index.get(email)
+        if i is None:
+            return None
+        slots = self.slots[i]
+        busy = slots != FREE
+        hours = np.bincount(slots[busy], minlength=len(self.activities))
+        cals = hours * self.rates[:-1] * self.weights[i]
+        return {
+            'daily': [{'day': day, 'cals_burnt': float(value)} for day, value in zip(DAYS, self.daily[i])],
+            'weekly_cals_burnt': float(self.weekly[i]),
+            'avg_daily_cals_burnt': float(self.weekly[i] / len(DAYS)),
+            'activities': [
+                {'activity': self.activities[a], 'hours_per_week': int(hours[a]), 'cals_burnt': float(cals[a])}
+                for a in np.flatnonzero(hours)
+            ]
+        }
+
+    def project(self, users, schedule):
+        # A projection of other users (e.g. one whose schedule just changed)
+        # with this one's activities and rates
+        return Projection(users, zip(self.activities, self.rates[:-1]), schedule)
+
+
+class ProjectionIndex:
+    # Holds the latest all-users projection for the process. Only the first
+    # build runs in a request; after that it is rebuilt on a background thread
+    # once max_age old, and served as is meanwhile. Users whose schedule or
+    # weight changed since the build started are projected on their own with
+    # build_user(email, projection) until a newer build covers them. Other
+    # worker processes pick the change up with their next build.
+    def __init__(self, build, build_user, max_age=300):
+        self.build = build
+        self.build_user = build_user
+        self.max_age = max_age
+        self.projection = None
+        # email -> sequence number of its latest change
+        self.changed = {}
+        self.changes = 0
+        self.refreshing = False
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+
+    def refresh(self):
+        # Callers hold build_lock
+        with self.lock:
+            seen = self.changes
+        projection = self.build()
+        with self.lock:
+            self.projection = projection
+            self.changed = {email: change for email, change in self.changed.items() if change > seen}
+        return projection
+
+    def start_refresh(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+
+        def run():
+            try:
+                with self.build_lock:
+                    self.refresh()
+            except Exception:
+                logger.exception("Rebuilding the schedule projection failed")
+            finally:
+                with self.lock:
+                    self.refreshing = False
+
+        threading.Thread(target=run, name='projection-refresh', daemon=True).start()
+
+    def get(self):
+        projection = self.projection
+        if projection is None:
+            with self.build_lock:
+                return self.projection or self.refresh()
+        if projection.age() >= self.max_age:
+            self.start_refresh()
+        return projection
+
+    def for_user(self, email):
+        # (the user's projection or None, age of the data in seconds)
+        projection = self.get()
+        if email in self.changed:
+            return self.build_user(email, projection), 0.0
+        return projection.for_user(email), projection.age()
+
+    def invalidate_user(self, email):
+        with self.lock:
+            self.changes += 1
+            self.changed[email] = self.changes
+
+
+def main(argv):
+    uris = dbpool.shard_uris()
+    engines = {name: create_engine(uri) for name, uri in uris.items()} or {None: create_engine(config.SQLALCHEMY_DATABASE_URI)}
+    router = shards.ShardRouter(uris)
+    started = time.perf_counter()
+    with create_engine(config.SQLALCHEMY_DATABASE_URI).connect() as conn:
+        activities = conn.execute(ACTIVITIES_QUERY).fetchall()
+    projection = Projection(router.gather(engines, USERS_QUERY), activities, router.gather(engines, SCHEDULE_QUERY))
+    elapsed = time.perf_counter() - started
+    print(f"Projected {len(projection.emails)} users over {len(engines)} database(s) in {elapsed:.2f}s")
+    if len(projection.emails):
+        print(f"Mean weekly burn {projection.weekly.mean():.1f} kcal, max {projection.weekly.max():.1f} kcal")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
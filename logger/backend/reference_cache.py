@@ -0,0 +1,51 @@
+import hashlib
+import json
+import threading
+import time
+
+# Process-wide cache for the reference tables (Food, Activities). Each entry
+# keeps the serialized response body and a content hash used as its ETag, so a
+# hit costs no DB work and a matching If-None-Match costs no body either.
+# Entries are reloaded after `ttl` seconds: invalidate() only clears the
+# process that receives it, and the other workers catch up on expiry.
+
+class CachedResponse:
+    def __init__(self, data):
+        self.body = json.dumps({"success": True, "data": data}, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.loaded_at = time.monotonic()
+
+
+class ReferenceCache:
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    def expired(self, entry):
+        return entry is None or (self.ttl is not None and time.monotonic() - entry.loaded_at > self.ttl)
+
+    def get(self, name, load):
+        entry = self.entries.get(name)
+        if self.expired(entry):
+            with self.lock:
+                entry = self.entries.get(name)
+                if self.expired(entry):
+                    entry = CachedResponse(load())
+                    self.entries[name] = entry
+        return entry
+
+    def invalidate(self, name=None):
+        with self.lock:
+            if name is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(name, None)
+        for listener in self.listeners:
+            listener(name)
+
+    def on_invalidate(self, listener):
+        # listener(name) runs after every invalidation; name is None for "all"
+        self.listeners.append(listener)
+        return listener
@@ -0,0 +1,163 @@
+import hashlib
+import itertools
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+import dbpool
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Read replicas for GET requests. Each database (the default one, or each shard)
+# can have replicas in READ_REPLICA_URIS; reads pick one round-robin among
+# those whose replication lag is within REPLICA_MAX_LAG_SECONDS, and fall back
+# to the primary when none is. A user who just wrote reads from the primary for
+# READ_YOUR_WRITES_SECONDS so a chart requested right after a log shows it;
+# the window should comfortably exceed the lag allowed on a replica. The next
+# read usually lands on another worker process, so the time of each user's last
+# write is also kept as the mtime of a marker file under READ_YOUR_WRITES_DIR,
+# shared by every worker on the host (put it on a shared volume when the
+# workers span hosts).
+
+def replica_lag(conn):
+    # Seconds the replica is behind its source; None if it is not replicating
+    if conn.dialect.name == 'sqlite':
+        # Local stand-ins are plain copies with nothing to lag behind
+        return 0
+    for statement, column in (('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                              ('SHOW SLAVE STATUS', 'Seconds_Behind_Master')):
+        try:
+            row = conn.execute(text(statement)).mappings().fetchone()
+        except Exception:
+            # SHOW REPLICA STATUS needs MySQL 8.0.22
+            continue
+        return row.get(column) if row else None
+    return None
+
+
+class ReplicaSet:
+    def __init__(self, uris, max_lag=5):
+        self.uris = list(uris)
+        self.engines = [create_engine(uri, **dbpool.engine_options(uri)) for uri in self.uris]
+        self.max_lag = max_lag
+        self.healthy = list(self.engines)
+        self.lags = {}
+        self.counter = itertools.count()
+
+    def pick(self):
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self.counter) % len(healthy)]
+
+    def check(self):
+        healthy = []
+        for engine in self.engines:
+            try:
+                with engine.connect() as conn:
+                    lag = replica_lag(conn)
+            except Exception:
+                logger.exception("Checking replica %s failed", engine.url.render_as_string(hide_password=True))
+                lag = None
+            self.lags[engine] = lag
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(engine)
+            elif engine in self.healthy:
+                logger.warning("Taking replica %s out of rotation (lag %s)", engine.url.render_as_string(hide_password=True), lag)
+        self.healthy = healthy
+
+
+class ReadRouter:
+    def __init__(self, replica_uris, max_lag=5, sticky_seconds=15, max_tracked=100000, directory=None):
+        # replica_uris maps a shard name (None without shards) to its replicas
+        self.sets = {shard: ReplicaSet(uris, max_lag) for shard, uris in replica_uris.items() if uris}
+        self.sticky_seconds = sticky_seconds
+        self.max_tracked = max_tracked
+        self.last_write = {}
+        self.lock = threading.Lock()
+        # Without replicas every read goes to the primary and nothing is shared
+        self.directory = directory if self.sets else None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def engines(self):
+        return [engine for replicas in self.sets.values() for engine in replicas.engines]
+
+    def engine_for(self, shard):
+        # A healthy replica of the shard, or None to read from the primary
+        replicas = self.sets.get(shard)
+        return replicas.pick() if replicas else None
+
+    def marker(self, email):
+        return os.path.join(self.directory, hashlib.sha1(email.lower().encode('utf-8')).hexdigest())
+
+    def wrote(self, email):
+        now = time.time()
+        with self.lock:
+            self.last_write[email.lower()] = now
+            if len(self.last_write) > self.max_tracked:
+                cutoff = now - self.sticky_seconds
+                self.last_write = {key: at for key, at in self.last_write.items() if at >= cutoff}
+                if self.directory:
+                    self.forget_markers(cutoff)
+        if self.directory:
+            try:
+                with open(self.marker(email), 'a'):
+                    pass
+                os.utime(self.marker(email), (now, now))
+            except OSError:
+                logger.exception("Recording the write for %s failed", email)
+
+    def forget_markers(self, cutoff):
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def is_sticky(self, email):
+        # This process's own record first, then the one shared by every worker
+        cutoff = time.time() - self.sticky_seconds
+        if self.last_write.get(email.lower(), cutoff) > cutoff:
+            return True
+        if self.directory:
+            try:
+                return os.stat(self.marker(email)).st_mtime > cutoff
+            except OSError:
+                pass
+        return False
+
+    def check(self):
+        for replicas in self.sets.values():
+            replicas.check()
+
+    def start_checker(self, interval):
+        def run():
+            while True:
+                try:
+                    self.check()
+                except Exception:
+                    logger.exception("Replica lag check failed")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name='replica-lag-checker', daemon=True)
+        thread.start()
+        return thread
+
+    def render(self):
+        lag_name, healthy_name = 'logger_replica_lag_seconds', 'logger_replica_healthy'
+        lines = [f'# HELP {lag_name} Replication lag at the last check (-1 when unknown).', f'# TYPE {lag_name} gauge']
+        health = [f'# HELP {healthy_name} Whether the replica is in the read rotation.', f'# TYPE {healthy_name} gauge']
+        for shard, replicas in self.sets.items():
+            for engine in replicas.engines:
+                labels = (('shard', shard or 'default'), ('replica', engine.url.render_as_string(hide_password=True)))
+                lag = replicas.lags.get(engine)
+                lines.append(f'{metrics.format_series(lag_name, labels)} {metrics.format_value(-1 if lag is None else lag)}')
+                health.append(f'{metrics.format_series(healthy_name, labels)} {int(engine in replicas.healthy)}')
+        return lines + health if self.sets else []
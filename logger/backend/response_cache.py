@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Per-user cache for the analytics responses. Keys are (email, endpoint, window,
+# today) tuples, entries expire after a TTL, backends evict by size, and the
+# write handlers drop a user's entries once their transaction commits.
+# Each backend also keeps a per-user generation, bumped on every invalidation,
+# so a value computed from pre-write data is not stored after the write has
+# already cleared the user's entries.
+
+class MemoryBackend:
+    # Entries and generations live in this process only, so a write handled by
+    # one worker does not clear the others' entries; with several worker
+    # processes use the file backend.
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.keys_by_email = defaultdict(set)
+        self.generations = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def generation(self, email):
+        with self.lock:
+            return self.generations[email]
+
+    def bump(self, email):
+        with self.lock:
+            self.generations[email] += 1
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        # Returns how many entries were evicted to make room
+        evicted = 0
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            self.keys_by_email[key[0]].add(key)
+            while len(self.entries) > self.max_entries:
+                old_key, _ = self.entries.popitem(last=False)
+                self.keys_by_email[old_key[0]].discard(old_key)
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.keys_by_email[key[0]].discard(key)
+
+    def delete_email(self, email):
+        with self.lock:
+            for key in self.keys_by_email.pop(email, ()):
+                self.entries.pop(key, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class FileBackend:
+    # One JSON file per entry under <directory>/<hash(email)>/, so a user's
+    # entries can be dropped with a single directory removal. Shared by every
+    # worker process on the host. Walking the directory to evict costs one call
+    # per file, so each process sweeps once every evict_every writes rather than
+    # on every one; between sweeps it may overshoot max_entries by that much.
+    def __init__(self, directory, max_entries=10000, evict_every=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evict_every = evict_every or max(1, max_entries // 10)
+        self.writes = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def user_dir(self, email):
+        return os.path.join(self.directory, hashlib.sha1(email.encode('utf-8')).hexdigest())
+
+    def generation_path(self, email):
+        # Outside the user's directory, which invalidation removes
+        return os.path.join(self.directory, 'generations', hashlib.sha1(email.encode('utf-8')).hexdigest())
+
+    def generation(self, email):
+        try:
+            with open(self.generation_path(email), encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def bump(self, email):
+        # Any new value will do; readers only compare it with the one they saw
+        path = self.generation_path(email)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(os.urandom(8).hex())
+        os.replace(tmp_path, path)
+
+    def path(self, key):
+        name = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.user_dir(key[0]), name + '.json')
+
+    def get(self, key):
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                return tuple(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, entry):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(entry), f)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.writes += 1
+            due = self.writes % self.evict_every == 0
+        return self.evict() if due else 0
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def delete_email(self, email):
+        shutil.rmtree(self.user_dir(email), ignore_errors=True)
+
+    def files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def evict(self):
+        files = list(self.files())
+        if len(files) <= self.max_entries:
+            return 0
+        files.sort(key=lambda path: os.stat(path).st_mtime if os.path.exists(path) else 0)
+        evicted = 0
+        for path in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+                evicted += 1
+            except OSError:
+                pass
+        return evicted
+
+    def __len__(self):
+        return sum(1 for _ in self.files())
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        # cacheable() is asked after computing whether the value may be stored
+        entry = self.backend.get(key)
+        if entry is not None and entry[0] > time.time():
+            with self.lock:
+                self.hits += 1
+            return entry[1]
+
+        with self.lock:
+            self.misses += 1
+        generation = self.backend.generation(key[0])
+        value = compute()
+        if cacheable is not None and not cacheable():
+            return value
+        if self.backend.generation(key[0]) != generation:
+            return value
+        evicted = self.backend.set(key, (time.time() + self.ttl, value))
+        # An invalidation that landed between the check and the set has
+        # already run (or is about to run) its delete; undo the set either way
+        if self.backend.generation(key[0]) != generation:
+            self.backend.delete(key)
+        with self.lock:
+            self.evictions += evicted
+        return value
+
+    def invalidate_user(self, email):
+        # Bumped before the delete, so a concurrent set sees one or the other
+        self.backend.bump(email)
+        with self.lock:
+            self.invalidations += 1
+        self.backend.delete_email(email)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRatio': round(self.hits / lookups, 4) if lookups else 0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'ttlSeconds': self.ttl
+        }
@@ -0,0 +1,254 @@
+import sys
+from datetime import date, datetime, timedelta
+from itertools import groupby
+
+from sqlalchemy import create_engine, inspect, text
+
+import dbpool
+
+# Burn is worked out when a record is written and stored on the row with the
+# weight it used (CaloriesPerKg * Weight * hours), so reads sum one column and
+# a later weight change leaves the history as it was logged. The templates
+# take SQL for the email, activity, weight and duration.
+RECORD_WEIGHT = "(SELECT Weight FROM UserStorage WHERE Email = {email})"
+RECORD_BURN = "(SELECT CaloriesPerKg FROM Activities WHERE ActivityName = {activity}) * {weight} * ({duration} / 60.0)"
+
+# Fills rows written before the columns existed, or before the user had a
+# weight, from the current weight
+BACKFILL_SQL = """
+    UPDATE Records
+    SET WeightKg = COALESCE(WeightKg, {weight}),
+        CaloriesBurnt = {burn}
+    WHERE CaloriesBurnt IS NULL AND {records_filter}
+"""
+BACKFILL_VALUES = {
+    'weight': RECORD_WEIGHT.format(email='Records.Email'),
+    'burn': RECORD_BURN.format(
+        activity='Records.Activity',
+        weight='COALESCE(WeightKg, ' + RECORD_WEIGHT.format(email='Records.Email') + ')',
+        duration='Duration'
+    ),
+}
+BACKFILL_ALL = text(BACKFILL_SQL.format(records_filter="1 = 1", **BACKFILL_VALUES))
+BACKFILL_USER = text(BACKFILL_SQL.format(records_filter="Email = :email", **BACKFILL_VALUES))
+
+# DailyTotals keeps one row per (Email, Date) with the figures every analytics
+# read needs. The write handlers in app.py refresh the affected days inside the
+# same transaction as the write, so readers never see a half-applied change.
+# Protein and carbs are summed from Food.ProteinGrams / Food.CarbGrams for
+# saved log generation.
+CREATE_DAILY_TOTALS = text("""
+    CREATE TABLE IF NOT EXISTS DailyTotals (
+        Email VARCHAR(255) NOT NULL,
+        Date DATE NOT NULL,
+        CalsBurnt DOUBLE NOT NULL DEFAULT 0,
+        CalsIn DOUBLE NOT NULL DEFAULT 0,
+        UnhealthyCals DOUBLE NOT NULL DEFAULT 0,
+        ProteinGrams DOUBLE NOT NULL DEFAULT 0,
+        CarbGrams DOUBLE NOT NULL DEFAULT 0,
+        ActivitySeconds INT NOT NULL DEFAULT 0,
+        RecordCount INT NOT NULL DEFAULT 0,
+        MealCount INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (Email, Date)
+    )
+""")
+
+ROLLUP_SELECT = """
+    SELECT t.Email, t.date,
+           SUM(t.cals_burnt), SUM(t.cals_in), SUM(t.unhealthy_cals),
+           SUM(t.protein), SUM(t.carbs), SUM(t.activity_seconds),
+           SUM(t.records), SUM(t.meals)
+    FROM (
+        SELECT r.Email, DATE(r.Datetime) AS date,
+               COALESCE(r.CaloriesBurnt, 0) AS cals_burnt,
+               0 AS cals_in, 0 AS unhealthy_cals, 0 AS protein, 0 AS carbs,
+               r.Duration * 60 AS activity_seconds, 1 AS records, 0 AS meals
+        FROM Records r
+        WHERE {records_filter}
+        UNION ALL
+        SELECT m.Email, DATE(m.Datetime) AS date,
+               0 AS cals_burnt,
+               f.Calories AS cals_in,
+               CASE WHEN f.HighlyProcessed = 1 THEN f.Calories ELSE 0 END AS unhealthy_cals,
+               f.ProteinGrams AS protein, f.CarbGrams AS carbs,
+               0 AS activity_seconds, 0 AS records, 1 AS meals
+        FROM Meals m
+        JOIN Food f ON m.FoodName = f.FoodName
+        WHERE {meals_filter}
+    ) t
+    GROUP BY t.Email, t.date
+"""
+
+ROLLUP_INSERT = """
+    INSERT INTO DailyTotals
+        (Email, Date, CalsBurnt, CalsIn, UnhealthyCals, ProteinGrams, CarbGrams, ActivitySeconds, RecordCount, MealCount)
+"""
+
+DELETE_USER_RANGE = text("""
+    DELETE FROM DailyTotals
+    WHERE Email = :email AND Date >= :start_date AND Date < :end_date
+""")
+
+REFRESH_USER_RANGE = text(ROLLUP_INSERT + ROLLUP_SELECT.format(
+    records_filter="r.Email = :email AND r.Datetime >= :start_date AND r.Datetime < :end_date",
+    meals_filter="m.Email = :email AND m.Datetime >= :start_date AND m.Datetime < :end_date",
+))
+
+DELETE_ALL = text("DELETE FROM DailyTotals")
+
+# DailyCumulative mirrors DailyTotals with running totals per user, so the sums
+# over any date range are two point lookups and a subtraction. Rows from the
+# first refreshed day onward are recomputed after every refresh; writes land
+# on recent days, so that is usually a handful of rows.
+CREATE_DAILY_CUMULATIVE = text("""
+    CREATE TABLE IF NOT EXISTS DailyCumulative (
+        Email VARCHAR(255) NOT NULL,
+        Date DATE NOT NULL,
+        CumCalsBurnt DOUBLE NOT NULL DEFAULT 0,
+        CumCalsIn DOUBLE NOT NULL DEFAULT 0,
+        CumProteinGrams DOUBLE NOT NULL DEFAULT 0,
+        CumCarbGrams DOUBLE NOT NULL DEFAULT 0,
+        PRIMARY KEY (Email, Date)
+    )
+""")
+
+CUMULATIVE_BEFORE = text("""
+    SELECT CumCalsBurnt AS cals_burnt, CumCalsIn AS cals_in,
+           CumProteinGrams AS protein_grams, CumCarbGrams AS carb_grams
+    FROM DailyCumulative
+    WHERE Email = :email AND Date < :end_date
+    ORDER BY Date DESC
+    LIMIT 1
+""")
+
+DAILY_FROM = text("""
+    SELECT Email, Date, CalsBurnt, CalsIn, ProteinGrams, CarbGrams
+    FROM DailyTotals
+    WHERE Email = :email AND Date >= :start_date
+    ORDER BY Date
+""")
+
+ALL_DAILY = text("""
+    SELECT Email, Date, CalsBurnt, CalsIn, ProteinGrams, CarbGrams
+    FROM DailyTotals
+    ORDER BY Email, Date
+""")
+
+DELETE_CUMULATIVE_FROM = text("DELETE FROM DailyCumulative WHERE Email = :email AND Date >= :start_date")
+
+DELETE_ALL_CUMULATIVE = text("DELETE FROM DailyCumulative")
+
+INSERT_CUMULATIVE = text("""
+    INSERT INTO DailyCumulative (Email, Date, CumCalsBurnt, CumCalsIn, CumProteinGrams, CumCarbGrams)
+    VALUES (:email, :date, :cals_burnt, :cals_in, :protein_grams, :carb_grams)
+""")
+
+CUMULATIVE_FIELDS = ('cals_burnt', 'cals_in', 'protein_grams', 'carb_grams')
+ZERO_TOTALS = (0.0,) * len(CUMULATIVE_FIELDS)
+BATCH_SIZE = 5000
+
+REBUILD_ALL = text(ROLLUP_INSERT + ROLLUP_SELECT.format(records_filter="1 = 1", meals_filter="1 = 1"))
+
+FIRST_DAY = date(1000, 1, 1)
+LAST_DAY = date(9999, 12, 31)
+
+def to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+def cumulative_before(session, email, day):
+    row = session.execute(CUMULATIVE_BEFORE, {'email': email, 'end_date': day}).fetchone()
+    return tuple(row) if row else ZERO_TOTALS
+
+def running_totals(rows, totals):
+    # rows are (Email, Date, CalsBurnt, CalsIn, ProteinGrams, CarbGrams) in date order
+    for row in rows:
+        totals = tuple(total + (value or 0) for total, value in zip(totals, row[2:]))
+        yield dict(zip(CUMULATIVE_FIELDS, totals), email=row[0], date=row[1])
+
+def refresh_cumulative(session, email, start_date):
+    session.execute(DELETE_CUMULATIVE_FROM, {'email': email, 'start_date': start_date})
+    rows = session.execute(DAILY_FROM, {'email': email, 'start_date': start_date}).fetchall()
+    values = list(running_totals(rows, cumulative_before(session, email, start_date)))
+    if values:
+        session.execute(INSERT_CUMULATIVE, values)
+
+def range_totals(session, email, start_date, end_date):
+    # Sums over [start_date, end_date)
+    before_end = cumulative_before(session, email, end_date)
+    before_start = cumulative_before(session, email, start_date)
+    return dict(zip(CUMULATIVE_FIELDS, (end - start for end, start in zip(before_end, before_start))))
+
+def refresh_range(session, email, start_date, end_date):
+    params = {'email': email, 'start_date': start_date, 'end_date': end_date}
+    session.execute(DELETE_USER_RANGE, params)
+    session.execute(REFRESH_USER_RANGE, params)
+    refresh_cumulative(session, email, start_date)
+
+def refresh_days(session, email, days):
+    # One DELETE + INSERT ... SELECT over the span the days cover, so a bulk
+    # write costs the same two statements as a single-row one.
+    days = [to_date(day) for day in days]
+    if days:
+        refresh_range(session, email, min(days), max(days) + timedelta(days=1))
+
+def refresh_user(session, email):
+    refresh_range(session, email, FIRST_DAY, LAST_DAY)
+
+def rebuild_cumulative(conn):
+    conn.execute(CREATE_DAILY_CUMULATIVE)
+    conn.execute(DELETE_ALL_CUMULATIVE)
+    batch = []
+    for _, rows in groupby(conn.execute(ALL_DAILY).fetchall(), key=lambda row: row[0]):
+        for value in running_totals(rows, ZERO_TOTALS):
+            batch.append(value)
+            if len(batch) >= BATCH_SIZE:
+                conn.execute(INSERT_CUMULATIVE, batch)
+                batch = []
+    if batch:
+        conn.execute(INSERT_CUMULATIVE, batch)
+
+def add_burn_columns(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('Records')}
+    for name in ('WeightKg', 'CaloriesBurnt'):
+        if name not in columns:
+            conn.execute(text(f"ALTER TABLE Records ADD COLUMN {name} DOUBLE NULL"))
+
+def backfill(conn):
+    add_burn_columns(conn)
+    return conn.execute(BACKFILL_ALL).rowcount
+
+def backfill_user(session, email):
+    return session.execute(BACKFILL_USER, {'email': email}).rowcount
+
+def rebuild(conn):
+    # The rollup sums the stored burn, so fill it in first
+    backfill(conn)
+    conn.execute(CREATE_DAILY_TOTALS)
+    conn.execute(DELETE_ALL)
+    conn.execute(REBUILD_ALL)
+    rebuild_cumulative(conn)
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'rebuild'
+    if command not in ('rebuild', 'backfill'):
+        print(f"Usage: python {argv[0]} [rebuild|backfill]")
+        return 2
+
+    for uri in dbpool.database_uris():
+        engine = create_engine(uri)
+        name = engine.url.render_as_string(hide_password=True)
+        with engine.begin() as conn:
+            if command == 'backfill':
+                print(f"Backfilled burn on {name}: {backfill(conn)} records")
+                continue
+            rebuild(conn)
+            count = conn.execute(text("SELECT COUNT(*) FROM DailyTotals")).scalar()
+        print(f"Rebuilt DailyTotals on {name}: {count} rows")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
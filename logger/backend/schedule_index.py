@@ -0,0 +1,121 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+# Overlap checks for /schedule/bulk. Each user's week is loaded once into a
+# per-day index of intervals sorted by start hour; an incoming event is checked
+# against the index with a bisect and, once accepted, added to it, so later
+# events in the same batch are checked against earlier ones too.
+#
+# Two events overlap when start < other.end and end > other.start, the same
+# test the single-row routes run in SQL.
+
+DAYS = ('M', 'T', 'W', 'R', 'F', 'S', 'U')
+FIELDS = ('Email', 'Activity', 'Day', 'StartTime', 'EndTime')
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def parse_hour(value, name):
+    # "HH:MM" from the schedule form or a bare hour
+    try:
+        hour = int(value.split(':')[0]) if isinstance(value, str) else int(value)
+    except (ValueError, TypeError):
+        raise ScheduleError(f"Invalid {name}: {value}")
+    if not 0 <= hour <= 24:
+        raise ScheduleError(f"{name} must be between 0 and 24")
+    return hour
+
+def validate(raw):
+    if not isinstance(raw, dict):
+        raise ScheduleError("Event must be an object")
+    missing = [field for field in FIELDS if raw.get(field) in (None, '')]
+    if missing:
+        raise ScheduleError(f"Missing fields: {', '.join(missing)}")
+    if raw['Day'] not in DAYS:
+        raise ScheduleError(f"Day must be one of {''.join(DAYS)}")
+    row = {field: raw[field] for field in FIELDS}
+    row['StartTime'] = parse_hour(raw['StartTime'], 'StartTime')
+    row['EndTime'] = parse_hour(raw['EndTime'], 'EndTime')
+    if row['EndTime'] < row['StartTime']:
+        raise ScheduleError("Start Time must be before End Time!")
+    return row
+
+def interval_to_dict(interval):
+    start, end, activity = interval
+    return {'activity': activity, 'start_time': start, 'end_time': end}
+
+
+class DayIndex:
+    # Intervals sorted by start, with the running maximum of their ends so that
+    # overlap with [start, end) is one bisect plus a walk over the actual
+    # conflicts, even if stored rows already overlap each other.
+    def __init__(self):
+        self.intervals = []
+        self.max_ends = []
+
+    def add(self, start, end, activity):
+        insort(self.intervals, (start, end, activity))
+        self.max_ends = []
+        for interval in self.intervals:
+            self.max_ends.append(max(interval[1], self.max_ends[-1]) if self.max_ends else interval[1])
+
+    def overlapping(self, start, end):
+        # Intervals before `position` start before `end`; walk back while some
+        # earlier interval still reaches past `start`
+        position = bisect_left(self.intervals, (end,))
+        found = []
+        for i in range(position - 1, -1, -1):
+            if self.max_ends[i] <= start:
+                break
+            if self.intervals[i][1] > start:
+                found.append(self.intervals[i])
+        return found[::-1]
+
+
+class WeekIndex:
+    def __init__(self, rows=()):
+        self.days = defaultdict(DayIndex)
+        self.keys = set()
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        self.days[row['Day']].add(row['StartTime'], row['EndTime'], row['Activity'])
+        self.keys.add((row['Activity'], row['Day']))
+
+    def check(self, row):
+        # Returns (status, conflicts) for a validated row without adding it
+        if (row['Activity'], row['Day']) in self.keys:
+            return 'duplicate', []
+        conflicts = self.days[row['Day']].overlapping(row['StartTime'], row['EndTime'])
+        if conflicts:
+            return 'overlap', [interval_to_dict(interval) for interval in conflicts]
+        return 'created', []
+
+
+def plan(raw_rows, load_week):
+    # Returns (results, accepted). `load_week(email)` returns the user's stored
+    # rows; it is called once per user in the batch.
+    results = []
+    accepted = []
+    weeks = {}
+    for index, raw in enumerate(raw_rows):
+        try:
+            row = validate(raw)
+        except ScheduleError as e:
+            results.append({'index': index, 'status': 'invalid', 'error': str(e)})
+            continue
+        week = weeks.get(row['Email'])
+        if week is None:
+            week = weeks[row['Email']] = WeekIndex(load_week(row['Email']))
+        status, conflicts = week.check(row)
+        result = {'index': index, 'status': status}
+        if conflicts:
+            result['conflicts'] = conflicts
+        results.append(result)
+        if status == 'created':
+            week.add(row)
+            accepted.append(row)
+    return results, accepted
@@ -0,0 +1,208 @@
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# In-memory, typo-tolerant search over the reference names (Food, Activities).
+# Names are split into words and the distinct words (a much smaller set than
+# the names) are indexed by their trigrams, pg_trgm style with each word padded
+# as "  word ". Each query word is matched against that vocabulary by trigram
+# similarity (shared / union), the last one also by prefix since the user is
+# still typing it, and a name scores the average over the query words of its
+# best matching word. Exact and prefix matches of the whole name get a bonus,
+# and ties go to the shorter name, then alphabetical order.
+
+NON_WORD = re.compile(r'[\W_]+')
+MIN_SCORE = 0.3
+MIN_WORD_SIMILARITY = 0.3
+PREFIX_SIMILARITY = 0.8
+MAX_WORD_MATCHES = 16
+NAME_PREFIX_BONUS = 0.25
+EXACT_BONUS = 1.0
+
+def normalize(value):
+    # Lower case, accents dropped, punctuation runs collapsed to one space
+    decomposed = unicodedata.normalize('NFKD', str(value).lower())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(NON_WORD.sub(' ', stripped).split())
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    def __init__(self, items):
+        # items are (name, metadata) pairs; metadata is returned with each hit
+        self.names = [name for name, _ in items]
+        self.metadata = [metadata for _, metadata in items]
+        self.normalized = [normalize(name) for name in self.names]
+        # Tie-breaker, and the normalized names sorted for whole-name lookups
+        # (length, alphabetical rank) packed into one sortable number
+        ranks = np.empty(len(self.names), dtype=np.int64)
+        ranks[sorted(range(len(self.names)), key=self.names.__getitem__)] = np.arange(len(self.names))
+        self.tiebreak = np.array([len(name) for name in self.names], dtype=np.int64) << 32 | ranks
+        by_normalized = sorted(range(len(self.names)), key=self.normalized.__getitem__)
+        self.by_normalized = np.array(by_normalized, dtype=np.int64)
+        self.sorted_normalized = [self.normalized[i] for i in by_normalized]
+
+        items_by_word = defaultdict(set)
+        for i, text in enumerate(self.normalized):
+            for word in text.split():
+                items_by_word[word].add(i)
+        self.words = sorted(items_by_word)
+        self.word_items = [np.array(sorted(items_by_word[word]), dtype=np.int32) for word in self.words]
+
+        postings = defaultdict(list)
+        self.word_sizes = np.zeros(len(self.words), dtype=np.int32)
+        for w, word in enumerate(self.words):
+            grams = trigrams(word)
+            self.word_sizes[w] = len(grams)
+            for gram in grams:
+                postings[gram].append(w)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def similar_words(self, word, prefix=False):
+        # (vocabulary ids, similarities) of the words close enough to word
+        similarities = np.zeros(len(self.words))
+        grams = trigrams(word)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if lists:
+            shared = np.bincount(np.concatenate(lists), minlength=len(self.words))
+            hits = np.flatnonzero(shared)
+            similarities[hits] = shared[hits] / (len(grams) + self.word_sizes[hits] - shared[hits])
+        if prefix:
+            start = bisect_left(self.words, word)
+            end = bisect_left(self.words, word + '\uffff', start)
+            np.maximum(similarities[start:end], PREFIX_SIMILARITY, out=similarities[start:end])
+
+        matches = np.flatnonzero(similarities >= MIN_WORD_SIMILARITY)
+        if len(matches) > MAX_WORD_MATCHES:
+            matches = matches[np.argpartition(-similarities[matches], MAX_WORD_MATCHES - 1)[:MAX_WORD_MATCHES]]
+        return matches, similarities[matches]
+
+    def scores(self, words):
+        # Summed over the query words; None when none of them matched anything
+        scores = None
+        for position, word in enumerate(words):
+            matches, similarities = self.similar_words(word, prefix=position == len(words) - 1)
+            if not len(matches):
+                continue
+            ids = np.concatenate([self.word_items[w] for w in matches])
+            values = np.repeat(similarities.astype(np.float32), [len(self.word_items[w]) for w in matches])
+            # A name counts its best matching word once per query word
+            best = np.zeros(len(self.names), dtype=np.float32)
+            np.maximum.at(best, ids, values)
+            if scores is None:
+                scores = best
+            else:
+                scores += best
+        return scores
+
+    def name_matches(self, text, prefix=False):
+        # Ids of the names whose normalized form is text, or starts with it
+        start = bisect_left(self.sorted_normalized, text)
+        end = bisect_left(self.sorted_normalized, text + ('\uffff' if prefix else '\0'), start)
+        return self.by_normalized[start:end]
+
+    def search(self, query, limit=10):
+        words = normalize(query).split()
+        if not words or not self.names:
+            return []
+        scores = self.scores(words)
+        if scores is None:
+            return []
+
+        candidates = np.flatnonzero(scores >= MIN_SCORE * len(words))
+        if not len(candidates):
+            return []
+        text = ' '.join(words)
+        ranked = scores / len(words)
+        ranked[self.name_matches(text, prefix=True)] += NAME_PREFIX_BONUS
+        ranked[self.name_matches(text)] += EXACT_BONUS - NAME_PREFIX_BONUS
+        ranked = ranked[candidates]
+
+        # Only the best limit names are sorted: those above the limit-th best
+        # score, plus the ones tied with it that win the tie-break
+        if len(candidates) > limit:
+            cutoff = np.partition(ranked, len(ranked) - limit)[len(ranked) - limit]
+            above = np.flatnonzero(ranked > cutoff)
+            tied = np.flatnonzero(ranked == cutoff)
+            wanted = limit - len(above)
+            if len(tied) > wanted:
+                tied = tied[np.argpartition(self.tiebreak[candidates[tied]], wanted - 1)[:wanted]]
+            keep = np.concatenate([above, tied])
+            candidates, ranked = candidates[keep], ranked[keep]
+        order = np.lexsort((self.tiebreak[candidates], -ranked))
+        return [
+            {'name': self.names[i], **self.metadata[i], 'score': round(float(score), 3)}
+            for i, score in zip(candidates[order].tolist(), ranked[order].tolist())
+        ]
+
+class SearchIndexes:
+    # One NameIndex per reference table, built on first use (or by warm() at
+    # startup). Rebuilds run on one background thread: requests made while it
+    # is busy are merged into its queue, and lookups keep using the previous
+    # index until the new one is ready. Indexes older than max_age seconds are
+    # rebuilt the same way, so workers that never saw an invalidation catch up.
+    def __init__(self, loaders, max_age=300):
+        # loaders: name -> load() returning (name, metadata) pairs
+        self.loaders = loaders
+        self.max_age = max_age
+        self.indexes = {}
+        self.built_at = {}
+        self.pending = set()
+        self.builder = None
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        index = self.indexes.get(name)
+        if index is None:
+            with self.lock:
+                index = self.indexes.get(name)
+                if index is None:
+                    self.built_at[name] = time.monotonic()
+                    index = self.indexes[name] = NameIndex(self.loaders[name]())
+        elif self.max_age is not None and time.monotonic() - self.built_at[name] > self.max_age:
+            self.start_build([name])
+        return index
+
+    def build_pending(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.builder = None
+                    return
+                name = self.pending.pop()
+            started = time.monotonic()
+            try:
+                index = NameIndex(self.loaders[name]())
+            except Exception:
+                logger.exception("Building the %s search index failed", name)
+                continue
+            with self.lock:
+                self.indexes[name] = index
+                self.built_at[name] = started
+
+    def start_build(self, names):
+        with self.lock:
+            self.pending.update(names)
+            if self.builder is None and self.pending:
+                self.builder = threading.Thread(target=self.build_pending, name='search-index-build', daemon=True)
+                self.builder.start()
+            return self.builder
+
+    def warm(self):
+        return self.start_build(self.loaders)
+
+    def rebuild(self, name=None):
+        # Only indexes already in use are rebuilt; the rest build on first use
+        names = [name] if name is not None else list(self.indexes)
+        return self.start_build(name for name in names if name in self.indexes)
@@ -0,0 +1,175 @@
+import hashlib
+import heapq
+import sys
+from bisect import bisect
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, inspect, text
+
+import dbpool
+import rollup
+
+# Users are spread over the databases in SHARD_DATABASE_URIS ({name: uri}) by
+# consistent hashing of their email. Each shard owns POINTS_PER_SHARD points on
+# a hash ring and a user lives on the shard owning the first point after the
+# hash of their email, so adding a shard only moves the users that now hash to
+# one of its points (about 1/N of them); `python shards.py rebalance` moves
+# their rows. Without SHARD_DATABASE_URIS everything stays on
+# SQLALCHEMY_DATABASE_URI.
+#
+# Every shard carries the full schema. The per-user tables hold the shard's
+# users only; Activities and Food are loaded on every shard since the
+# analytics queries join against them.
+
+USER_TABLES = ('UserStorage', 'Records', 'Meals', 'Schedule', 'Logs')
+POINTS_PER_SHARD = 100
+
+def hash_key(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class ShardRouter:
+    def __init__(self, names, points=POINTS_PER_SHARD):
+        # names are bind keys; [None] is the single default database
+        self.names = list(names) or [None]
+        ring = sorted((hash_key(f"{name}#{i}"), name) for name in self.names for i in range(points))
+        self.hashes = [point for point, _ in ring]
+        self.owners = [name for _, name in ring]
+
+    def shard_for(self, email):
+        if len(self.names) == 1:
+            return self.names[0]
+        # Emails compare case-insensitively on MySQL, so they hash that way too
+        i = bisect(self.hashes, hash_key(email.lower())) % len(self.hashes)
+        return self.owners[i]
+
+    def group(self, rows, email_field='Email'):
+        # {shard: [(index, row)]}; rows without a usable email go to the first
+        # shard, where validation rejects them
+        groups = defaultdict(list)
+        for index, row in enumerate(rows):
+            email = row.get(email_field) if isinstance(row, dict) else None
+            shard = self.shard_for(email) if isinstance(email, str) and email else self.names[0]
+            groups[shard].append((index, row))
+        return groups
+
+    def gather(self, engines, statement, params=None):
+        # Scatter-gather for cross-user reads: the statement runs on every
+        # shard at once and the rows come back concatenated
+        def fetch(name):
+            with engines[name].connect() as conn:
+                return conn.execute(statement, params or {}).fetchall()
+        if len(self.names) == 1:
+            return fetch(self.names[0])
+        with ThreadPoolExecutor(max_workers=len(self.names)) as pool:
+            return [row for rows in pool.map(fetch, self.names) for row in rows]
+
+    def merge(self, engines, statement, params=None, key=None):
+        # Scatter-gather for ordered reads: the statement must return its rows
+        # sorted by key on every shard, and they are merged lazily in that
+        # order, streamed from a server-side cursor per shard. The connections
+        # close when the rows run out or the generator is closed.
+        with ExitStack() as stack:
+            results = [
+                stack.enter_context(engines[name].connect())
+                .execution_options(stream_results=True, yield_per=500)
+                .execute(statement, params or {})
+                for name in self.names
+            ]
+            yield from heapq.merge(*results, key=key)
+
+
+class ShardSession(Session):
+    # Statements without an explicit bind go to the shard the session was
+    # pointed at (session.info['shard']), otherwise to the default database.
+    # A read-only session (session.info['read_only']) reads from a replica of
+    # that database when read_engine(shard) offers one, the same one for the
+    # rest of the session.
+    def __init__(self, db, read_engine=None, **kwargs):
+        super().__init__(db, **kwargs)
+        self.read_engine = read_engine
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shard = self.info.get('shard')
+            if self.info.get('read_only') and self.read_engine is not None:
+                chosen = self.info.setdefault('read_engines', {})
+                if shard not in chosen:
+                    chosen[shard] = self.read_engine(shard)
+                if chosen[shard] is not None:
+                    return chosen[shard]
+            if shard is not None:
+                return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def insert_ignore(dialect, table, columns):
+    ignore = 'INSERT OR IGNORE' if dialect == 'sqlite' else 'INSERT IGNORE'
+    return text(f"{ignore} INTO {table} ({', '.join(columns)}) VALUES ({', '.join(':' + column for column in columns)})")
+
+def shard_emails(engine, tables):
+    query = ' UNION '.join(f"SELECT DISTINCT Email FROM {table}" for table in tables)
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text(query))]
+
+def move_user(email, source, target, tables):
+    # Copies first and deletes after, so an interrupted move leaves the rows on
+    # both shards and re-running finishes it. Rows the user already wrote on
+    # the target since the routing changed win over the copied ones.
+    with source.connect() as src, target.begin() as dst:
+        for table in tables:
+            rows = [dict(row._mapping) for row in src.execute(text(f"SELECT * FROM {table} WHERE Email = :email"), {'email': email})]
+            if rows:
+                dst.execute(insert_ignore(target.dialect.name, table, list(rows[0])), rows)
+        rollup.refresh_user(dst, email)
+    # Child tables first, so foreign keys to UserStorage never block the delete
+    children = tuple(table for table in tables if table != 'UserStorage') + ('DailyTotals', 'DailyCumulative')
+    with source.begin() as src:
+        for table in children + tuple(table for table in tables if table == 'UserStorage'):
+            src.execute(text(f"DELETE FROM {table} WHERE Email = :email"), {'email': email})
+
+def rebalance(engines, router, dry_run=False):
+    # Returns the (email, from, to) moves, made unless dry_run
+    moves = []
+    for name, engine in engines.items():
+        tables = tuple(table for table in USER_TABLES if table in set(inspect(engine).get_table_names()))
+        for email in shard_emails(engine, tables):
+            owner = router.shard_for(email)
+            if owner == name:
+                continue
+            moves.append((email, name, owner))
+            if not dry_run:
+                move_user(email, engine, engines[owner], tables)
+    return moves
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'status'
+    uris = dbpool.shard_uris()
+    if not uris:
+        print("SHARD_DATABASE_URIS is not configured")
+        return 2
+    engines = {name: create_engine(uri) for name, uri in uris.items()}
+    router = ShardRouter(uris)
+
+    if command == 'status':
+        for name, engine in engines.items():
+            emails = shard_emails(engine, ('UserStorage',))
+            misplaced = sum(1 for email in emails if router.shard_for(email) != name)
+            print(f"{name}: {len(emails)} users, {misplaced} to move")
+        return 0
+    if command == 'rebalance':
+        dry_run = '--dry-run' in argv
+        moves = rebalance(engines, router, dry_run)
+        for email, source, target in moves:
+            print(f"{'Would move' if dry_run else 'Moved'} {email}: {source} -> {target}")
+        print(f"{len(moves)} users {'to move' if dry_run else 'moved'}")
+        return 0
+
+    print(f"Usage: python {argv[0]} [status|rebalance [--dry-run]]")
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
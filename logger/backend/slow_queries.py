@@ -0,0 +1,138 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import create_engine, event
+
+# Records statements that run longer than a threshold, with the shape of their
+# parameters (types only, never values) and the plan the database chose. The
+# newest entries stay in a ring buffer; optionally every entry is also appended
+# to a size-rotated JSONL file.
+#
+# EXPLAIN runs on a background thread with its own one-connection engine per
+# database, so a burst of slow queries never takes connections from the pool
+# the requests use. Entries show up at once with "explain": null; their plan is
+# filled in (and the file line written) when the worker gets to them. When the
+# worker falls behind by explain_queue entries, further plans are skipped.
+
+EXPLAINABLE = ('select', 'with')
+
+def parameter_shape(parameters, executemany=False):
+    if executemany:
+        return {'rows': len(parameters), 'row': parameter_shape(parameters[0]) if parameters else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms=200, max_entries=200, explain=True, path=None, max_bytes=10 * 1024 * 1024, backups=5, explain_queue=50):
+        self.threshold = threshold_ms / 1000
+        self.explain_enabled = explain
+        self.entries = deque(maxlen=max_entries)
+        self.lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=explain_queue)
+        self.explain_engines = {}
+        self.explainer = None
+        self.file_logger = None
+        if path:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.file_logger = logging.getLogger('slow_queries')
+            self.file_logger.setLevel(logging.INFO)
+            self.file_logger.propagate = False
+            self.file_logger.addHandler(handler)
+
+    def instrument_engine(self, engine):
+        event.listen(engine, 'before_cursor_execute', self.before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self.after_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['slow_query_start'].pop()
+        if elapsed < self.threshold:
+            return
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'durationMs': round(elapsed * 1000, 3),
+            'route': request.url_rule.rule if has_request_context() and request.url_rule else None,
+            'statement': statement.strip(),
+            'parameters': parameter_shape(parameters, executemany),
+            'explain': None,
+        }
+        if self.explain_enabled and not executemany and statement.lstrip().lower().startswith(EXPLAINABLE):
+            self.queue_explain(entry, conn.engine, statement, parameters)
+        else:
+            self.add(entry)
+
+    def queue_explain(self, entry, engine, statement, parameters):
+        params = dict(parameters) if isinstance(parameters, dict) else tuple(parameters or ())
+        try:
+            self.pending.put_nowait((entry, engine, statement, params))
+        except queue.Full:
+            entry['explain'] = {'error': 'skipped, EXPLAIN queue full'}
+            self.add(entry)
+            return
+        self.add(entry, log=False)
+        with self.lock:
+            if self.explainer is None:
+                self.explainer = threading.Thread(target=self.run_explains, name='slow-query-explain', daemon=True)
+                self.explainer.start()
+
+    def run_explains(self):
+        while True:
+            entry, engine, statement, parameters = self.pending.get()
+            entry['explain'] = self.explain(self.explain_engine(engine), statement, parameters)
+            self.log(entry)
+
+    def explain_engine(self, engine):
+        if engine.url.get_backend_name() == 'sqlite' and engine.url.database in (None, '', ':memory:'):
+            # A new engine would open a different, empty in-memory database
+            return engine
+        key = engine.url.render_as_string(hide_password=False)
+        if key not in self.explain_engines:
+            self.explain_engines[key] = create_engine(engine.url, pool_size=1, max_overflow=0, pool_pre_ping=True)
+        return self.explain_engines[key]
+
+    def explain(self, engine, statement, parameters):
+        prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(prefix + statement, parameters)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, (str(value) if value is not None else None for value in row))) for row in cursor.fetchall()]
+        except Exception as e:
+            return {'error': str(e)}
+        finally:
+            connection.close()
+
+    def add(self, entry, log=True):
+        with self.lock:
+            self.entries.append(entry)
+        if log:
+            self.log(entry)
+
+    def log(self, entry):
+        if self.file_logger:
+            self.file_logger.info(json.dumps(entry))
+
+    def recent(self, limit=None):
+        with self.lock:
+            entries = list(self.entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
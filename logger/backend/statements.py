@@ -0,0 +1,241 @@
+from sqlalchemy import DateTime, text
+
+import rollup
+
+# The SQL statements the routes and DBReader run, built once at import time
+# and shared by all requests, so handlers only bind parameters. SQLAlchemy
+# caches the compiled form of each statement per dialect. The bulk import
+# statements are built the same way in bulk.py, once per table and dialect;
+# the keyset listings (pagination.py) vary with the filters given.
+
+# Date filters are half-open ranges on the raw Datetime column
+# (Datetime >= :start_date AND Datetime < :end_date) so MySQL can range-scan the
+# (Email, Datetime) indexes created by migrations.py instead of evaluating
+# DATE(Datetime) on every row of the user's history.
+
+# Per-day figures come from the DailyTotals rollup (see rollup.py), so a window
+# read touches at most numdays+1 small rows instead of the raw history.
+DAILY_TOTALS_QUERY = text("""
+    SELECT Date AS date,
+           CalsBurnt AS cals_burnt,
+           CalsIn AS total_cals,
+           UnhealthyCals AS unhealthy_cals,
+           RecordCount AS record_count
+    FROM DailyTotals
+    WHERE Email = :email AND Date >= :start_date AND Date < :end_date
+    ORDER BY Date
+""")
+
+RANGE_TOTALS_QUERY = text("""
+    SELECT Date AS date,
+           CalsBurnt AS cals_burnt,
+           CalsIn AS total_cals,
+           UnhealthyCals AS unhealthy_cals,
+           ProteinGrams AS protein_grams,
+           CarbGrams AS carb_grams,
+           ActivitySeconds AS activity_seconds,
+           RecordCount AS record_count,
+           MealCount AS meal_count
+    FROM DailyTotals
+    WHERE Email = :email AND Date >= :start_date AND Date < :end_date
+""")
+
+RANGE_FIELDS = ('cals_burnt', 'total_cals', 'unhealthy_cals', 'protein_grams', 'carb_grams',
+                'activity_seconds', 'record_count', 'meal_count')
+
+# Burn is stored on each record when it is written (see rollup.py)
+ACTIVITY_DATA_QUERY = text("""
+    SELECT Activity, SUM(CaloriesBurnt) AS cals_burnt
+    FROM Records
+    WHERE Email = :email AND Datetime >= :start_date AND Datetime < :end_date
+    GROUP BY Activity
+""")
+
+ALL_USERS_ACTIVITY_QUERY = text("""
+    SELECT Activity, Email, SUM(CaloriesBurnt) AS cals_burnt
+    FROM Records
+    WHERE Datetime >= :start_date AND Datetime < :end_date
+    GROUP BY Activity, Email
+""")
+
+ALL_LOGS_QUERY = text("""
+    SELECT *
+    FROM Logs L
+    WHERE L.Email = :email
+""").columns(StartDate=DateTime, EndDate=DateTime)
+
+DELETE_LOG_QUERY = text("""
+    DELETE FROM Logs
+    WHERE Email = :email AND StartDate = :start_date AND EndDate = :end_date
+""")
+
+INSERT_LOG_QUERY = text("""
+    INSERT INTO Logs (Email, StartDate, EndDate, AvgCalBurnt, AvgCalConsumed, AvgProteinGrams, AvgCarbGrams)
+    VALUES (:email, :start_date, :end_date, :avg_cal_burnt, :avg_cal_consumed, :avg_protein_grams, :avg_carb_grams)
+""")
+
+ALL_SCHEDULE_QUERY = text("""
+    SELECT Activity, StartTime, EndTime, Day
+    FROM Schedule
+    WHERE Email = :email
+""")
+
+# Schedule
+
+SCHEDULE_OVERLAP_QUERY = text("""
+    SELECT 1 FROM Schedule
+    WHERE Email = :Email AND Day = :Day AND (:StartTime < EndTime AND :EndTime > StartTime)
+""")
+
+SCHEDULE_OVERLAP_OTHERS_QUERY = text("""
+    SELECT 1 FROM Schedule
+    WHERE Email = :Email AND Day = :Day AND Activity != :Activity AND (:StartTime < EndTime AND :EndTime > StartTime)
+""")
+
+SCHEDULE_EXISTS_QUERY = text("""
+    SELECT 1 FROM Schedule
+    WHERE Email = :Email AND Activity = :Activity AND Day = :Day AND StartTime = :StartTime
+""")
+
+INSERT_SCHEDULE_QUERY = text("""
+    INSERT INTO Schedule (Email, Activity, Day, StartTime, EndTime)
+    VALUES (:Email, :Activity, :Day, :StartTime, :EndTime)
+""")
+
+UPDATE_SCHEDULE_QUERY = text("""
+    UPDATE Schedule
+    SET EndTime = :EndTime
+    WHERE Email = :Email AND Activity = :Activity AND Day = :Day AND StartTime = :StartTime
+""")
+
+DELETE_SCHEDULE_QUERY = text("""
+    DELETE FROM Schedule
+    WHERE Email = :Email AND Activity = :Activity AND Day = :Day AND StartTime = :StartTime
+""")
+
+SCHEDULE_FEED_QUERY = text("""
+    SELECT Activity, Day, StartTime, EndTime
+    FROM Schedule
+    WHERE Email = :email
+    ORDER BY Day, StartTime, Activity
+""")
+
+SCHEDULE_WEEK_SQL = """
+    SELECT Email, Activity, Day, StartTime, EndTime
+    FROM Schedule
+    WHERE Email = :email
+"""
+
+SCHEDULE_WEEK_QUERY = text(SCHEDULE_WEEK_SQL)
+
+# Locks the user's rows (and the gaps between them) until commit on MySQL
+SCHEDULE_WEEK_FOR_UPDATE_QUERY = text(SCHEDULE_WEEK_SQL + "FOR UPDATE")
+
+# Records
+
+RECORD_EXISTS_QUERY = text("""
+    SELECT 1 FROM Records
+    WHERE Email = :Email AND Activity = :Activity AND Datetime = :Datetime
+""")
+
+RECORD_WEIGHT = rollup.RECORD_WEIGHT.format(email=':Email')
+
+INSERT_RECORD_QUERY = text(f"""
+    INSERT INTO Records (Email, Activity, Datetime, Duration, Quality, WeightKg, CaloriesBurnt)
+    VALUES (:Email, :Activity, :Datetime, :Duration, :Quality, {RECORD_WEIGHT},
+            {rollup.RECORD_BURN.format(activity=':Activity', weight=RECORD_WEIGHT, duration=':Duration')})
+""")
+
+# An edited record keeps the weight it was logged with
+UPDATE_RECORD_QUERY = text(f"""
+    UPDATE Records
+    SET Duration = :Duration, Quality = :Quality,
+        WeightKg = COALESCE(WeightKg, {RECORD_WEIGHT}),
+        CaloriesBurnt = {rollup.RECORD_BURN.format(activity=':Activity', weight=f'COALESCE(WeightKg, {RECORD_WEIGHT})', duration=':Duration')}
+    WHERE Email = :Email AND Activity = :Activity AND Datetime = :Datetime
+""")
+
+DELETE_RECORD_QUERY = text("""
+    DELETE FROM Records
+    WHERE Email = :Email AND Activity = :Activity AND Datetime = :Datetime
+""")
+
+# Meals
+
+MEAL_EXISTS_QUERY = text("""
+    SELECT 1 FROM Meals
+    WHERE Email = :Email AND FoodName = :FoodName AND Datetime = :Datetime
+""")
+
+INSERT_MEAL_QUERY = text("""
+    INSERT INTO Meals (Email, FoodName, Datetime)
+    VALUES (:Email, :FoodName, :Datetime)
+""")
+
+UPDATE_MEAL_QUERY = text("""
+    UPDATE Meals
+    SET FoodName = :FoodName
+    WHERE Email = :Email AND FoodName = :OldFoodName AND Datetime = :Datetime
+""")
+
+DELETE_MEAL_QUERY = text("""
+    DELETE FROM Meals
+    WHERE Email = :Email AND FoodName = :FoodName AND Datetime = :Datetime
+""")
+
+# Reference data
+
+FOODNAMES_QUERY = text("""
+    SELECT FoodName FROM Food
+""")
+
+ACTIVITYNAMES_QUERY = text("""
+    SELECT ActivityName FROM Activities
+""")
+
+FOOD_SEARCH_SOURCE_QUERY = text("""
+    SELECT FoodName, Calories, ProteinGrams, CarbGrams, HighlyProcessed FROM Food
+""")
+
+ACTIVITY_SEARCH_SOURCE_QUERY = text("""
+    SELECT ActivityName, CaloriesPerKg FROM Activities
+""")
+
+# Users
+
+USER_QUERY = text("""
+    SELECT * FROM UserStorage WHERE Email = :email
+""")
+
+USER_WEIGHT_QUERY = text("""
+    SELECT Weight FROM UserStorage WHERE Email = :email
+""")
+
+UPDATE_USER_QUERY = text("""
+    UPDATE UserStorage
+    SET FirstName = :first_name,
+        LastName = :last_name,
+        Age = :age,
+        Weight = :weight,
+        Sex = :sex,
+        Insomnia = :insomnia,
+        MaintenanceCalories = :maintenance_calories
+    WHERE Email = :email
+""")
+
+INSERT_USER_QUERY = text("""
+    INSERT INTO UserStorage
+    (Email, FirstName, LastName, Age, Weight, Sex, Insomnia, MaintenanceCalories)
+    VALUES (:email, :first_name, :last_name, :age, :weight, :sex, :insomnia, :maintenance_calories)
+""")
+
+# Read queries checked by `python migrations.py explain`
+DBREADER_QUERIES = {
+    'daily_totals': DAILY_TOTALS_QUERY,
+    'range_totals': RANGE_TOTALS_QUERY,
+    'activity_data': ACTIVITY_DATA_QUERY,
+    'all_users_activity': ALL_USERS_ACTIVITY_QUERY,
+    'cumulative_before': rollup.CUMULATIVE_BEFORE,
+    'all_logs': ALL_LOGS_QUERY,
+    'all_schedule': ALL_SCHEDULE_QUERY,
+}
@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import types
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.schema import create_tables
+
+# Throwaway SQLite databases with the production schema. app.py and the
+# modules it imports read config at import time, so the whole test run shares
+# one app database; tests keep to their own emails.
+DIRECTORY = tempfile.mkdtemp(prefix='logger-tests-')
+
+def database_uri(name):
+    return f"sqlite:///{os.path.join(DIRECTORY, name + '.db')}"
+
+def migrated_engine(name):
+    # A new database with the base tables and every migration applied
+    import migrations
+    engine = create_engine(database_uri(name))
+    with engine.begin() as conn:
+        create_tables(conn)
+    migrations.upgrade(engine)
+    return engine
+
+def configure(**settings):
+    try:
+        import config
+    except ImportError:
+        config = types.ModuleType('config')
+        sys.modules['config'] = config
+    config.SQLALCHEMY_DATABASE_URI = database_uri('app')
+    config.RESPONSE_CACHE_DIR = os.path.join(DIRECTORY, 'response_cache')
+    config.READ_YOUR_WRITES_DIR = os.path.join(DIRECTORY, 'read_your_writes')
+    for name, value in settings.items():
+        setattr(config, name, value)
+    return config
+
+# Reference rows loaded into every test database
+ACTIVITIES = [('Running', 0.15), ('Walking', 0.05)]
+FOOD = [('Apple', 95, 0.5, 25, 0), ('Chips', 150, 2, 15, 1)]
+
+def seed_reference(conn):
+    conn.execute(text("INSERT INTO Activities VALUES (:name, :per_kg)"), [{'name': n, 'per_kg': k} for n, k in ACTIVITIES])
+    conn.execute(text("INSERT INTO Food VALUES (:name, :calories, :protein, :carbs, :processed)"), [
+        {'name': n, 'calories': c, 'protein': p, 'carbs': g, 'processed': h} for n, c, p, g, h in FOOD
+    ])
+
+def load_app():
+    # The app database is migrated and seeded before app.py first touches it
+    if 'app' not in sys.modules:
+        configure()
+        with migrated_engine('app').begin() as conn:
+            seed_reference(conn)
+    import app
+    return app
+
+def add_user(app, email, weight=70, **columns):
+    with app.app.app_context():
+        app.db.session.execute(
+            text("INSERT INTO UserStorage (Email, Weight, MaintenanceCalories) VALUES (:email, :weight, :maintenance)"),
+            {'email': email, 'weight': weight, 'maintenance': columns.get('maintenance', 2000)}
+        )
+        app.db.session.commit()
+
+def execute(app, sql, params=None):
+    with app.app.app_context():
+        result = app.db.session.execute(text(sql), params or {})
+        rows = result.fetchall() if result.returns_rows else None
+        app.db.session.commit()
+        return rows
@@ -0,0 +1,53 @@
+import unittest
+
+import support
+
+app = support.load_app()
+
+
+class BulkRecordsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        support.add_user(app, 'bulk@example.com')
+        cls.client = app.app.test_client()
+
+    def post(self, rows, query=''):
+        return self.client.post('/records/bulk' + query, json=rows).get_json()
+
+    def row(self, when, **values):
+        return dict({'Email': 'bulk@example.com', 'Activity': 'Running', 'Datetime': when, 'Duration': 30, 'Quality': 3}, **values)
+
+    def test_created_then_exists(self):
+        rows = [self.row('2024-02-01T08:00'), self.row('2024-02-01T09:00')]
+        self.assertEqual(self.post(rows)['summary'], {'created': 2})
+        self.assertEqual(self.post(rows)['summary'], {'exists': 2})
+
+    def test_duplicates_within_a_batch(self):
+        result = self.post([self.row('2024-02-02T08:00'), self.row('2024-02-02 08:00:00')])
+        self.assertEqual([item['status'] for item in result['results']], ['created', 'duplicate'])
+
+    def test_single_row_writes_are_seen_as_existing(self):
+        self.client.post('/records', json=self.row('2024-02-03T08:00'))
+        self.assertEqual(self.post([self.row('2024-02-03 08:00:00')])['summary'], {'exists': 1})
+
+    def test_legacy_text_datetimes_are_seen_as_existing(self):
+        # Rows stored with a 'T' separator before every route parsed Datetime
+        support.execute(app, "INSERT INTO Records (Email, Activity, Datetime, Duration, Quality) VALUES ('bulk@example.com', 'Running', '2024-02-04T23:30', 30, 3)")
+        self.assertEqual(self.post([self.row('2024-02-04T23:30')])['summary'], {'exists': 1})
+
+    def test_invalid_rows_are_reported(self):
+        result = self.post([self.row('yesterday'), self.row('2024-02-05T08:00', Activity='Flying'), self.row('2024-02-05T08:00', Duration='long')])
+        self.assertEqual([item['status'] for item in result['results']], ['invalid', 'invalid', 'invalid'])
+
+    def test_activity_names_take_the_reference_spelling(self):
+        self.post([self.row('2024-02-06T08:00', Activity='running')])
+        rows = support.execute(app, "SELECT Activity, CaloriesBurnt FROM Records WHERE Email = 'bulk@example.com' AND Datetime >= '2024-02-06'")
+        self.assertEqual([tuple(row) for row in rows], [('Running', 5.25)])
+
+    def test_update_on_conflict(self):
+        self.post([self.row('2024-02-07T08:00')])
+        self.assertEqual(self.post([self.row('2024-02-07T08:00', Duration=60)], '?onConflict=update')['summary'], {'updated': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import threading
+import time
+import unittest
+
+import support  # puts the backend on sys.path
+
+import jobs
+
+
+class JobQueueTest(unittest.TestCase):
+    def wait(self, job):
+        for _ in range(100):
+            if job.done:
+                return job
+            time.sleep(0.01)
+        self.fail("Job did not finish")
+
+    def test_result_and_failure(self):
+        queue = jobs.JobQueue(max_workers=1)
+        succeeded, _ = queue.submit('ok', lambda: 42)
+        with self.assertLogs('jobs', 'ERROR'):
+            failed, _ = queue.submit('broken', lambda: 1 / 0)
+            self.wait(failed)
+        self.assertEqual((self.wait(succeeded).status, succeeded.result), (jobs.SUCCEEDED, 42))
+        self.assertEqual(failed.status, jobs.FAILED)
+        self.assertIn('division', failed.error)
+        self.assertIs(queue.get(succeeded.id), succeeded)
+
+    def test_same_key_joins_the_job_in_flight(self):
+        queue = jobs.JobQueue(max_workers=1)
+        release = threading.Event()
+        first, created = queue.submit('log', release.wait)
+        second, joined = queue.submit('log', release.wait)
+        self.assertEqual((created, joined), (True, False))
+        self.assertIs(first, second)
+        release.set()
+        self.wait(first)
+        # Once finished, the same key starts a new job
+        third, created = queue.submit('log', lambda: None)
+        self.assertTrue(created)
+        self.assertIsNot(third, first)
+
+    def test_pending_jobs_are_bounded(self):
+        queue = jobs.JobQueue(max_workers=1, max_pending=2)
+        release = threading.Event()
+        queue.submit('a', release.wait)
+        queue.submit('b', release.wait)
+        with self.assertRaises(jobs.JobQueueFull):
+            queue.submit('c', release.wait)
+        release.set()
+
+    def test_finished_jobs_expire(self):
+        queue = jobs.JobQueue(max_workers=1, retention=0)
+        job = self.wait(queue.submit('old', lambda: None)[0])
+        time.sleep(0.01)
+        self.assertIsNone(queue.get(job.id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+import support
+
+support.configure()
+
+import migrations
+import statements
+
+
+class ExplainTest(unittest.TestCase):
+    def test_no_analytics_query_scans_a_user_table(self):
+        engine = support.migrated_engine('explain')
+        self.assertEqual(migrations.explain_queries(engine), [])
+
+    def test_typed_statements_are_explained(self):
+        engine = support.migrated_engine('explain_typed')
+        with engine.connect() as conn:
+            self.assertEqual(migrations.full_scans(conn, statements.ALL_LOGS_QUERY, {'email': 'explain@example.com'}), [])
+
+    def test_upgrade_is_idempotent(self):
+        engine = support.migrated_engine('upgrade')
+        self.assertEqual(migrations.upgrade(engine), [])
+        self.assertEqual(migrations.missing_indexes(engine), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import json
+import unittest
+from datetime import datetime
+
+import support
+
+app = support.load_app()
+
+import pagination
+
+EMAIL = 'pages@example.com'
+
+
+class CursorTest(unittest.TestCase):
+    def test_round_trip(self):
+        row = type('Row', (), {'Datetime': datetime(2024, 6, 1, 8, 30), 'Email': EMAIL, 'Activity': 'Running'})
+        cursor = pagination.encode_cursor(row, pagination.RECORDS)
+        self.assertEqual(pagination.decode_cursor(cursor, pagination.RECORDS), [datetime(2024, 6, 1, 8, 30), EMAIL, 'Running'])
+
+    def test_invalid_cursor(self):
+        for cursor in ('not base64!', 'W10=', 'WyJ4Il0='):
+            with self.assertRaises(pagination.PageError):
+                pagination.decode_cursor(cursor, pagination.RECORDS)
+
+    def test_after_key_is_a_range(self):
+        self.assertEqual(
+            pagination.after_key(['a', 'b', 'c']),
+            "a >= :k0 AND (a > :k0 OR (b > :k1 OR (b = :k1 AND (c > :k2))))"
+        )
+
+
+class ListingTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        support.add_user(app, EMAIL)
+        cls.client = app.app.test_client()
+        # Several records share a Datetime, so pages split between ties
+        rows = [
+            {'Email': EMAIL, 'Activity': activity, 'Datetime': f'2024-06-{day:02d}T08:00', 'Duration': 30, 'Quality': 3}
+            for day in range(1, 8) for activity in ('Running', 'Walking')
+        ]
+        cls.client.post('/records/bulk', json=rows[::2])
+        # The rest through the single-row route, with its own Datetime spelling
+        for row in rows[1::2]:
+            cls.client.post('/records', json=row)
+
+    def listing(self, query):
+        return self.client.get(f'/records?email={EMAIL}' + query).get_json()
+
+    def test_pages_cover_every_row_once_in_order(self):
+        everything = self.listing('')['data']
+        self.assertEqual(len(everything), 14)
+        for limit in (1, 3, 5):
+            pages, cursor = [], None
+            # A cursor that repeats a page would otherwise loop forever
+            for _ in range(len(everything) + 1):
+                page = self.listing(f'&limit={limit}' + (f'&cursor={cursor}' if cursor else ''))
+                pages += page['data']
+                cursor = page['nextCursor']
+                if not cursor:
+                    break
+            self.assertEqual(pages, everything)
+
+    def test_date_range_is_inclusive(self):
+        data = self.listing('&start=2024-06-02&end=2024-06-03')['data']
+        self.assertEqual({row['Datetime'][:10] for row in data}, {'2024-06-02', '2024-06-03'})
+        self.assertEqual(len(data), 4)
+
+    def test_stream_matches_listing(self):
+        lines = self.client.get(f'/records?email={EMAIL}&stream=ndjson').get_data(as_text=True).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], self.listing('')['data'])
+
+    def test_bad_parameters(self):
+        for query in ('&limit=0', '&limit=x', '&cursor=bogus', '&start=June'):
+            self.assertEqual(self.client.get(f'/records?email={EMAIL}' + query).status_code, 400, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
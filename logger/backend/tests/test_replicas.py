@@ -0,0 +1,70 @@
+import os
+import tempfile
+import time
+import unittest
+
+import support
+
+support.configure()
+
+import replicas
+
+
+class ReadRouterTest(unittest.TestCase):
+    def router(self, directory=None, sticky_seconds=15, uris=None):
+        uris = uris or {None: [support.database_uri('replica_a'), support.database_uri('replica_b')]}
+        return replicas.ReadRouter(uris, sticky_seconds=sticky_seconds, directory=directory)
+
+    def test_reads_rotate_over_healthy_replicas(self):
+        router = self.router()
+        router.check()
+        picked = {router.engine_for(None) for _ in range(4)}
+        self.assertEqual(len(picked), 2)
+        self.assertIsNone(router.engine_for('other'))
+
+    def test_unreachable_replica_leaves_the_rotation(self):
+        router = self.router(uris={None: [support.database_uri('replica_ok'), 'sqlite:////nonexistent/dir/replica.db']})
+        with self.assertLogs('replicas', 'ERROR'):
+            router.check()
+        self.assertEqual({router.engine_for(None) for _ in range(4)}, {router.sets[None].engines[0]})
+
+    def test_stickiness_is_shared_between_workers(self):
+        # Two routers on one directory stand in for two worker processes
+        directory = tempfile.mkdtemp(dir=support.DIRECTORY)
+        writer, reader = self.router(directory), self.router(directory)
+        self.assertFalse(reader.is_sticky('sticky@example.com'))
+        writer.wrote('Sticky@Example.com')
+        self.assertTrue(reader.is_sticky('sticky@example.com'))
+        self.assertFalse(reader.is_sticky('other@example.com'))
+
+    def test_stickiness_expires(self):
+        directory = tempfile.mkdtemp(dir=support.DIRECTORY)
+        writer, reader = self.router(directory, sticky_seconds=5), self.router(directory, sticky_seconds=5)
+        writer.wrote('old@example.com')
+        # Back-date the shared marker and the writer's own record
+        past = time.time() - 10
+        os.utime(writer.marker('old@example.com'), (past, past))
+        writer.last_write['old@example.com'] = past
+        self.assertFalse(reader.is_sticky('old@example.com'))
+        self.assertFalse(writer.is_sticky('old@example.com'))
+
+    def test_stale_markers_are_swept(self):
+        directory = tempfile.mkdtemp(dir=support.DIRECTORY)
+        router = replicas.ReadRouter({None: [support.database_uri('replica_a')]}, sticky_seconds=5, max_tracked=1, directory=directory)
+        router.wrote('first@example.com')
+        past = time.time() - 10
+        os.utime(router.marker('first@example.com'), (past, past))
+        router.last_write['first@example.com'] = past
+        router.wrote('second@example.com')
+        router.wrote('third@example.com')
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_nothing_is_tracked_without_replicas(self):
+        router = replicas.ReadRouter({}, directory=tempfile.mkdtemp(dir=support.DIRECTORY))
+        self.assertIsNone(router.directory)
+        router.wrote('solo@example.com')
+        self.assertTrue(router.is_sticky('solo@example.com'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+
+import support  # puts the backend on sys.path
+
+import response_cache
+
+KEY = ('cache@example.com', 'calories', 6, '2024-01-01')
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_hit_after_miss(self):
+        cache = response_cache.ResponseCache(response_cache.MemoryBackend())
+        self.assertEqual(cache.get_or_compute(KEY, lambda: 1), 1)
+        self.assertEqual(cache.get_or_compute(KEY, lambda: 2), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_invalidation_during_compute_is_not_overwritten(self):
+        cache = response_cache.ResponseCache(response_cache.MemoryBackend())
+
+        def compute():
+            cache.invalidate_user(KEY[0])
+            return 'stale'
+        cache.get_or_compute(KEY, compute)
+        self.assertEqual(cache.get_or_compute(KEY, lambda: 'fresh'), 'fresh')
+
+    def test_file_backend_invalidation_is_shared_between_workers(self):
+        # Two workers on one cache directory: B computes while A commits a write
+        directory = tempfile.mkdtemp(dir=support.DIRECTORY)
+        worker_a = response_cache.ResponseCache(response_cache.FileBackend(directory))
+        worker_b = response_cache.ResponseCache(response_cache.FileBackend(directory))
+
+        def compute():
+            worker_a.invalidate_user(KEY[0])
+            return 'stale'
+        worker_b.get_or_compute(KEY, compute)
+        self.assertEqual(worker_a.get_or_compute(KEY, lambda: 'fresh'), 'fresh')
+        self.assertEqual(worker_b.get_or_compute(KEY, lambda: 'other'), 'fresh')
+
+    def test_not_cacheable(self):
+        cache = response_cache.ResponseCache(response_cache.MemoryBackend())
+        cache.get_or_compute(KEY, lambda: 1, cacheable=lambda: False)
+        self.assertEqual(cache.get_or_compute(KEY, lambda: 2), 2)
+
+    def test_file_backend_evicts_oldest(self):
+        backend = response_cache.FileBackend(tempfile.mkdtemp(dir=support.DIRECTORY), max_entries=2, evict_every=1)
+        for day in range(3):
+            backend.set(('evict@example.com', 'calories', 6, str(day)), (0, day))
+        self.assertEqual(len(backend), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
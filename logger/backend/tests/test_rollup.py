@@ -0,0 +1,85 @@
+import random
+import unittest
+from datetime import date, datetime, timedelta
+
+import support
+
+support.configure()
+
+from sqlalchemy import text
+
+import rollup
+
+EMAIL = 'rollup@example.com'
+FIRST = date(2024, 3, 1)
+
+
+class RollupTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = support.migrated_engine('rollup')
+        rng = random.Random(4)
+        cls.records = [(FIRST + timedelta(days=rng.randrange(40)), rng.choice([15, 30, 45, 90])) for _ in range(60)]
+        cls.meals = [(FIRST + timedelta(days=rng.randrange(40)), rng.choice(['Apple', 'Chips'])) for _ in range(60)]
+        with cls.engine.begin() as conn:
+            support.seed_reference(conn)
+            conn.execute(text("INSERT INTO UserStorage (Email, Weight) VALUES (:email, 80)"), {'email': EMAIL})
+            for i, (day, duration) in enumerate(cls.records):
+                conn.execute(text("INSERT INTO Records (Email, Activity, Datetime, Duration, Quality) VALUES (:email, 'Running', :at, :duration, 3)"), {
+                    'email': EMAIL, 'at': datetime.combine(day, datetime.min.time()) + timedelta(minutes=i), 'duration': duration
+                })
+            for i, (day, food) in enumerate(cls.meals):
+                conn.execute(text("INSERT INTO Meals (Email, FoodName, Datetime) VALUES (:email, :food, :at)"), {
+                    'email': EMAIL, 'food': food, 'at': datetime.combine(day, datetime.min.time()) + timedelta(minutes=i)
+                })
+            rollup.rebuild(conn)
+
+    def expected(self, start, end):
+        # Sums over [start, end) straight from the raw rows
+        calories = {name: calories for name, calories, *_ in support.FOOD}
+        burnt = sum(0.15 * 80 * duration / 60 for day, duration in self.records if start <= day < end)
+        eaten = sum(calories[food] for day, food in self.meals if start <= day < end)
+        return burnt, eaten
+
+    def test_stored_burn_keeps_fractions_of_an_hour(self):
+        with self.engine.connect() as conn:
+            burns = {row.Duration: row.CaloriesBurnt for row in conn.execute(text("SELECT Duration, CaloriesBurnt FROM Records"))}
+        self.assertAlmostEqual(burns[30], 6.0)
+        self.assertAlmostEqual(burns[45], 9.0)
+
+    def test_range_totals_match_raw_sums(self):
+        rng = random.Random(7)
+        with self.engine.connect() as conn:
+            for _ in range(50):
+                start = FIRST + timedelta(days=rng.randrange(-5, 45))
+                end = start + timedelta(days=rng.randrange(1, 30))
+                totals = rollup.range_totals(conn, EMAIL, start, end)
+                burnt, eaten = self.expected(start, end)
+                self.assertAlmostEqual(totals['cals_burnt'], burnt)
+                self.assertAlmostEqual(totals['cals_in'], eaten)
+
+    def test_refresh_days_updates_later_running_totals(self):
+        email = 'refresh@example.com'
+        with self.engine.begin() as conn:
+            conn.execute(text("INSERT INTO UserStorage (Email, Weight) VALUES (:email, 60)"), {'email': email})
+            for day in (1, 5, 9):
+                conn.execute(text("INSERT INTO Meals (Email, FoodName, Datetime) VALUES (:email, 'Apple', :at)"), {'email': email, 'at': datetime(2024, 4, day, 12)})
+            rollup.refresh_user(conn, email)
+            # A meal on an earlier day shifts every running total after it
+            conn.execute(text("INSERT INTO Meals (Email, FoodName, Datetime) VALUES (:email, 'Chips', :at)"), {'email': email, 'at': datetime(2024, 4, 3, 12)})
+            rollup.refresh_days(conn, email, [datetime(2024, 4, 3, 12)])
+            self.assertEqual(rollup.range_totals(conn, email, date(2024, 4, 1), date(2024, 4, 10))['cals_in'], 3 * 95 + 150)
+            self.assertEqual(rollup.range_totals(conn, email, date(2024, 4, 4), date(2024, 4, 10))['cals_in'], 2 * 95)
+            cumulative = conn.execute(text("SELECT Date, CumCalsIn FROM DailyCumulative WHERE Email = :email ORDER BY Date"), {'email': email}).fetchall()
+        self.assertEqual([row[1] for row in cumulative], [95, 245, 340, 435])
+
+    def test_rebuild_matches_incremental_refresh(self):
+        with self.engine.begin() as conn:
+            before = conn.execute(text("SELECT * FROM DailyCumulative ORDER BY Email, Date")).fetchall()
+            rollup.rebuild(conn)
+            after = conn.execute(text("SELECT * FROM DailyCumulative ORDER BY Email, Date")).fetchall()
+        self.assertEqual(before, after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import time
+import unittest
+
+import support
+
+app = support.load_app()
+
+EMAIL = 'logs@example.com'
+
+
+class SavedLogsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        support.add_user(app, EMAIL, weight=80)
+        cls.client = app.app.test_client()
+        for day, duration in ((1, 60), (2, 30), (4, 90)):
+            cls.client.post('/records', json={'Email': EMAIL, 'Activity': 'Running', 'Datetime': f'2024-05-0{day}T07:00', 'Duration': duration, 'Quality': 3})
+        for day, food in ((1, 'Apple'), (3, 'Chips'), (3, 'Apple')):
+            cls.client.post('/meals', json={'Email': EMAIL, 'FoodName': food, 'Datetime': f'2024-05-0{day}T12:00'})
+
+    def wait(self, status_url):
+        for _ in range(100):
+            job = self.client.get(status_url).get_json()['data']
+            if job['status'] in ('succeeded', 'failed'):
+                return job
+            time.sleep(0.02)
+        self.fail("Log job did not finish")
+
+    def test_log_is_generated_from_the_running_totals(self):
+        response = self.client.post(f'/saved_logs?email={EMAIL}', json={'startDate': '2024-05-01', 'endDate': '2024-05-04'})
+        self.assertEqual(response.status_code, 202)
+        job = self.wait(response.get_json()['statusUrl'])
+        self.assertEqual(job['status'], 'succeeded')
+        # 12 kcal per hour at 80 kg over 3 hours, and 340 kcal eaten, over 4 days
+        self.assertAlmostEqual(job['result']['avgCalBurnt'], 36 / 4)
+        self.assertAlmostEqual(job['result']['avgCalConsumed'], 340 / 4)
+
+        logs = self.client.get(f'/saved_logs?email={EMAIL}').get_json()['data']
+        self.assertEqual([(log['startDate'][:10], log['endDate'][:10]) for log in logs], [('2024-05-01', '2024-05-04')])
+
+    def test_averages_over_several_ranges(self):
+        data = self.client.get(f'/saved_logs/averages?email={EMAIL}&range=2024-05-01:2024-05-01&range=2024-05-03:2024-05-06').get_json()['data']
+        self.assertEqual([entry['avgCalConsumed'] for entry in data], [95, 245 / 4])
+        self.assertAlmostEqual(data[1]['avgCalBurnt'], 18 / 4)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.post(f'/saved_logs?email={EMAIL}', json={'startDate': '2024-05-04', 'endDate': '2024-05-01'}).status_code, 400)
+        self.assertEqual(self.client.get(f'/saved_logs/averages?email={EMAIL}&range=may').status_code, 400)
+        self.assertEqual(self.client.get('/saved_logs/jobs/unknown').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
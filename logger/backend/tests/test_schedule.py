@@ -0,0 +1,104 @@
+import random
+import unittest
+from datetime import date
+
+import support
+
+support.configure()
+
+import date_ranges
+import projection
+import schedule_index
+
+
+def event(email, activity, day, start, end):
+    return {'Email': email, 'Activity': activity, 'Day': day, 'StartTime': start, 'EndTime': end}
+
+
+class ScheduleIndexTest(unittest.TestCase):
+    def test_overlapping_matches_a_scan(self):
+        rng = random.Random(3)
+        for _ in range(50):
+            index = schedule_index.DayIndex()
+            intervals = []
+            for n in range(rng.randint(0, 8)):
+                start = rng.randint(0, 23)
+                interval = (start, rng.randint(start, 24), f'a{n}')
+                index.add(*interval)
+                intervals.append(interval)
+            start = rng.randint(0, 23)
+            end = rng.randint(start, 24)
+            expected = sorted(i for i in intervals if start < i[1] and end > i[0])
+            self.assertEqual(index.overlapping(start, end), expected)
+
+    def test_plan(self):
+        stored = {'a@x.com': [event('a@x.com', 'Running', 'M', 8, 10)]}
+        loaded = []
+
+        def load_week(email):
+            loaded.append(email)
+            return stored.get(email, [])
+
+        results, accepted = schedule_index.plan([
+            event('a@x.com', 'Walking', 'M', '09:00', '11:00'),
+            event('a@x.com', 'Running', 'M', 12, 13),
+            event('a@x.com', 'Walking', 'M', 10, 12),
+            event('a@x.com', 'Swimming', 'M', 11, 12),
+            event('a@x.com', 'Walking', 'X', 1, 2),
+            event('b@x.com', 'Walking', 'T', 5, 3),
+            event('b@x.com', 'Walking', 'T', 3, 5),
+        ], load_week)
+        self.assertEqual([r['status'] for r in results],
+                         ['overlap', 'duplicate', 'created', 'overlap', 'invalid', 'invalid', 'created'])
+        self.assertEqual(results[0]['conflicts'], [{'activity': 'Running', 'start_time': 8, 'end_time': 10}])
+        self.assertEqual(results[3]['conflicts'], [{'activity': 'Walking', 'start_time': 10, 'end_time': 12}])
+        self.assertEqual([(r['Email'], r['StartTime']) for r in accepted], [('a@x.com', 10), ('b@x.com', 3)])
+        self.assertEqual(loaded, ['a@x.com', 'b@x.com'])
+
+
+class ProjectionTest(unittest.TestCase):
+    def test_matches_a_scan(self):
+        rng = random.Random(5)
+        users = [(f'u{i}@x.com', rng.choice([None, 50, 70.5])) for i in range(30)]
+        activities = [('Running', 0.15), ('Walking', 0.05), ('Lifting', None)]
+        names = [name for name, _ in activities] + ['Unknown']
+        # The schedule routes never store overlapping events for a user
+        schedule = []
+        for _ in range(120):
+            start = rng.randint(0, 23)
+            row = (rng.choice(users)[0], rng.choice(names), rng.choice(projection.DAYS + ('X',)),
+                   start, rng.randint(start, 24))
+            if not any(r[0] == row[0] and r[2] == row[2] and r[3] < row[4] and r[4] > row[3] for r in schedule):
+                schedule.append(row)
+        rates = {name: rate or 0 for name, rate in activities}
+
+        result = projection.Projection(users, activities, schedule)
+        for email, weight in users:
+            daily = {day: 0.0 for day in projection.DAYS}
+            for row_email, activity, day, start, end in schedule:
+                if row_email == email and activity in rates and day in daily:
+                    daily[day] += rates[activity] * (weight or 0) * (end - start)
+            projected = result.for_user(email)
+            for entry in projected['daily']:
+                self.assertAlmostEqual(entry['cals_burnt'], daily[entry['day']])
+            self.assertAlmostEqual(projected['weekly_cals_burnt'], sum(daily.values()))
+            self.assertAlmostEqual(sum(a['cals_burnt'] for a in projected['activities']), sum(daily.values()))
+        self.assertIsNone(result.for_user('nobody@x.com'))
+
+
+class DateRangesTest(unittest.TestCase):
+    def test_periods_cover_partial_weeks_and_months(self):
+        self.assertEqual(date_ranges.periods(date(2024, 1, 31), date(2024, 3, 2), 'month'),
+                         [(date(2024, 1, 1), 1), (date(2024, 2, 1), 29), (date(2024, 3, 1), 2)])
+        weeks = date_ranges.periods(date(2024, 1, 3), date(2024, 1, 16), 'week')
+        self.assertEqual(weeks, [(date(2024, 1, 1), 5), (date(2024, 1, 8), 7), (date(2024, 1, 15), 2)])
+
+    def test_bucket_fills_empty_periods(self):
+        rows = [(date(2024, 1, 1), {'cals': 10}), (date(2024, 1, 3), {'cals': None}), (date(2024, 1, 3), {'cals': 5})]
+        series = date_ranges.bucket(rows, date(2024, 1, 1), date(2024, 1, 3), 'day', ['cals'])
+        self.assertEqual([(e['period'], e['cals']) for e in series],
+                         [('2024-01-01', 10), ('2024-01-02', 0), ('2024-01-03', 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()
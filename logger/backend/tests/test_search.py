@@ -0,0 +1,29 @@
+import unittest
+
+import support  # puts the backend on sys.path
+
+from search import NameIndex
+
+
+class RankingTest(unittest.TestCase):
+    def index(self, extra):
+        # Enough close variants that they fill the candidate pool on raw score
+        names = [f'{word} {filler} {i}' for word in ('Banana', 'Chicken Breast') for filler in ('Bread', 'Split', 'Pie') for i in range(200)]
+        return NameIndex([(name, {}) for name in names + extra])
+
+    def test_exact_match_comes_first(self):
+        index = self.index(['Banana', 'Chicken Breast'])
+        self.assertEqual(index.search('Banana', 5)[0]['name'], 'Banana')
+        self.assertEqual(index.search('chicken breast', 5)[0]['name'], 'Chicken Breast')
+
+    def test_exact_match_ignores_case_and_punctuation(self):
+        index = self.index(['Chicken-Breast'])
+        self.assertEqual(index.search('CHICKEN breast', 1)[0]['name'], 'Chicken-Breast')
+
+    def test_ties_go_to_the_shorter_name(self):
+        index = NameIndex([('Banana Bread Loaf', {}), ('Banana Bread', {}), ('Banana Breads', {})])
+        self.assertEqual([hit['name'] for hit in index.search('banana', 3)], ['Banana Bread', 'Banana Breads', 'Banana Bread Loaf'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from datetime import datetime, timedelta
+
+import support
+
+support.configure()
+
+from sqlalchemy import text
+
+import pagination
+import rollup
+import shards
+
+NAMES = ['s0', 's1', 's2']
+
+
+def shard_engines(prefix):
+    # Every shard carries its own copy of the reference tables
+    engines = {name: support.migrated_engine(f'{prefix}_{name}') for name in NAMES}
+    for engine in engines.values():
+        with engine.begin() as conn:
+            support.seed_reference(conn)
+    return engines
+
+def insert_user(engine, email, records=3):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO UserStorage (Email, Weight) VALUES (:email, 70)"), {'email': email})
+        for i in range(records):
+            conn.execute(text("INSERT INTO Records (Email, Activity, Datetime, Duration, Quality) VALUES (:email, 'Running', :at, 60, 3)"), {
+                'email': email, 'at': datetime(2024, 7, 1, 8) + timedelta(hours=i * 7, minutes=len(email))
+            })
+        conn.execute(text("INSERT INTO Meals (Email, FoodName, Datetime) VALUES (:email, 'Apple', :at)"), {'email': email, 'at': datetime(2024, 7, 1, 12)})
+        rollup.backfill_user(conn, email)
+        rollup.refresh_user(conn, email)
+
+
+class RouterTest(unittest.TestCase):
+    def test_routing_is_stable_and_ignores_case(self):
+        router = shards.ShardRouter(NAMES)
+        self.assertEqual(router.shard_for('Someone@Example.com'), router.shard_for('someone@example.com'))
+        self.assertEqual(router.shard_for('a@example.com'), shards.ShardRouter(list(reversed(NAMES))).shard_for('a@example.com'))
+        self.assertEqual(shards.ShardRouter([]).shard_for('a@example.com'), None)
+
+    def test_adding_a_shard_only_moves_users_to_it(self):
+        before, after = shards.ShardRouter(NAMES), shards.ShardRouter(NAMES + ['s3'])
+        emails = [f'user{i}@example.com' for i in range(4000)]
+        moved = [email for email in emails if before.shard_for(email) != after.shard_for(email)]
+        self.assertTrue(all(after.shard_for(email) == 's3' for email in moved))
+        self.assertLess(abs(len(moved) / len(emails) - 0.25), 0.1)
+
+    def test_group(self):
+        router = shards.ShardRouter(NAMES)
+        rows = [{'Email': 'a@example.com'}, {'Email': 'b@example.com'}, {}, 'junk']
+        groups = router.group(rows)
+        self.assertEqual(sorted(index for grouped in groups.values() for index, _ in grouped), [0, 1, 2, 3])
+        self.assertIn((2, {}), groups['s0'])
+
+
+class ScatterGatherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engines = shard_engines('gather')
+        cls.router = shards.ShardRouter(NAMES)
+        cls.emails = [f'gather{i}@example.com' for i in range(12)]
+        for email in cls.emails:
+            insert_user(cls.engines[cls.router.shard_for(email)], email)
+
+    def test_gather_reads_every_shard(self):
+        rows = self.router.gather(self.engines, text("SELECT Email FROM UserStorage WHERE Email LIKE 'gather%'"))
+        self.assertEqual(sorted(row.Email for row in rows), sorted(self.emails))
+
+    def test_merge_keeps_keyset_order(self):
+        query, params = pagination.build_query(pagination.RECORDS)
+        rows = list(self.router.merge(self.engines, query, params, key=pagination.RECORDS.key))
+        keys = [pagination.RECORDS.key(row) for row in rows if row.Email.startswith('gather')]
+        self.assertEqual(len(keys), 36)
+        self.assertEqual(keys, sorted(keys))
+
+    def test_merge_pages_across_shards(self):
+        everything = [pagination.RECORDS.key(row) for row in self.router.merge(self.engines, *pagination.build_query(pagination.RECORDS), key=pagination.RECORDS.key)]
+        pages, cursor = [], None
+        for _ in range(len(everything)):
+            query, params = pagination.build_query(pagination.RECORDS, cursor=cursor, limit=6)
+            page = list(self.router.merge(self.engines, query, params, key=pagination.RECORDS.key))[:5]
+            pages += [pagination.RECORDS.key(row) for row in page]
+            if len(page) < 5:
+                break
+            cursor = pagination.encode_cursor(page[-1], pagination.RECORDS)
+        self.assertEqual(pages, everything)
+
+
+class RebalanceTest(unittest.TestCase):
+    def test_misplaced_user_is_moved_with_every_row(self):
+        engines = shard_engines('rebalance')
+        router = shards.ShardRouter(NAMES)
+        email = 'moving@example.com'
+        owner = router.shard_for(email)
+        source = next(name for name in NAMES if name != owner)
+        insert_user(engines[source], email)
+
+        self.assertEqual(shards.rebalance(engines, router), [(email, source, owner)])
+        self.assertEqual(shards.rebalance(engines, router), [])
+        with engines[source].connect() as conn:
+            for table in shards.USER_TABLES + ('DailyTotals', 'DailyCumulative'):
+                count = conn.execute(text(f"SELECT COUNT(*) FROM {table} WHERE Email = :email"), {'email': email}).scalar()
+                self.assertEqual(count, 0, table)
+        with engines[owner].connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT COUNT(*) FROM Records WHERE Email = :email"), {'email': email}).scalar(), 3)
+            totals = rollup.range_totals(conn, email, datetime(2024, 7, 1).date(), datetime(2024, 7, 3).date())
+        self.assertAlmostEqual(totals['cals_burnt'], 3 * 0.15 * 70)
+        self.assertEqual(totals['cals_in'], 95)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,17 +12,24 @@ const MealsPage: React.FC = () => {
   const [foodNames, setFoodNames] = useState<string[]>([]);
   const [searchTerm, setSearchTerm] = useState('');
 
-  // Fetch all food names from the server to populate the search options
-  const fetchFoodNames = async () => {
+  // Fetch the food names closest to the search term, best match first
+  const fetchFoodNames = async (term: string, signal: AbortSignal) => {
     try {
-      const response = await fetch('http://127.0.0.1:5000/foodnames');
+      const response = await fetch(`http://127.0.0.1:5000/food/search?q=${encodeURIComponent(term)}&limit=20`, { signal });
       const data = await response.json();
+      // A newer search term has replaced this one
+      if (signal.aborted) {
+        return;
+      }
       if (data.success) {
-        setFoodNames(data.data);
+        setFoodNames(data.data.map((item: { name: string }) => item.name));
       } else {
         alert(data.message || 'Failed to fetch food names');
       }
     } catch (error) {
+      if (signal.aborted) {
+        return;
+      }
       console.error('Error fetching food names:', error);
     }
   };
@@ -140,11 +147,6 @@ const MealsPage: React.FC = () => {
     setSearchTerm(e.target.value); // Update search term as well
   };
 
-  // Filter food names based on the search term
-  const filteredFoodNames = foodNames.filter((food) =>
-    food.toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
   // Close the search dropdown when a food name is selected
   const handleFoodNameSelect = (food: string) => {
     setFoodName(food);
@@ -155,9 +157,22 @@ const MealsPage: React.FC = () => {
     if (user?.email) {
       fetchRecords();
     }
-    fetchFoodNames();  // Fetch food names when the component mounts
   }, [user]);
 
+  // Ask the server for the closest matches once typing pauses; a request
+  // still in flight is cancelled when the search term changes again
+  useEffect(() => {
+    if (!searchTerm) {
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => fetchFoodNames(searchTerm, controller.signal), 250);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm]);
+
   return (
     <div>
       <Navbar />
@@ -175,7 +190,7 @@ const MealsPage: React.FC = () => {
               placeholder="Search and select food name"
               required
             />
-            {/* Display the filtered food names as a dropdown */}
+            {/* Display the matching food names as a dropdown */}
             {searchTerm && (
               <ul
                 style={{
@@ -186,7 +201,7 @@ const MealsPage: React.FC = () => {
                   listStyleType: 'none',
                 }}
               >
-                {filteredFoodNames.map((food, index) => (
+                {foodNames.map((food, index) => (
                   <li
                     key={index}
                     onClick={() => handleFoodNameSelect(food)}
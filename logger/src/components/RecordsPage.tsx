@@ -15,17 +15,24 @@ const RecordsPage: React.FC = () => {
   const [activityNames, setActivityNames] = useState<string[]>([]);
   const [searchTerm, setSearchTerm] = useState('');
 
-  // Fetch activity names
-  const fetchActivityNames = async () => {
+  // Fetch the activity names closest to the search term, best match first
+  const fetchActivityNames = async (term: string, signal: AbortSignal) => {
     try {
-      const response = await fetch('http://127.0.0.1:5000/activitynames');
+      const response = await fetch(`http://127.0.0.1:5000/activities/search?q=${encodeURIComponent(term)}&limit=20`, { signal });
       const data = await response.json();
+      // A newer search term has replaced this one
+      if (signal.aborted) {
+        return;
+      }
       if (data.success) {
-        setActivityNames(data.data);
+        setActivityNames(data.data.map((item: { name: string }) => item.name));
       } else {
         alert(data.message || 'Failed to fetch activity names');
       }
     } catch (error) {
+      if (signal.aborted) {
+        return;
+      }
       console.error('Error fetching activity names:', error);
     }
   };
@@ -152,12 +159,7 @@ const RecordsPage: React.FC = () => {
     setActivity(e.target.value); // Make sure the activity state is updated as well
   };
 
-  // Filter activities based on the search term
-  const filteredActivityNames = activityNames.filter((name) =>
-    name.toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
-  // Select an activity from the filtered list
+  // Select an activity from the matches
   const handleActivityNameSelect = (name: string) => {
     setActivity(name);
     setSearchTerm(''); // Reset the search term
@@ -167,9 +169,22 @@ const RecordsPage: React.FC = () => {
     if (user?.email) {
       fetchRecords();
     }
-    fetchActivityNames(); // Fetch activity names when the component mounts
   }, [user]);
 
+  // Ask the server for the closest matches once typing pauses; a request
+  // still in flight is cancelled when the search term changes again
+  useEffect(() => {
+    if (!searchTerm) {
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => fetchActivityNames(searchTerm, controller.signal), 250);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm]);
+
   return (
     <div>
       <Navbar />
@@ -188,7 +203,7 @@ const RecordsPage: React.FC = () => {
               placeholder="Search and select activity"
               required
             />
-            {/* Show filtered activity names */}
+            {/* Show matching activity names */}
             {searchTerm && (
               <ul
                 style={{
@@ -199,7 +214,7 @@ const RecordsPage: React.FC = () => {
                   listStyleType: 'none',
                 }}
               >
-                {filteredActivityNames.map((name, index) => (
+                {activityNames.map((name, index) => (
                   <li
                     key={index}
                     onClick={() => handleActivityNameSelect(name)} // Set the selected activity
@@ -105,8 +105,23 @@ const SavedLogsForm: React.FC<FormProps> = (props) => {
                 body: JSON.stringify({ startDate: startDate, endDate: endDate })
             });
             const data = await response.json();
-            console.log(data);
-            if (data.success)
+            if (!data.success)
+                return;
+            // Logs are generated in the background; poll the job until it
+            // finishes, for at most a minute. If the job can't be found (it is
+            // tracked by the worker that accepted it), refresh the list anyway.
+            let job = data;
+            for (let attempt = 0; attempt < 120 && (job.status === 'queued' || job.status === 'running'); attempt++) {
+                await new Promise(resolve => setTimeout(resolve, 500));
+                const jobResponse = await fetch(`http://127.0.0.1:5000${data.statusUrl}`);
+                const jobData = await jobResponse.json();
+                if (!jobData.success) {
+                    props.setResponse(!props.response);
+                    return;
+                }
+                job = jobData.data;
+            }
+            if (job.status === 'succeeded')
                 props.setResponse(!props.response)
         } catch (error) {
             console.error('Error:', error);
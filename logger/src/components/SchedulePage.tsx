@@ -256,7 +256,7 @@ const ScheduleView: React.FC = () => {
           </div>
           
 
-        <ScheduleExporter events={schedule}/>
+        <ScheduleExporter email={user?.email}/>
         <Schedule events={schedule}/>
       </>
     );
@@ -4,7 +4,7 @@ import Navbar from './NavBar';
 import CalorieChart from './CalorieChart';
 import CalorieForm from './CalorieForm';
 import WeeklyActivitiesChart from './WeeklyActivitiesChart';
-import { fetchWeeklyActivities, fetchWeeklyActivitiesCalories, fetchTodayCalories } from './../utils/data';
+import { fetchDashboard } from './../utils/data';
 import { CalorieData } from './../types/CalorieData';
 import WeeklyCalorieChart from './WeeklyCalorieChart';
 import DailyCalorieChart from './DailyCalorieChart';
@@ -17,42 +17,19 @@ const Logger: React.FC = () => {
   const [weeklyCalorieActivities, setweeklyCalorieActivities] = useState<{date: string; total_calories: number }[]>([]);
   const [dailyCalories, setdailyCalories] = useState<{date: string; total_cals: number }[]>([]);
 
-  // Fetch weekly activity data using the authenticated user's email
+  // Load every chart from one /dashboard request using the authenticated user's email
   useEffect(() => {
-    const loadWeeklyActivities = async () => {
+    const loadDashboard = async () => {
       if (user?.email) { // Ensure email is a non-null string
-        try {
-          const activities = await fetchWeeklyActivities(user.email);
-          setWeeklyActivities(activities);
-        } catch (error) {
-          console.error('Failed to load weekly activities:', error);
+        const dashboard = await fetchDashboard(user.email);
+        if (dashboard) {
+          setWeeklyActivities(dashboard.activities);
+          setweeklyCalorieActivities(dashboard.activitiescalories);
+          setdailyCalories(dashboard.calories.slice(-1));
         }
       }
     };
-    const loadWeeklyActivitiesCalories = async () => {
-        if (user?.email) { // Ensure email is a non-null string
-          try {
-            const activities = await fetchWeeklyActivitiesCalories(user.email);
-            setweeklyCalorieActivities(activities);
-          } catch (error) {
-            console.error('Failed to load weekly activities:', error);
-          }
-        }
-      };
-      const loaddailyCalories = async () => {
-        if (user?.email) { // Ensure email is a non-null string
-          try {
-            const activities = await fetchTodayCalories(user.email);
-            console.log(activities); 
-            setdailyCalories(activities);
-          } catch (error) {
-            console.error('Failed to load daily calories:', error);
-          }
-        }
-      };
-      loaddailyCalories(); 
-    loadWeeklyActivities();
-    loadWeeklyActivitiesCalories(); 
+    loadDashboard();
   }, [user]);
 
   const addData = (newData: CalorieData) => {
@@ -46,41 +46,27 @@ export const fetchWeeklyActivities = async (email: string) => {
     return [];
   }
 };
-export const fetchWeeklyActivitiesCalories = async (email: string) => {
+// Fetch every Visualizations series in one request: the week's daily
+// calories (today is the last day), the top activities and the burn per day
+export const fetchDashboard = async (email: string) => {
   try {
-    const response = await fetch(`http://127.0.0.1:5000/weekly/activitiescalories?email=${email}`);
+    const timeZone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    const response = await fetch(`http://127.0.0.1:5000/dashboard?email=${email}&window=week&tz=${encodeURIComponent(timeZone)}`);
     if (!response.ok) {
       throw new Error(`Error fetching data: ${response.statusText}`);
     }
     const data = await response.json();
     if (data.success) {
-      return data.data; // Returns an array of activities and calories burned
+      return data.data; // { calories, activities, activitiescalories, percentiles }
     } else {
-      throw new Error(data.message || 'Failed to fetch weekly activities');
+      throw new Error(data.message || 'Failed to fetch dashboard');
     }
   } catch (error) {
-    console.error('Error fetching weekly activities:', error);
-    return [];
+    console.error('Error fetching dashboard:', error);
+    return null;
   }
 };
 
-export const fetchTodayCalories = async (email: string) => {
-  try {
-    const response = await fetch(`http://127.0.0.1:5000/daily/calories?email=${email}`);
-    if (!response.ok) {
-      throw new Error(`Error fetching data: ${response.statusText}`);
-    }
-    const data = await response.json();
-    if (data.success) {
-      return data.data; // Returns an array of activities and calories burned
-    } else {
-      throw new Error(data.message || 'Failed to fetch today calories');
-    }
-  } catch (error) {
-    console.error('Error fetching today calories:', error);
-    return [];
-  }
-};
 export const fetchUserInfo = async (email: string) => {
   try {
     const response = await fetch(`http://127.0.0.1:5000//user?email=${email}`);